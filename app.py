@@ -1,24 +1,128 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 import json
+import hashlib
 import shutil
 import sqlite3
+import tempfile
+import uuid
 import bcrypt
+import time
+import threading
+import click
+from collections import namedtuple
 from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+from catalog_cache import CatalogCache, CatalogProduct, CatalogCategory, CatalogCustomer
+from ttl_cache import TTLCache
+from event_broker import EventBroker
+from index_advisor import capture_queries, explain, full_scans
+from keyset_pagination import KeysetPaginator
+from backup_engine import BackupEngine
+from incremental_backup import StoreLock
+from backup_restore import RestoreError, default_routes, restore_backup
+from invoice_numbers import InvoiceNumberAllocator
+from job_scheduler import JobScheduler
+from product_import import ImportFileError, clean_row, csv_chunks, read_rows, write_xlsx
 
 # إنشاء التطبيق
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///supermarket.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///supermarket.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# عدد مرات إعادة محاولة حجز المخزون عند انشغال قاعدة البيانات
+app.config['STOCK_LOCK_RETRIES'] = 5
+app.config['STOCK_LOCK_BACKOFF'] = 0.02
+# مدة صلاحية إحصائيات لوحة التحكم المشتركة بين جميع الجلسات (بالثواني)
+app.config['DASHBOARD_STATS_TTL'] = 5
+# تأخير بث إحصائيات لوحة التحكم بعد البيع (بالثواني): عمليات البيع خلاله تجمع في حساب واحد
+app.config['DASHBOARD_STATS_PUBLISH_DELAY'] = 1
+# أقصى مدة قبل أن يرى عامل تعديلات الكتالوج من عامل آخر (بالثواني)، وعدد سطور سجل التغييرات المحتفظ بها
+app.config['CATALOG_SYNC_INTERVAL'] = 1
+app.config['CATALOG_CHANGES_KEEP'] = 10000
+# عدد عناصر صفحات القوائم ومدة صلاحية العدد الإجمالي التقريبي لها (بالثواني)
+app.config['LISTING_PER_PAGE'] = 20
+app.config['LISTING_COUNT_TTL'] = 60
+# إحصائيات صفحات العملاء والمستخدمين تلغى عند الكتابة، والمدة حد أقصى احتياطي (بالثواني)
+app.config['LISTING_STATS_TTL'] = 300
+# مدة صلاحية نسخة المستخدم في الذاكرة (بالثواني): حد أقصى لتأخر ظهور تعديل من عملية أخرى
+app.config['USER_CACHE_TTL'] = 30
+# برنامج ضغط أرشيف النسخ الاحتياطي (store, deflate, lzma, zstd) ومستواه وعدد خيوط الضغط.
+# deflate يفتحه أي برنامج zip؛ zstd أسرع لكن لا يفتح الأرشيف إلا استعادة النظام نفسه (مع zstandard)
+app.config['BACKUP_ARCHIVE_CODEC'] = os.environ.get('BACKUP_ARCHIVE_CODEC', 'deflate')
+app.config['BACKUP_ARCHIVE_LEVEL'] = None
+app.config['BACKUP_ARCHIVE_WORKERS'] = None
+# عدد الأرشيفات وعدد اللقطات التزايدية المحتفظ بها، ويحذف الأقدم بعد كل نسخة
+app.config['BACKUP_MAX_BACKUPS'] = 10
+# استيراد المنتجات بالجملة: عدد الصفوف في كل معاملة، وحد رسائل أخطاء الصفوف في الرد
+app.config['PRODUCT_IMPORT_BATCH_SIZE'] = 5000
+app.config['PRODUCT_IMPORT_MAX_ERRORS'] = 1000
+# أرقام الفواتير: كل عملية خادم تحجز من العداد كتلة بهذا الحجم
+app.config['INVOICE_BLOCK_SIZE'] = 50
+app.config['INVOICE_PREFIX'] = 'INV'
+# أقصى عدد عمليات بيع في دفعة مزامنة واحدة من نقطة بيع غير متصلة
+app.config['POS_SYNC_MAX_SALES'] = 500
+# المهام الخلفية المجدولة: تعمل في عملية واحدة فقط مهما كان عدد عمليات الخادم (بالساعات)
+app.config['SCHEDULER_ENABLED'] = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+app.config['BACKUP_INTERVAL_HOURS'] = 24
+app.config['BACKUP_SCHEDULE_MODE'] = 'incremental'
+app.config['ROLLUP_REBUILD_HOURS'] = 24
+# عدد الأيام الأخيرة التي تطابق مع سجل المبيعات في كل دورة (اليوم الحالي وما قبله)
+app.config['ROLLUP_REBUILD_DAYS'] = 2
+# تجميع دفتر نقاط الولاء في أرصدة العملاء (بالدقائق)
+app.config['LOYALTY_FOLD_MINUTES'] = 5
+
+# ملفات أداء التخزين: إعدادات PRAGMA تطبق عند فتح كل اتصال SQLite وحجم مجمع الاتصالات
+SQLITE_STORAGE_PROFILES = {
+    # إعدادات SQLite الافتراضية (سجل التراجع، القراء يحجبون الكاتب)
+    'default': {
+        'pragmas': {},
+        'engine_options': {}
+    },
+    # WAL: القراءة لا تحجب عملية البيع، والمزامنة عند نقاط الحفظ فقط
+    'performance': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -64000,       # 64 ميجابايت
+            'mmap_size': 268435456,     # 256 ميجابايت
+            'temp_store': 'MEMORY',
+            'busy_timeout': 5000        # بالملي ثانية
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30
+        }
+    }
+}
+app.config['SQLITE_STORAGE_PROFILE'] = os.environ.get('SQLITE_STORAGE_PROFILE', 'performance')
+_storage_profile = SQLITE_STORAGE_PROFILES[app.config['SQLITE_STORAGE_PROFILE']]
+app.config['SQLITE_PRAGMAS'] = dict(_storage_profile['pragmas'])
+if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(_storage_profile['engine_options'])
 
 # إعداد قاعدة البيانات
 db = SQLAlchemy(app)
 
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """تطبيق إعدادات ملف التخزين على كل اتصال SQLite جديد"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+with app.app_context():
+    event.listen(db.engine, 'connect', _apply_sqlite_pragmas)
+
 # إعداد نظام تسجيل الدخول
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -28,7 +132,9 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # من الذاكرة دون استعلام في كل طلب؛ المستخدم المعطل أو المحذوف تنتهي جلسته
+    user_id = int(user_id)
+    return user_cache.get_or_compute(user_id, lambda: _load_session_user(user_id))
 
 # نماذج قاعدة البيانات
 class User(UserMixin, db.Model):
@@ -48,6 +154,20 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+class SessionUser(namedtuple('SessionUser', 'id username email role is_active avatar_url'), UserMixin):
+    """نسخة ثابتة خفيفة من المستخدم تمثل current_user (لا تحمل كلمة المرور ولا ترتبط بالجلسة).
+    للتعديل يحمل صف User من قاعدة البيانات ثم تلغى النسخة بـ user_cache.invalidate"""
+    __slots__ = ()
+
+def _load_session_user(user_id):
+    row = db.session.execute(
+        db.select(User.id, User.username, User.email, User.role, User.is_active, User.avatar_url)
+        .where(User.id == user_id)
+    ).first()
+    if row is None or not row.is_active:
+        return None
+    return SessionUser(*row)
+
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -57,6 +177,14 @@ class Category(db.Model):
     products = db.relationship('Product', backref='category', lazy=True)
 
 class Product(db.Model):
+    __table_args__ = (
+        db.Index('ix_product_active_created', 'is_active', 'created_at'),
+        db.Index('ix_product_active_category', 'is_active', 'category_id', 'created_at'),
+        # فهرس جزئي صغير لمنتجات المخزون المنخفض النشطة (لوحة التحكم والتقارير)
+        db.Index('ix_product_active_low_stock', 'stock_quantity', 'min_stock', 'is_active',
+                 sqlite_where=db.text('is_active = 1 AND stock_quantity <= min_stock')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     barcode = db.Column(db.String(50), unique=True)
@@ -72,6 +200,11 @@ class Product(db.Model):
     is_active = db.Column(db.Boolean, default=True)
 
 class Sale(db.Model):
+    __table_args__ = (
+        db.Index('ix_sale_cashier_created', 'cashier_id', 'created_at'),
+        db.Index('ix_sale_customer_created', 'customer_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
     total_amount = db.Column(db.Float, nullable=False)
@@ -80,19 +213,34 @@ class Sale(db.Model):
     payment_method = db.Column(db.String(20), default='cash')  # cash, card, mixed
     cashier_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     items = db.relationship('SaleItem', backref='sale', lazy=True)
 
 class SaleItem(db.Model):
+    # فهرس مغطٍ لتجميعات التقارير حسب عملية البيع
+    __table_args__ = (
+        db.Index('ix_sale_item_sale_totals', 'sale_id', 'product_id', 'quantity', 'total_price'),
+        db.Index('ix_sale_item_product', 'product_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'))
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
+    # التكلفة والفئة وقت البيع، فلا تتغير هوامش الأيام السابقة عند تعديل المنتج
+    unit_cost = db.Column(db.Float, nullable=True)
+    category_id = db.Column(db.Integer, nullable=True)
     product = db.relationship('Product', backref='sale_items')
 
 class Customer(db.Model):
+    __table_args__ = (
+        db.Index('ix_customer_created', 'created_at'),
+        # يغطي أيضاً أعمدة إحصائيات صفحة العملاء فتقرأ من الفهرس بدل الجدول
+        db.Index('ix_customer_type_created_totals', 'customer_type', 'created_at', 'total_purchases', 'loyalty_points'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20), unique=True, nullable=False)
@@ -108,6 +256,176 @@ class Customer(db.Model):
     # العلاقات
     sales = db.relationship('Sale', backref='customer', lazy=True)
 
+# جداول التجميع اليومي للمبيعات (تحدث داخل معاملة البيع نفسها)
+class DailySalesSummary(db.Model):
+    __tablename__ = 'daily_sales_summary'
+    __table_args__ = (db.UniqueConstraint('day', 'cashier_id', name='uq_daily_sales_day_cashier'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    cashier_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    tickets = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    cash_revenue = db.Column(db.Float, nullable=False, default=0)
+    card_revenue = db.Column(db.Float, nullable=False, default=0)
+
+class DailyProductSales(db.Model):
+    __tablename__ = 'daily_product_sales'
+    # جدول مرتب فعلياً حسب (اليوم، المنتج)، مع فهارس مغطية للتجميع حسب المنتج والفئة دون فرز
+    __table_args__ = (
+        db.Index('ix_daily_product_sales_product', 'product_id', 'day', 'quantity', 'revenue', 'cost'),
+        db.Index('ix_daily_product_sales_category', 'category_id', 'day', 'quantity', 'revenue'),
+        {'sqlite_with_rowid': False}
+    )
+
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0)  # بسعر التكلفة وقت البيع
+
+# دفتر نقاط الولاء: عملية البيع تضيف سطراً فقط دون تحديث صف العميل، والتجميع في الخلفية
+# يضيف الأسطر الجديدة لرصيد العميل ويحرك العلامة، والرصيد الدقيق = رصيد العميل + الأسطر بعد العلامة
+class LoyaltyLedger(db.Model):
+    __tablename__ = 'loyalty_ledger'
+    __table_args__ = (db.Index('ix_loyalty_ledger_customer', 'customer_id', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'))
+    points = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LoyaltyFoldState(db.Model):
+    __tablename__ = 'loyalty_fold_state'
+
+    name = db.Column(db.String(20), primary_key=True)
+    last_entry_id = db.Column(db.Integer, nullable=False, default=0)
+
+# عداد أرقام الفواتير (صف واحد لكل تسلسل، يحجز منه على كتل)
+class InvoiceCounter(db.Model):
+    __tablename__ = 'invoice_counter'
+
+    name = db.Column(db.String(20), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False)
+
+# مفاتيح عمليات البيع المسجلة من نقاط البيع غير المتصلة (UUID ينشئه المتصفح) لمنع تكرارها عند إعادة المزامنة
+class SyncedSale(db.Model):
+    __tablename__ = 'synced_sale'
+
+    client_id = db.Column(db.String(36), primary_key=True)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False)
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# سجل تغييرات الكتالوج المشترك بين عمليات الخادم: section NULL يعني الكتالوج كله، وitem_id NULL القسم كله
+class CatalogChange(db.Model):
+    __tablename__ = 'catalog_change'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    section = db.Column(db.String(20))
+    item_id = db.Column(db.Integer)
+
+def ensure_columns():
+    """إضافة أعمدة النماذج الجديدة (القابلة لـ NULL) إلى جداول قاعدة بيانات موجودة"""
+    with db.engine.begin() as connection:
+        # الفحص على اتصال التعديل نفسه: اتصال بمخطط قديم في ذاكرته يرفض ALTER قبل أن يعيد قراءته
+        inspector = db.inspect(connection)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" '
+                                               f'{column.type.compile(db.engine.dialect)}')
+
+def ensure_indexes():
+    """إنشاء فهارس النماذج الناقصة في قاعدة بيانات موجودة (create_all لا يضيفها لجداول قائمة)"""
+    ensure_columns()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def backfill_created_at():
+    """تاريخ إنشاء للصفوف القديمة التي بلا تاريخ في القوائم المرقمة بالمؤشر (تظهر كأقدم الصفوف)"""
+    with db.engine.begin() as connection:
+        for model in (Product, Customer, User):
+            connection.execute(model.__table__.update()
+                               .where(model.__table__.c.created_at.is_(None))
+                               .values(created_at=datetime(1970, 1, 1)))
+
+def init_db():
+    """تجهيز قاعدة البيانات قبل التشغيل: الجداول الناقصة ثم الأعمدة والفهارس الجديدة في الجداول القائمة.
+    تستدعيها كل نقاط التشغيل؛ القفل (بجوار ملف القاعدة) يمنع عمال الخادم من تعديل الجداول في الوقت نفسه"""
+    with app.app_context():
+        db_path = db.engine.url.database
+        if not db_path or db_path == ':memory:':
+            db.create_all()
+            ensure_indexes()
+            backfill_created_at()
+            return
+        with StoreLock(os.path.abspath(db_path) + '.schema.lock'):
+            db.create_all()
+            ensure_indexes()
+            backfill_created_at()
+
+# ذاكرة كتالوج نقطة البيع (صفوف مختصرة بدون كائنات ORM)
+DEFAULT_PRODUCT_IMAGE = '/static/images/default-product.svg'
+PRODUCT_SEARCH_MAX_RESULTS = 500
+
+def _catalog_product(row):
+    return CatalogProduct(row.id, row.name, float(row.price), row.stock_quantity or 0,
+                          row.barcode, row.category_id, row.image_path or DEFAULT_PRODUCT_IMAGE)
+
+def _load_catalog_products(ids=None):
+    query = db.select(Product.id, Product.name, Product.price, Product.stock_quantity,
+                      Product.barcode, Product.category_id, Product.image_path).where(Product.is_active == True)
+    if ids is not None:
+        query = query.where(Product.id.in_(ids))
+    return [_catalog_product(row) for row in db.session.execute(query.order_by(Product.id))]
+
+def _load_catalog_categories(ids=None):
+    query = db.select(Category.id, Category.name).where(Category.is_active == True)
+    if ids is not None:
+        query = query.where(Category.id.in_(ids))
+    return [CatalogCategory(row.id, row.name) for row in db.session.execute(query.order_by(Category.id))]
+
+def _load_catalog_customers(ids=None):
+    query = db.select(Customer.id, Customer.name, Customer.phone).where(Customer.is_active == True)
+    if ids is not None:
+        query = query.where(Customer.id.in_(ids))
+    return [CatalogCustomer(row.id, row.name, row.phone) for row in db.session.execute(query.order_by(Customer.id))]
+
+def _load_catalog_changes(since):
+    """(آخر رقم، التغييرات بعد since) من سجل الكتالوج، والقائمة None إذا حذف السجل جزءاً لم يطبق"""
+    # min وmax في استعلامين فرعيين: SQLite يقرأ طرف الفهرس لكل منهما، ومعاً في SELECT واحد يقرأ الجدول كله
+    first, last = db.session.execute(db.select(
+        db.select(db.func.min(CatalogChange.id)).scalar_subquery(),
+        db.select(db.func.max(CatalogChange.id)).scalar_subquery()
+    )).one()
+    last = last or 0
+    if since is None or last == since:
+        return last, []
+    if last < since or (first is not None and first > since + 1):
+        return last, None
+    return last, [(row.section, row.item_id) for row in db.session.execute(
+        db.select(CatalogChange.section, CatalogChange.item_id).where(CatalogChange.id > since)
+    )]
+
+def _record_catalog_changes(section, ids=None):
+    """تسجيل تغيير الكتالوج في معاملة الكتابة نفسها، ثم catalog.sync(force=True) بعد commit.
+    ids None: القسم كله، وsection None: الكتالوج كله (بعد الاستعادة)"""
+    rows = [{'section': section, 'item_id': item_id} for item_id in ids] if ids is not None else \
+        [{'section': section, 'item_id': None}]
+    if rows:
+        db.session.execute(CatalogChange.__table__.insert(), rows)
+
+catalog = CatalogCache(_load_catalog_products, _load_catalog_categories, _load_catalog_customers,
+                       _load_catalog_changes, app.config['CATALOG_SYNC_INTERVAL'])
+
 # دالة للتحقق من الأدوار
 def role_required(role):
     def decorator(f):
@@ -156,36 +474,181 @@ def logout():
     flash('تم تسجيل الخروج بنجاح', 'success')
     return redirect(url_for('login'))
 
+# إحصائيات لوحة التحكم: استعلام واحد مشترك بين كل الجلسات لمدة قصيرة
+dashboard_cache = TTLCache(app.config['DASHBOARD_STATS_TTL'])
+
+def _compute_dashboard_stats():
+    today = DailySalesSummary.day == datetime.utcnow().date()
+    total_products, low_stock_products, today_sales, today_revenue = db.session.query(
+        db.select(db.func.count()).where(Product.is_active == True).scalar_subquery(),
+        db.select(db.func.count()).where(
+            Product.is_active == True, Product.stock_quantity <= Product.min_stock
+        ).scalar_subquery(),
+        db.select(db.func.coalesce(db.func.sum(DailySalesSummary.tickets), 0)).where(today).scalar_subquery(),
+        db.select(db.func.coalesce(db.func.sum(DailySalesSummary.revenue), 0)).where(today).scalar_subquery()
+    ).one()
+    stats = {
+        'total_products': total_products,
+        'low_stock_products': low_stock_products,
+        'today_sales': today_sales,
+        'today_revenue': float(today_revenue)
+    }
+    etag = hashlib.md5(json.dumps(stats, sort_keys=True).encode('utf-8')).hexdigest()
+    return stats, etag
+
+def dashboard_stats():
+    """إرجاع (الإحصائيات، ETag) من الذاكرة المؤقتة أو حسابها"""
+    return dashboard_cache.get_or_compute('stats', _compute_dashboard_stats)
+
+# ترقيم القوائم بالمؤشر مع عدد إجمالي تقريبي مشترك لفترة قصيرة
+paginator = KeysetPaginator(app.config['SECRET_KEY'])
+listing_counts = TTLCache(app.config['LISTING_COUNT_TTL'])
+
+def paginate_listing(name, query, model, filters):
+    """صفحة القائمة حسب رمز cursor في الطلب، والعدد الإجمالي من الذاكرة المؤقتة لنفس المرشحات"""
+    total = listing_counts.get_or_compute((name,) + tuple(filters), query.count)
+    return paginator.paginate(query, model, request.args.get('cursor'),
+                              per_page=app.config['LISTING_PER_PAGE'], total=total)
+
+# إحصائيات صفحات القوائم: استعلام تجميع شرطي واحد لكل صفحة، يلغى عند الكتابة
+listing_stats = TTLCache(app.config['LISTING_STATS_TTL'])
+# نسخ المستخدمين لـ load_user، وتلغى عند إضافة مستخدم أو تعديل ملفه أو تعطيله
+user_cache = TTLCache(app.config['USER_CACHE_TTL'])
+
+def _compute_customer_stats():
+    start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    total, vip, with_purchases, total_purchases, total_points, new_this_month = db.session.query(
+        db.func.count(),
+        db.func.count(db.case((Customer.customer_type == 'vip', 1))),
+        db.func.count(Customer.total_purchases),
+        db.func.coalesce(db.func.sum(Customer.total_purchases), 0),
+        db.func.coalesce(db.func.sum(Customer.loyalty_points), 0),
+        db.func.count(db.case((Customer.created_at >= start_of_month, 1)))
+    ).select_from(Customer).one()
+    # مع أسطر دفتر الولاء التي لم تجمع بعد حتى تبقى الإحصائيات دقيقة
+    pending_points, pending_amount = db.session.query(
+        db.func.coalesce(db.func.sum(LoyaltyLedger.points), 0),
+        db.func.coalesce(db.func.sum(LoyaltyLedger.amount), 0)
+    ).filter(LoyaltyLedger.id > _loyalty_watermark()).one()
+    total_points += pending_points
+    avg_purchases = (total_purchases + pending_amount) / with_purchases if with_purchases else 0
+    return {
+        'total_customers': total,
+        'vip_customers': vip,
+        'avg_purchases': f"{avg_purchases:.2f}",
+        'total_points': total_points,
+        'new_customers_this_month': new_this_month
+    }
+
+def customer_stats():
+    """إحصائيات صفحة العملاء (تلغى عند إضافة عميل أو بيع لعميل)"""
+    return listing_stats.get_or_compute('customers', _compute_customer_stats)
+
+def _compute_user_stats():
+    total, active, admins, cashiers = db.session.query(
+        db.func.count(),
+        db.func.count(db.case((User.is_active == True, 1))),
+        db.func.count(db.case((User.role == 'admin', 1))),
+        db.func.count(db.case((User.role == 'cashier', 1)))
+    ).select_from(User).one()
+    return {
+        'total_users': total,
+        'active_users': active,
+        'admin_users': admins,
+        'cashier_users': cashiers
+    }
+
+def user_stats():
+    """إحصائيات صفحة المستخدمين (تلغى عند إضافة مستخدم)"""
+    return listing_stats.get_or_compute('users', _compute_user_stats)
+
+# محرك النسخ الاحتياطي في الخلفية (لقطة SQLite على دفعات تكتب مباشرة في zip)
+backup_engine = BackupEngine(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups'),
+    directories=[('static', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))],
+    codec=app.config['BACKUP_ARCHIVE_CODEC'],
+    level=app.config['BACKUP_ARCHIVE_LEVEL'],
+    workers=app.config['BACKUP_ARCHIVE_WORKERS'],
+    max_backups=app.config['BACKUP_MAX_BACKUPS']
+)
+
+# قناة الأحداث المباشرة (SSE) للوحة التحكم وشاشة نقطة البيع
+events = EventBroker()
+
+def _publish_stock_events(product_ids):
+    """بث المخزون الجديد للمنتجات التي تغيرت فقط، وجدولة تحديث إحصائيات لوحة التحكم في الخلفية"""
+    if events.has_subscribers('stock'):
+        stock = {}
+        for product_id in product_ids:
+            row = catalog.get_product(product_id)
+            if row is not None:
+                stock[product_id] = row.stock
+        events.publish('stock', stock)
+    if events.has_subscribers('stats'):
+        _schedule_stats_publish()
+
+_stats_publish_lock = threading.Lock()
+_stats_publish_timer = None
+
+def _schedule_stats_publish():
+    """حساب الإحصائيات وبثها بعد DASHBOARD_STATS_PUBLISH_DELAY في خيط خلفي، مرة واحدة لكل دفعة مبيعات"""
+    global _stats_publish_timer
+    with _stats_publish_lock:
+        if _stats_publish_timer is not None:
+            return
+        _stats_publish_timer = threading.Timer(app.config['DASHBOARD_STATS_PUBLISH_DELAY'], _publish_dashboard_stats)
+        _stats_publish_timer.daemon = True
+        _stats_publish_timer.start()
+
+def _publish_dashboard_stats():
+    global _stats_publish_timer
+    with _stats_publish_lock:
+        _stats_publish_timer = None   # بيع أثناء الحساب يجدول بثاً جديداً
+    if not events.has_subscribers('stats'):
+        return
+    try:
+        with app.app_context():
+            dashboard_cache.invalidate('stats')
+            stats, _ = dashboard_stats()
+        events.publish('stats', stats)
+    except Exception:
+        app.logger.exception('تعذر تحديث إحصائيات لوحة التحكم')
+
+@app.route('/api/events')
+@login_required
+def events_stream():
+    topics = [topic for topic in request.args.get('topics', '').split(',') if topic]
+    subscription = events.subscribe(topics)
+    response = Response(events.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
     # إحصائيات سريعة
-    total_products = Product.query.filter_by(is_active=True).count()
-    low_stock_products = Product.query.filter(Product.stock_quantity <= Product.min_stock).count()
-    today_sales = Sale.query.filter(Sale.created_at >= datetime.now().date()).count()
-    today_revenue = db.session.query(db.func.sum(Sale.total_amount)).filter(
-        Sale.created_at >= datetime.now().date()).scalar() or 0
-    
-    return render_template('dashboard.html',
-                         total_products=total_products,
-                         low_stock_products=low_stock_products,
-                         today_sales=today_sales,
-                         today_revenue=today_revenue)
+    stats, _ = dashboard_stats()
+    return render_template('dashboard.html', **stats)
+
+@app.route('/api/dashboard-stats')
+@login_required
+def dashboard_stats_api():
+    stats, etag = dashboard_stats()
+    response = jsonify(stats)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/products')
 @login_required
 def products():
-    # Get all products with pagination
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-
     # Build query with filters
     query = Product.query.filter_by(is_active=True)
 
-    # Search filter
+    # Search filter (served by the in-memory search index)
     search = request.args.get('search', '')
-    if search:
-        query = query.filter(Product.name.contains(search))
 
     # Category filter
     category_id = request.args.get('category', '')
@@ -200,11 +663,18 @@ def products():
         query = query.filter(Product.stock_quantity <= Product.min_stock)
         query = query.filter(Product.stock_quantity > 0)
     elif stock_filter == 'out_of_stock':
+        query = query.filter(Product.stock_quantity <= Product.min_stock)
         query = query.filter(Product.stock_quantity == 0)
 
-    products = query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # نتائج البحث بترتيب الصلة من الفهرس، وأول PRODUCT_SEARCH_MAX_RESULTS نتيجة فقط (تذكر في الصفحة)
+    search_truncated = False
+    if search:
+        ranked_ids = catalog.search_ids(search, limit=PRODUCT_SEARCH_MAX_RESULTS)
+        search_truncated = len(ranked_ids) >= PRODUCT_SEARCH_MAX_RESULTS
+        products = paginator.paginate_ranked(query, Product, ranked_ids, request.args.get('cursor'),
+                                             per_page=app.config['LISTING_PER_PAGE'])
+    else:
+        products = paginate_listing('products', query, Product, (category_id, stock_filter))
 
     categories = Category.query.filter_by(is_active=True).all()
 
@@ -212,6 +682,8 @@ def products():
                          products=products,
                          categories=categories,
                          search=search,
+                         search_truncated=search_truncated,
+                         search_limit=PRODUCT_SEARCH_MAX_RESULTS,
                          category_filter=category_id,
                          stock_filter=stock_filter)
 
@@ -223,7 +695,6 @@ def add_product():
         name = request.form.get('name')
         barcode = request.form.get('barcode')
         category_id = request.form.get('category_id')
-        unit = request.form.get('unit', 'قطعة')
         cost_price = float(request.form.get('cost_price'))
         price = float(request.form.get('price'))
         stock_quantity = int(request.form.get('stock_quantity'))
@@ -235,7 +706,6 @@ def add_product():
             name=name,
             barcode=barcode,
             category_id=category_id,
-            unit=unit,
             cost_price=cost_price,
             price=price,
             stock_quantity=stock_quantity,
@@ -245,7 +715,11 @@ def add_product():
         )
 
         db.session.add(product)
+        db.session.flush()
+        _record_catalog_changes('products', [product.id])
         db.session.commit()
+        listing_counts.invalidate()
+        catalog.sync(force=True)
 
         flash('تم إضافة المنتج بنجاح', 'success')
         return redirect(url_for('products'))
@@ -255,62 +729,517 @@ def add_product():
         flash('حدث خطأ أثناء إضافة المنتج', 'error')
         return redirect(url_for('products'))
 
+# استيراد وتصدير المنتجات بالجملة (CSV/XLSX)
+def import_products(stream, filename):
+    """استيراد ملف منتجات تدفقياً: upsert بالباركود على دفعات، كل دفعة في معاملة واحدة.
+    الفئات غير الموجودة تنشأ بالاسم، وخلية الفئة الفارغة تبقي فئة المنتج الموجود كما هي.
+    يرفع ImportFileError لملف غير صالح قبل أي كتابة. إن توقف الاستيراد في منتصف الملف (خطأ ترميز
+    أو خطأ في قاعدة البيانات) تبقى الدفعات السابقة محفوظة، ويعاد عددها مع الخطأ في error
+    ونوعه في aborted (file أو database)"""
+    started = time.perf_counter()
+    fields, records = read_rows(stream, filename)
+    columns = [field if field != 'category' else 'category_id' for field in fields]
+    table = Product.__table__
+    stmt = sqlite_insert(table)
+    updates = dict({column: stmt.excluded[column] for column in columns if column != 'barcode'},
+                   is_active=True, updated_at=stmt.excluded.updated_at)
+    if 'category_id' in updates:
+        updates['category_id'] = db.func.coalesce(stmt.excluded.category_id, table.c.category_id)
+    stmt = stmt.on_conflict_do_update(index_elements=['barcode'], set_=updates)
+    categories = {name: category_id for category_id, name in db.session.execute(db.select(Category.id, Category.name))}
+    result = {'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def flush(batch):
+        existing = set(db.session.execute(
+            db.select(Product.barcode).where(Product.barcode.in_(list(batch)))
+        ).scalars())
+        now = datetime.utcnow()
+        for values in batch.values():
+            values['updated_at'] = now
+        db.session.execute(stmt, list(batch.values()))
+        _record_catalog_changes('products')
+        db.session.commit()
+        result['updated'] += len(existing)
+        result['created'] += len(batch) - len(existing)
+
+    batch = {}
+    try:
+        for number, record in records:
+            try:
+                values = clean_row(record)
+            except ValueError as e:
+                result['failed'] += 1
+                if len(result['errors']) < app.config['PRODUCT_IMPORT_MAX_ERRORS']:
+                    result['errors'].append({'row': number, 'barcode': str(record.get('barcode') or ''), 'message': str(e)})
+                continue
+            if 'category' in values:
+                name = values.pop('category')
+                if name and name not in categories:
+                    category = Category(name=name, is_active=True)
+                    db.session.add(category)
+                    db.session.flush()
+                    _record_catalog_changes('categories', [category.id])
+                    categories[name] = category.id
+                values['category_id'] = categories.get(name)
+            # تكرار الباركود في الدفعة نفسها: آخر صف هو المعتمد
+            batch[values['barcode']] = values
+            if len(batch) >= app.config['PRODUCT_IMPORT_BATCH_SIZE']:
+                flush(batch)
+                batch = {}
+        if batch:
+            flush(batch)
+        db.session.commit()
+    except ImportFileError as e:
+        db.session.rollback()
+        result.update(error=str(e), aborted='file')
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.exception('توقف استيراد المنتجات بخطأ في قاعدة البيانات')
+        result.update(error=f'خطأ في قاعدة البيانات: {e.__class__.__name__}', aborted='database')
+    finally:
+        records.close()
+
+    catalog.sync(force=True)
+    listing_counts.invalidate()
+    dashboard_cache.invalidate()
+    seconds = time.perf_counter() - started
+    result['seconds'] = round(seconds, 2)
+    result['rows_per_s'] = round((result['created'] + result['updated']) / seconds) if seconds else 0
+    return result
+
+def _export_product_rows():
+    """صفوف المنتجات النشطة بترتيب حقول الملف، مقروءة على دفعات بالمفتاح حتى لا تحمل كلها في الذاكرة"""
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Product.id, Product.barcode, Product.name, Product.price, Product.cost_price,
+                      Product.stock_quantity, Product.min_stock, Category.name, Product.description)
+            .outerjoin(Category, Product.category_id == Category.id)
+            .where(Product.is_active == True, Product.id > last_id)
+            .order_by(Product.id).limit(app.config['PRODUCT_IMPORT_BATCH_SIZE'])
+        ).all()
+        if not rows:
+            return
+        for row in rows:
+            yield tuple(row)[1:]
+        last_id = rows[-1].id
+
+@app.route('/api/products/import', methods=['POST'])
+@login_required
+def import_products_route():
+    if current_user.role not in ('admin', 'manager'):
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'message': 'يرجى اختيار ملف CSV أو XLSX'}), 400
+    try:
+        result = import_products(upload.stream, upload.filename)
+    except ImportFileError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if result.get('aborted'):
+        # الدفعات السابقة للخطأ محفوظة، فيعاد عددها مع الخطأ
+        return jsonify(dict(result, success=False, message=(
+            f"توقف الاستيراد: {result['error']}. تم قبل التوقف إضافة {result['created']} "
+            f"وتحديث {result['updated']} منتج"))), 400 if result['aborted'] == 'file' else 500
+    return jsonify(dict(result, success=True,
+                        message=f"تم إضافة {result['created']} وتحديث {result['updated']} منتج، وفشل {result['failed']} صف"))
+
+@app.route('/api/products/export')
+@login_required
+def export_products():
+    if current_user.role not in ('admin', 'manager'):
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+    filename = f"products_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if request.args.get('format') == 'xlsx':
+        # openpyxl يكتب الملف كاملاً قبل ضغطه، فيكتب في ملف مؤقت ثم يرسل على أجزاء
+        handle, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(handle)
+        write_xlsx(_export_product_rows(), path)
+
+        def chunks():
+            try:
+                with open(path, 'rb') as f:
+                    yield from iter(lambda: f.read(64 * 1024), b'')
+            finally:
+                os.remove(path)
+
+        return Response(chunks(), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.xlsx',
+                                 'Content-Length': str(os.path.getsize(path))})
+    return Response(stream_with_context(csv_chunks(_export_product_rows())), mimetype='text/csv; charset=utf-8',
+                    headers={'Content-Disposition': f'attachment; filename={filename}.csv'})
+
+@app.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_products_command(path):
+    """استيراد ملف منتجات CSV أو XLSX (upsert بالباركود)"""
+    with open(path, 'rb') as f:
+        try:
+            result = import_products(f, path)
+        except ImportFileError as e:
+            raise click.ClickException(str(e))
+    if result.get('aborted'):
+        print(f"توقف الاستيراد: {result['error']}")
+    print(f"أضيف {result['created']}، حدث {result['updated']}، فشل {result['failed']} صف "
+          f"في {result['seconds']} ثانية ({result['rows_per_s']} صف/ثانية)")
+    for error in result['errors']:
+        print(f"  السطر {error['row']}: {error['message']}")
+
 @app.route('/pos')
 @login_required
 def pos():
-    # Get all active products for POS
-    products = Product.query.filter_by(is_active=True).filter(Product.stock_quantity > 0).all()
-    categories = Category.query.filter_by(is_active=True).all()
-    customers = Customer.query.filter_by(is_active=True).all()
-
+    # Serve the POS screen from the in-memory catalog
     return render_template('pos.html',
-                         products=products,
-                         categories=categories,
-                         customers=customers)
+                         products=catalog.products(),
+                         categories=catalog.categories())
+
+def _product_json(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'stock': product.stock,
+        'image': product.image,
+        'barcode': product.barcode
+    }
 
 @app.route('/api/products/search')
 @login_required
 def search_products():
     query = request.args.get('q', '')
-    category_id = request.args.get('category', '')
+    category_id = request.args.get('category', None, type=int)
 
-    # Build search query
-    products_query = Product.query.filter_by(is_active=True).filter(Product.stock_quantity > 0)
+    products = catalog.search(query, category_id, limit=20)
 
-    if query:
-        products_query = products_query.filter(
-            db.or_(
-                Product.name.contains(query),
-                Product.barcode.contains(query)
-            )
-        )
+    return jsonify([_product_json(product) for product in products])
 
-    if category_id:
-        products_query = products_query.filter(Product.category_id == category_id)
-
-    products = products_query.limit(20).all()
-
-    # Convert to JSON
-    products_data = []
-    for product in products:
-        products_data.append({
-            'id': product.id,
-            'name': product.name,
-            'price': float(product.price),
-            'stock': product.stock_quantity,
-            'image': product.image_path or '/static/images/default-product.svg',
-            'barcode': product.barcode
-        })
+# البحث بالباركود المطابق تماماً (قارئ الباركود)
+@app.route('/api/products/barcode/<path:barcode>')
+@login_required
+def product_by_barcode(barcode):
+    product = catalog.get_by_barcode(barcode.strip())
+    if not product:
+        return jsonify({'success': False, 'message': 'لا يوجد منتج بهذا الباركود'}), 404
+    return jsonify({'success': True, 'product': _product_json(product)})
+
+# البحث عن مجموعة باركودات في طلب واحد
+@app.route('/api/products/barcodes', methods=['POST'])
+@login_required
+def products_by_barcodes():
+    data = request.get_json(silent=True) or {}
+    barcodes = [str(code).strip() for code in data.get('barcodes', [])]
+    found = catalog.get_by_barcodes(barcodes)
+    return jsonify({
+        'success': True,
+        'products': {code: _product_json(product) for code, product in found.items()},
+        'missing': [code for code in barcodes if code not in found]
+    })
+
+# تحديث جداول التجميع اليومي لعملية بيع واحدة
+def _record_sale_rollups(day, cashier_id, payment_method, total_amount, lines):
+    """إضافة عملية بيع إلى التجميع اليومي داخل المعاملة الحالية.
+    lines: قائمة (product_id, category_id, quantity, revenue, cost)"""
+    summary = DailySalesSummary.__table__
+    stmt = sqlite_insert(summary).values(
+        day=day,
+        cashier_id=cashier_id,
+        tickets=1,
+        revenue=total_amount,
+        cash_revenue=total_amount if payment_method == 'cash' else 0,
+        card_revenue=total_amount if payment_method == 'card' else 0
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['day', 'cashier_id'],
+        set_={column: summary.c[column] + stmt.excluded[column]
+              for column in ('tickets', 'revenue', 'cash_revenue', 'card_revenue')}
+    ))
+
+    products = DailyProductSales.__table__
+    stmt = sqlite_insert(products)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['day', 'product_id'],
+        set_={column: products.c[column] + stmt.excluded[column]
+              for column in ('quantity', 'revenue', 'cost')}
+    ), [
+        {'day': day, 'product_id': product_id, 'category_id': category_id,
+         'quantity': quantity, 'revenue': revenue, 'cost': cost}
+        for product_id, category_id, quantity, revenue, cost in lines
+    ])
+
+def rebuild_sales_rollups(since=None):
+    """إعادة بناء جداول التجميع اليومي من سجل المبيعات يوماً بيوم، كل يوم في معاملة قصيرة مستقلة
+    حتى لا تحجب عمليات البيع. since: أول يوم يعاد بناؤه (السجل كله إذا كان None). يعيد عدد الأيام.
+    التكلفة والفئة من أسطر البيع (وقت البيع) كما في التجميع عند البيع، ومن المنتج للأسطر القديمة فقط"""
+    today = datetime.utcnow().date()
+    if since is None:
+        first = db.session.scalar(db.select(db.func.min(Sale.created_at)))
+        since = first.date() if first else today
+        db.session.execute(DailyProductSales.__table__.delete().where(DailyProductSales.day < since))
+        db.session.execute(DailySalesSummary.__table__.delete().where(DailySalesSummary.day < since))
+        db.session.commit()
 
-    return jsonify(products_data)
+    days = 0
+    day = since
+    while day <= today:
+        _rebuild_rollup_day(day)
+        day += timedelta(days=1)
+        days += 1
+    # تحديث إحصائيات المخطط حتى يختار SQLite الفهارس المغطية للتجميع
+    db.session.execute(db.text('ANALYZE daily_product_sales'))
+    db.session.commit()
+    return days
+
+def _rebuild_rollup_day(day):
+    start = datetime.combine(day, datetime.min.time())
+    in_day = db.and_(Sale.created_at >= start, Sale.created_at < start + timedelta(days=1))
+    db.session.execute(DailyProductSales.__table__.delete().where(DailyProductSales.day == day))
+    db.session.execute(DailySalesSummary.__table__.delete().where(DailySalesSummary.day == day))
+
+    db.session.execute(DailySalesSummary.__table__.insert().from_select(
+        ['day', 'cashier_id', 'tickets', 'revenue', 'cash_revenue', 'card_revenue'],
+        db.select(
+            db.literal(day, db.Date),
+            Sale.cashier_id,
+            db.func.count(Sale.id),
+            db.func.coalesce(db.func.sum(Sale.total_amount), 0),
+            db.func.coalesce(db.func.sum(db.case((Sale.payment_method == 'cash', Sale.total_amount), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((Sale.payment_method == 'card', Sale.total_amount), else_=0)), 0)
+        ).where(in_day).group_by(Sale.cashier_id)
+    ))
+
+    db.session.execute(DailyProductSales.__table__.insert().from_select(
+        ['day', 'product_id', 'category_id', 'quantity', 'revenue', 'cost'],
+        db.select(
+            db.literal(day, db.Date),
+            SaleItem.product_id,
+            db.func.max(db.func.coalesce(SaleItem.category_id, Product.category_id)),
+            db.func.sum(SaleItem.quantity),
+            db.func.sum(SaleItem.total_price),
+            db.func.sum(SaleItem.quantity * db.func.coalesce(SaleItem.unit_cost, Product.cost_price, 0))
+        ).select_from(SaleItem).join(Sale, SaleItem.sale_id == Sale.id)
+        .outerjoin(Product, SaleItem.product_id == Product.id)
+        .where(in_day).group_by(SaleItem.product_id)
+    ))
+    db.session.commit()
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """إعادة بناء جداول التجميع اليومي للمبيعات"""
+    days = rebuild_sales_rollups()
+    print(f'تم إعادة بناء جداول التجميع اليومي للمبيعات ({days} يوم)')
+
+# دفتر نقاط الولاء: التجميع في أرصدة العملاء وقراءة الرصيد الدقيق
+def _loyalty_watermark():
+    return db.session.scalar(db.select(LoyaltyFoldState.last_entry_id)
+                             .where(LoyaltyFoldState.name == 'ledger')) or 0
+
+def fold_loyalty_ledger():
+    """إضافة أسطر الدفتر بعد العلامة لأرصدة العملاء وتحريك العلامة في معاملة واحدة، ويعيد عدد الأسطر"""
+    # الكتابة أولاً تحجز قفل الكتابة، فتقرأ العلامة وآخر سطر دون أن يتغيرا حتى الالتزام
+    db.session.execute(sqlite_insert(LoyaltyFoldState.__table__)
+                       .values(name='ledger', last_entry_id=0).on_conflict_do_nothing())
+    watermark = _loyalty_watermark()
+    last_id = db.session.scalar(db.select(db.func.max(LoyaltyLedger.id))) or 0
+    if last_id <= watermark:
+        db.session.commit()
+        return 0
+    pending = db.session.execute(
+        db.select(LoyaltyLedger.customer_id, db.func.sum(LoyaltyLedger.points),
+                  db.func.sum(LoyaltyLedger.amount), db.func.count())
+        .where(LoyaltyLedger.id > watermark, LoyaltyLedger.id <= last_id)
+        .group_by(LoyaltyLedger.customer_id)
+    ).all()
+    customer = Customer.__table__
+    db.session.execute(
+        customer.update().where(customer.c.id == db.bindparam('customer_id')).values(
+            loyalty_points=db.func.coalesce(customer.c.loyalty_points, 0) + db.bindparam('points'),
+            total_purchases=db.func.coalesce(customer.c.total_purchases, 0) + db.bindparam('amount')
+        ),
+        [{'customer_id': customer_id, 'points': points, 'amount': amount}
+         for customer_id, points, amount, _ in pending]
+    )
+    db.session.execute(LoyaltyFoldState.__table__.update()
+                       .where(LoyaltyFoldState.name == 'ledger').values(last_entry_id=last_id))
+    db.session.commit()
+    return sum(count for _, _, _, count in pending)
+
+def loyalty_balances(customer_ids):
+    """الأسطر غير المجمعة بعد {customer_id: (points, amount)} لإضافتها لرصيد العميل المخزن"""
+    if not customer_ids:
+        return {}
+    return {customer_id: (points, amount) for customer_id, points, amount in db.session.execute(
+        db.select(LoyaltyLedger.customer_id, db.func.sum(LoyaltyLedger.points), db.func.sum(LoyaltyLedger.amount))
+        .where(LoyaltyLedger.customer_id.in_(list(customer_ids)), LoyaltyLedger.id > _loyalty_watermark())
+        .group_by(LoyaltyLedger.customer_id)
+    )}
+
+@app.cli.command('fold-loyalty')
+def fold_loyalty_command():
+    """تجميع دفتر نقاط الولاء في أرصدة العملاء"""
+    print(f'تم تجميع {fold_loyalty_ledger()} سطراً من دفتر الولاء')
+
+# المهام الخلفية: النسخ التلقائي وإعادة بناء التجميعات وتجميع دفتر الولاء وتقليم سجل الكتالوج في عملية القائد فقط، وتسخين
+# ذاكرة الكتالوج المؤقتة مرة واحدة في كل عملية عند بدئها
+scheduler = JobScheduler(os.path.join(app.instance_path, 'scheduler_state.json'),
+                         os.path.join(app.instance_path, 'scheduler.lock'))
+
+def _scheduled_backup():
+    with app.app_context():
+        try:
+            job = backup_engine.run(db.engine.url.database, 'auto', app.config['BACKUP_SCHEDULE_MODE'])
+        except RuntimeError:
+            return False   # نسخة يدوية جارية تكفي لهذه الدورة
+    if job.status != 'completed':
+        raise RuntimeError(job.error or 'فشل النسخ الاحتياطي التلقائي')
+
+def _scheduled_rollup_rebuild():
+    # مطابقة الأيام الأخيرة فقط؛ إعادة بناء السجل كله بأمر rebuild-rollups عند الحاجة
+    with app.app_context():
+        rebuild_sales_rollups(datetime.utcnow().date() - timedelta(days=app.config['ROLLUP_REBUILD_DAYS'] - 1))
+    dashboard_cache.invalidate()
+
+def _scheduled_loyalty_fold():
+    with app.app_context():
+        if not fold_loyalty_ledger():
+            return False
+
+def _scheduled_catalog_changes_prune():
+    # العمليات المتأخرة عن الجزء المحذوف تعيد تحميل الكتالوج كله
+    with app.app_context():
+        last = db.session.execute(db.select(db.func.max(CatalogChange.id))).scalar() or 0
+        deleted = db.session.execute(
+            db.delete(CatalogChange).where(CatalogChange.id <= last - max(app.config['CATALOG_CHANGES_KEEP'], 1))
+        ).rowcount
+        db.session.commit()
+    if not deleted:
+        return False
+
+def _warm_caches():
+    with app.app_context():
+        catalog.products()
+        catalog.categories()
+        catalog.customers()
+
+scheduler.add('backup', app.config['BACKUP_INTERVAL_HOURS'] * 3600, _scheduled_backup)
+scheduler.add('rebuild_rollups', app.config['ROLLUP_REBUILD_HOURS'] * 3600, _scheduled_rollup_rebuild)
+scheduler.add('fold_loyalty', app.config['LOYALTY_FOLD_MINUTES'] * 60, _scheduled_loyalty_fold)
+scheduler.add('prune_catalog_changes', 3600, _scheduled_catalog_changes_prune)
+scheduler.add('warm_caches', None, _warm_caches, leader_only=False)
+
+def start_scheduler(use_reloader=False):
+    """تشغيل المهام الخلفية في عملية الخادم. تستدعيها نقاط تشغيل الخادم فقط (app.py وrun.py وwsgi.py)،
+    فلا تبدأ عند استيراد التطبيق في أوامر CLI أو test_client أو السكربتات.
+    use_reloader: الخادم يعمل بمُعيد التحميل (debug=True)، فلا تبدأ في العملية الأم التي تراقب الملفات فقط"""
+    if not app.config['SCHEDULER_ENABLED']:
+        return
+    if use_reloader and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    scheduler.start()
+
+@app.route('/api/scheduler/status')
+@login_required
+def scheduler_status():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+    return jsonify({'success': True, 'scheduler': scheduler.status()})
+
+# محرك التقارير: يقرأ من جداول التجميع اليومي بتجميعات SQL فقط
+def _parse_report_dates():
+    """قراءة فترة التقرير من الطلب (آخر 30 يوماً افتراضياً)"""
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=30)
+    try:
+        if request.args.get('end_date'):
+            end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date()
+        if request.args.get('start_date'):
+            start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+    except ValueError:
+        pass
+    return start_date, end_date
+
+def sales_summary(start_date, end_date):
+    """الإيرادات وعدد الفواتير وتوزيع طرق الدفع والتكلفة وهامش الربح خلال الفترة"""
+    revenue, tickets, cash_revenue, card_revenue = db.session.query(
+        db.func.coalesce(db.func.sum(DailySalesSummary.revenue), 0),
+        db.func.coalesce(db.func.sum(DailySalesSummary.tickets), 0),
+        db.func.coalesce(db.func.sum(DailySalesSummary.cash_revenue), 0),
+        db.func.coalesce(db.func.sum(DailySalesSummary.card_revenue), 0)
+    ).filter(DailySalesSummary.day.between(start_date, end_date)).one()
+
+    items_revenue, cost = db.session.query(
+        db.func.coalesce(db.func.sum(DailyProductSales.revenue), 0),
+        db.func.coalesce(db.func.sum(DailyProductSales.cost), 0)
+    ).filter(DailyProductSales.day.between(start_date, end_date)).one()
+
+    margin = items_revenue - cost
+    return {
+        'revenue': float(revenue),
+        'tickets': tickets,
+        'average_ticket': float(revenue) / tickets if tickets else 0.0,
+        'cash_revenue': float(cash_revenue),
+        'card_revenue': float(card_revenue),
+        'other_revenue': float(revenue - cash_revenue - card_revenue),
+        'cost': float(cost),
+        'margin': float(margin),
+        'margin_percent': float(margin) / float(items_revenue) * 100 if items_revenue else 0.0
+    }
+
+def top_products(start_date, end_date, limit=10, order_by='quantity'):
+    """أفضل المنتجات خلال الفترة حسب الكمية أو الإيرادات مع هامش الربح"""
+    totals = db.session.query(
+        DailyProductSales.product_id.label('product_id'),
+        db.func.sum(DailyProductSales.quantity).label('sold_quantity'),
+        db.func.sum(DailyProductSales.revenue).label('revenue'),
+        db.func.sum(DailyProductSales.cost).label('cost')
+    ).filter(DailyProductSales.day.between(start_date, end_date)) \
+        .group_by(DailyProductSales.product_id)
+    order = db.desc('revenue') if order_by == 'revenue' else db.desc('sold_quantity')
+    totals = totals.order_by(order).limit(limit).subquery()
+
+    rows = db.session.query(
+        totals.c.product_id, Product.name, totals.c.sold_quantity, totals.c.revenue, totals.c.cost
+    ).join(Product, Product.id == totals.c.product_id) \
+        .order_by(totals.c.revenue.desc() if order_by == 'revenue' else totals.c.sold_quantity.desc()).all()
+
+    return [{
+        'id': row.product_id,
+        'name': row.name,
+        'sold_quantity': row.sold_quantity,
+        'revenue': float(row.revenue),
+        'margin': float(row.revenue - row.cost)
+    } for row in rows]
+
+def daily_sales(start_date, end_date):
+    """الإيرادات وعدد الفواتير لكل يوم في الفترة"""
+    rows = db.session.query(
+        DailySalesSummary.day,
+        db.func.sum(DailySalesSummary.revenue),
+        db.func.sum(DailySalesSummary.tickets)
+    ).filter(DailySalesSummary.day.between(start_date, end_date)) \
+        .group_by(DailySalesSummary.day).order_by(DailySalesSummary.day).all()
+    return [{'date': day.isoformat(), 'revenue': float(revenue), 'tickets': tickets} for day, revenue, tickets in rows]
+
+def sales_by_category(start_date, end_date):
+    """الإيرادات والكميات لكل فئة خلال الفترة"""
+    totals = db.session.query(
+        DailyProductSales.category_id.label('category_id'),
+        db.func.sum(DailyProductSales.quantity).label('quantity'),
+        db.func.sum(DailyProductSales.revenue).label('revenue')
+    ).filter(DailyProductSales.day.between(start_date, end_date)) \
+        .group_by(DailyProductSales.category_id).subquery()
+    rows = db.session.query(Category.name, totals.c.quantity, totals.c.revenue) \
+        .select_from(totals).outerjoin(Category, Category.id == totals.c.category_id) \
+        .order_by(totals.c.revenue.desc()).all()
+    return [{'category': name or 'بدون فئة', 'quantity': quantity, 'revenue': float(revenue)}
+            for name, quantity, revenue in rows]
 
 @app.route('/reports')
 @login_required
 def reports():
 
-    # حساب التواريخ الافتراضية
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=30)
+    # فترة التقرير
+    start_date, end_date = _parse_report_dates()
 
     # حساب الإحصائيات
     total_products = Product.query.filter_by(is_active=True).count()
@@ -320,28 +1249,40 @@ def reports():
         Product.stock_quantity > 0
     ).count()
 
-    # أفضل المنتجات (محاكاة)
-    top_products = Product.query.filter_by(is_active=True).limit(5).all()
-    for product in top_products:
-        product.sold_quantity = 50  # محاكاة
-        product.revenue = product.price * 50
+    summary = sales_summary(start_date, end_date)
 
     # منتجات قليلة المخزون
     low_stock_items = Product.query.filter(
         Product.is_active == True,
         Product.stock_quantity <= Product.min_stock
-    ).limit(10).all()
+    ).order_by(Product.stock_quantity).limit(10).all()
 
     return render_template('reports.html',
                          start_date=start_date,
                          end_date=end_date,
-                         total_revenue=45750.00,  # محاكاة
-                         total_sales=150,  # محاكاة
+                         total_revenue=summary['revenue'],
+                         total_sales=summary['tickets'],
                          total_products=total_products,
                          low_stock_products=low_stock_products,
-                         top_products=top_products,
+                         top_products=top_products(start_date, end_date, limit=5),
                          low_stock_items=low_stock_items)
 
+# API بيانات التقارير للفترة المحددة
+@app.route('/api/reports/sales')
+@login_required
+def reports_data():
+    start_date, end_date = _parse_report_dates()
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify({
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'summary': sales_summary(start_date, end_date),
+        'top_by_quantity': top_products(start_date, end_date, limit, 'quantity'),
+        'top_by_revenue': top_products(start_date, end_date, limit, 'revenue'),
+        'daily': daily_sales(start_date, end_date),
+        'categories': sales_by_category(start_date, end_date)
+    })
+
 @app.route('/users')
 @login_required
 def users():
@@ -351,7 +1292,6 @@ def users():
         return redirect(url_for('dashboard'))
 
     # الحصول على معاملات البحث والفلترة
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     role_filter = request.args.get('role', '')
     status_filter = request.args.get('status', '')
@@ -375,22 +1315,14 @@ def users():
         query = query.filter(User.is_active == is_active)
 
     # ترتيب وترقيم
-    users = query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
-
-    # حساب الإحصائيات
-    total_users = User.query.count()
-    active_users = User.query.filter_by(is_active=True).count()
-    admin_users = User.query.filter_by(role='admin').count()
-    cashier_users = User.query.filter_by(role='cashier').count()
+    users = paginate_listing('users', query, User, (search, role_filter, status_filter))
 
     return render_template('users.html',
                          users=users,
-                         total_users=total_users,
-                         active_users=active_users,
-                         admin_users=admin_users,
-                         cashier_users=cashier_users)
+                         search=search,
+                         role_filter=role_filter,
+                         status_filter=status_filter,
+                         **user_stats())
 
 @app.route('/add_user', methods=['POST'])
 @login_required
@@ -438,6 +1370,9 @@ def add_user():
 
         db.session.add(new_user)
         db.session.commit()
+        listing_counts.invalidate()
+        listing_stats.invalidate('users')
+        user_cache.invalidate(new_user.id)
 
         flash(f'تم إضافة المستخدم {username} بنجاح', 'success')
 
@@ -447,6 +1382,24 @@ def add_user():
 
     return redirect(url_for('users'))
 
+@app.route('/api/users/<int:user_id>/toggle_status', methods=['POST'])
+@login_required
+def toggle_user_status(user_id):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+    if user_id == current_user.id:
+        return jsonify({'success': False, 'message': 'لا يمكنك تعطيل حسابك'}), 400
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return jsonify({'success': False, 'message': 'المستخدم غير موجود'}), 404
+    user.is_active = not user.is_active
+    db.session.commit()
+    listing_stats.invalidate('users')
+    # المستخدم المعطل تنتهي جلسته في طلبه التالي في هذه العملية، وبعد USER_CACHE_TTL في غيرها
+    user_cache.invalidate(user_id)
+    return jsonify({'success': True, 'is_active': user.is_active})
+
 @app.route('/backup')
 @login_required
 def backup():
@@ -455,34 +1408,69 @@ def backup():
         flash('ليس لديك صلاحية للوصول لهذه الصفحة', 'error')
         return redirect(url_for('dashboard'))
 
-    # محاكاة بيانات النسخ الاحتياطية
-    backups = [
-        {
-            'filename': 'backup_2024_01_15_14_30.zip',
-            'created_at': datetime.now() - timedelta(days=1),
-            'file_size': '2.5 MB',
-            'backup_type': 'auto',
+    # القائمة من فهرس النسخ دون فتح أي أرشيف
+    backups = []
+    for entry in backup_engine.catalog.list():
+        backups.append({
+            'filename': entry['name'],
+            'kind': entry['kind'],
+            'created_at': datetime.fromisoformat(entry['created_at']),
+            'file_size': _format_size(entry['size']),
+            'duration': entry['duration'],
+            'backup_type': entry['type'],
+            'verification': entry['verification'],
             'status': 'completed'
-        },
-        {
-            'filename': 'backup_2024_01_14_09_15.zip',
-            'created_at': datetime.now() - timedelta(days=2),
-            'file_size': '2.3 MB',
-            'backup_type': 'manual',
-            'status': 'completed'
-        }
-    ]
+        })
+    summary = backup_engine.catalog.summary()
+    db_path = db.engine.url.database
 
     return render_template('backup.html',
                          backups=backups,
-                         total_backups=len(backups),
-                         last_backup_date='2024-01-15 14:30',
-                         database_size='2.1 MB',
-                         auto_backup_status='مفعل',
-                         backup_frequency='24',
-                         storage_used='4.8 MB',
-                         auto_backup_enabled=True,
-                         max_backups=10)
+                         total_backups=summary['count'],
+                         last_backup_date=summary['last_backup'][:16].replace('T', ' ') if summary['last_backup'] else None,
+                         database_size=_format_size(os.path.getsize(db_path)) if db_path and os.path.exists(db_path) else None,
+                         auto_backup_status='مفعل' if app.config['SCHEDULER_ENABLED'] else 'معطل',
+                         backup_frequency=str(app.config['BACKUP_INTERVAL_HOURS']),
+                         storage_used=_format_size(summary['total_size']),
+                         auto_backup_enabled=app.config['SCHEDULER_ENABLED'],
+                         max_backups=app.config['BACKUP_MAX_BACKUPS'])
+
+def _format_size(size):
+    if size >= 1024 * 1024:
+        return f'{size / (1024 * 1024):.1f} MB'
+    return f'{size / 1024:.1f} KB'
+
+@app.route('/api/backup/download/<path:filename>')
+@login_required
+def download_backup(filename):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+
+    entry = backup_engine.catalog.get(filename)
+    if entry is None or entry['kind'] != 'archive':
+        return jsonify({'success': False, 'message': 'النسخة الاحتياطية غير موجودة'}), 404
+    return send_from_directory(backup_engine.backup_dir, entry['name'], as_attachment=True)
+
+@app.route('/api/backup/<path:filename>', methods=['DELETE'])
+@login_required
+def delete_backup(filename):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+
+    if not backup_engine.delete(filename):
+        return jsonify({'success': False, 'message': 'النسخة الاحتياطية غير موجودة'}), 404
+    return jsonify({'success': True, 'message': 'تم حذف النسخة الاحتياطية'})
+
+@app.route('/api/backup/verify/<path:filename>', methods=['POST'])
+@login_required
+def verify_backup_route(filename):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+
+    result = backup_engine.verify(filename)
+    if result is None:
+        return jsonify({'success': False, 'message': 'النسخة الاحتياطية غير موجودة'}), 404
+    return jsonify({'success': True, 'verification': result})
 
 @app.route('/api/backup/create', methods=['POST'])
 @login_required
@@ -491,50 +1479,127 @@ def create_backup():
     if current_user.role != 'admin':
         return jsonify({'success': False, 'message': 'ليس لديك صلاحية'})
 
+    # النسخ يعمل في الخلفية، والواجهة تتابع التقدم برقم المهمة
+    data = request.get_json(silent=True) or {}
+    mode = 'incremental' if data.get('mode') == 'incremental' else 'archive'
     try:
-        # إنشاء مجلد النسخ الاحتياطية إذا لم يكن موجوداً
-        backup_dir = os.path.join(os.path.dirname(__file__), 'backups')
-        os.makedirs(backup_dir, exist_ok=True)
-
-        # إنشاء اسم الملف
-        timestamp = datetime.now().strftime('%Y_%m_%d_%H_%M')
-        backup_filename = f'backup_{timestamp}.zip'
-        backup_path = os.path.join(backup_dir, backup_filename)
-
-        # نسخ قاعدة البيانات
-        db_path = os.path.join(os.path.dirname(__file__), 'supermarket.db')
-
-        import zipfile
-        with zipfile.ZipFile(backup_path, 'w') as zipf:
-            if os.path.exists(db_path):
-                zipf.write(db_path, 'supermarket.db')
-
-            # إضافة ملفات أخرى إذا لزم الأمر
-            static_dir = os.path.join(os.path.dirname(__file__), 'static')
-            if os.path.exists(static_dir):
-                for root, dirs, files in os.walk(static_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, os.path.dirname(__file__))
-                        zipf.write(file_path, arcname)
-
-        return jsonify({
-            'success': True,
-            'message': 'تم إنشاء النسخة الاحتياطية بنجاح',
-            'filename': backup_filename
-        })
-
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'فشل في إنشاء النسخة الاحتياطية: {str(e)}'
-        })
+        job = backup_engine.start(db.engine.url.database, 'manual', mode, data.get('codec'), data.get('level'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'message': 'بدأ إنشاء النسخة الاحتياطية',
+        'job': job.to_dict()
+    })
+
+@app.route('/api/backup/jobs/<job_id>')
+@login_required
+def backup_job_status(job_id):
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+
+    job = backup_engine.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'مهمة النسخ غير موجودة'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+RESTORE_GROUPS = ('database', 'static', 'config')
+# الملف المرفوع لا يستعيد الإعدادات إلا إذا طلبت صراحة
+UPLOAD_RESTORE_GROUPS = ('database', 'static')
+# مهلة انتظار انتهاء الطلبات الجارية قبل استبدال ملف قاعدة البيانات (بالثواني)
+RESTORE_DRAIN_TIMEOUT = 5
+
+def _close_database_connections():
+    """إعادة اتصال الطلب الحالي وانتظار عودة اتصالات الخيوط الأخرى إلى المجمع ثم إغلاقه.
+    يعيد عدد الاتصالات التي بقيت مستخدمة، فيرفض swap_database الاستبدال إن لم يكن صفراً"""
+    db.session.remove()
+    pool = db.engine.pool
+    deadline = time.monotonic() + RESTORE_DRAIN_TIMEOUT
+    while pool.checkedout() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    in_use = pool.checkedout()
+    if not in_use:
+        db.engine.dispose()
+    return in_use
+
+@app.route('/api/backup/restore', methods=['POST'])
+@login_required
+def restore_backup_route():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'ليس لديك صلاحية'}), 403
+
+    # ملف مرفوع، أو اسم نسخة موجودة في مجلد النسخ
+    upload = request.files.get('backup_file')
+    data = request.get_json(silent=True) or {}
+    groups = request.form.getlist('groups') if upload else data.get('groups')
+    if groups and not set(groups) <= set(RESTORE_GROUPS):
+        return jsonify({'success': False, 'message': 'نوع استعادة غير معروف'}), 400
+    restore_groups = set(groups) if groups else (set(UPLOAD_RESTORE_GROUPS) if upload else None)
+
+    if upload:
+        path = os.path.join(backup_engine.backup_dir, f'.upload_{os.urandom(8).hex()}.zip')
+        os.makedirs(backup_engine.backup_dir, exist_ok=True)
+        upload.save(path)
+    else:
+        entry = backup_engine.catalog.get(data.get('filename') or '')
+        if entry is None:
+            return jsonify({'success': False, 'message': 'النسخة الاحتياطية غير موجودة'}), 404
+        filename = entry['name']
+        path = os.path.join(backup_engine.backup_dir, filename)
+
+    db_path = db.engine.url.database
+    snapshot_dir = None
+    # آخر رقم في سجل الكتالوج قبل الاستبدال: سجل القاعدة المستعادة يكمل بعده فترى كل العمليات التغيير
+    last_change = db.session.execute(db.select(db.func.max(CatalogChange.id))).scalar() or 0
+    try:
+        # النسخة المختارة مثبتة: سياسة الاحتفاظ بعد لقطة ما قبل الاستعادة لا تحذفها وإن كانت الأقدم
+        with backup_engine.pinned(*([] if upload else [filename])):
+            # لقطة تزايدية سريعة من الحالة الحالية قبل الاستبدال
+            pre_restore = backup_engine.run(db_path, 'pre_restore', 'incremental')
+            if pre_restore.status != 'completed':
+                return jsonify({'success': False, 'message': f'فشل نسخ الحالة الحالية: {pre_restore.error}'}), 500
+            if not upload and entry['kind'] == 'snapshot':
+                # اللقطة التزايدية تبنى أولاً في مجلد مؤقت مع التحقق من بصمة كل جزء
+                snapshot_dir = path = os.path.join(backup_engine.backup_dir, f'.restore_{filename}')
+                backup_engine.snapshots.restore(filename, snapshot_dir)
+            result = restore_backup(path, default_routes(os.path.dirname(os.path.abspath(__file__)), db_path),
+                                    restore_groups, before_swap=_close_database_connections)
+    except (RestoreError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except OSError as e:
+        return jsonify({'success': False, 'message': f'تعذر قراءة النسخة الاحتياطية: {e}'}), 500
+    finally:
+        if upload and os.path.exists(path):
+            os.remove(path)
+        if snapshot_dir is not None and os.path.exists(snapshot_dir):
+            shutil.rmtree(snapshot_dir)
+
+    # استعادة كاملة نجحت ببصمات كل ملف (أو بأجزاء لقطة تم التحقق منها) تثبت سلامة النسخة
+    if not upload and not groups and (entry['kind'] == 'snapshot' or not result['unverified']):
+        backup_engine.catalog.set_verification(filename, 'verified')
+    if 'database' in result['groups']:
+        init_db()
+        restored_last = db.session.execute(db.select(db.func.max(CatalogChange.id))).scalar() or 0
+        db.session.execute(CatalogChange.__table__.insert().values(id=max(last_change, restored_last) + 1))
+        db.session.commit()
+        catalog.sync(force=True)
+        dashboard_cache.invalidate()
+        listing_counts.invalidate()
+        listing_stats.invalidate()
+        user_cache.invalidate()
+    return jsonify({
+        'success': True,
+        'message': 'تمت استعادة النسخة الاحتياطية بنجاح',
+        'restore': result,
+        'pre_restore': pre_restore.filename
+    })
 
 @app.route('/customers')
 @login_required
 def customers():
     # الحصول على معاملات البحث والفلترة
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     type_filter = request.args.get('type', '')
     status_filter = request.args.get('status', '')
@@ -559,31 +1624,40 @@ def customers():
         query = query.filter(Customer.is_active == is_active)
 
     # ترتيب وترقيم
-    customers = query.order_by(Customer.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
-
-    # حساب الإحصائيات
-    total_customers = Customer.query.count()
-    vip_customers = Customer.query.filter_by(customer_type='vip').count()
-
-    # حساب متوسط المشتريات
-    avg_purchases = db.session.query(db.func.avg(Customer.total_purchases)).scalar() or 0
-
-    # حساب إجمالي النقاط
-    total_points = db.session.query(db.func.sum(Customer.loyalty_points)).scalar() or 0
-
-    # حساب العملاء الجدد هذا الشهر
-    start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    new_customers_this_month = Customer.query.filter(Customer.created_at >= start_of_month).count()
+    customers = paginate_listing('customers', query, Customer, (search, type_filter, status_filter))
 
     return render_template('customers.html',
                          customers=customers,
-                         total_customers=total_customers,
-                         vip_customers=vip_customers,
-                         avg_purchases=f"{avg_purchases:.2f}",
-                         total_points=total_points,
-                         new_customers_this_month=new_customers_this_month)
+                         pending_loyalty=loyalty_balances([customer.id for customer in customers]),
+                         search=search,
+                         type_filter=type_filter,
+                         status_filter=status_filter,
+                         **customer_stats())
+
+@app.route('/api/customers/<int:customer_id>/loyalty')
+@login_required
+def customer_loyalty(customer_id):
+    """رصيد النقاط وإجمالي المشتريات الدقيق (المجمع + أسطر الدفتر بعد آخر تجميع)"""
+    customer = db.session.get(Customer, customer_id)
+    if customer is None:
+        return jsonify({'success': False, 'message': 'العميل غير موجود'}), 404
+    points, amount = loyalty_balances([customer_id]).get(customer_id, (0, 0))
+    return jsonify({
+        'success': True,
+        'customer_id': customer_id,
+        'loyalty_points': (customer.loyalty_points or 0) + points,
+        'total_purchases': round((customer.total_purchases or 0) + amount, 2),
+        'pending_points': points
+    })
+
+@app.route('/api/customers/lookup')
+@login_required
+def customer_lookup():
+    """البحث عن عميل ببادئة رقم الهاتف من فهرس الذاكرة (إرفاق العميل في نقطة البيع)"""
+    phone = request.args.get('phone', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    return jsonify([{'id': customer.id, 'name': customer.name, 'phone': customer.phone}
+                    for customer in catalog.lookup_customers(phone, limit)])
 
 @app.route('/add_customer', methods=['POST'])
 @login_required
@@ -631,7 +1705,12 @@ def add_customer():
         )
 
         db.session.add(new_customer)
+        db.session.flush()
+        _record_catalog_changes('customers', [new_customer.id])
         db.session.commit()
+        listing_counts.invalidate()
+        listing_stats.invalidate('customers')
+        catalog.sync(force=True)
 
         flash(f'تم إضافة العميل {name} بنجاح', 'success')
 
@@ -641,6 +1720,112 @@ def add_customer():
 
     return redirect(url_for('customers'))
 
+# خصم كميات السلة من المخزون بتحديث شرطي واحد
+def _decrement_stock(quantities):
+    """خصم الكميات {product_id: quantity} بجملة UPDATE واحدة.
+    يعيد True إذا خُصمت جميع الأسطر، وFalse إذا كان مخزون أي منتج غير كافٍ."""
+    quantity = db.case(quantities, value=Product.id)
+    result = db.session.execute(
+        Product.__table__.update()
+        .where(Product.id.in_(list(quantities)))
+        .where(Product.stock_quantity >= quantity)
+        .values(stock_quantity=Product.stock_quantity - quantity)
+    )
+    return result.rowcount == len(quantities)
+
+def _is_database_locked(error):
+    """التحقق من أن الخطأ ناتج عن انشغال قاعدة البيانات بعملية كتابة أخرى"""
+    return 'database is locked' in str(getattr(error, 'orig', error))
+
+# محرك حجز المخزون الآمن مع تعدد نقاط البيع
+def reserve_stock(quantities):
+    """حجز الكميات {product_id: quantity} داخل المعاملة الحالية بالمقارنة والخصم في SQL.
+    يعيد قائمة معرفات المنتجات التي لا يكفي مخزونها (فارغة عند النجاح)،
+    وفي حالة الفشل يتم التراجع عن المعاملة بالكامل.
+    عند انشغال قاعدة البيانات يعاد المحاولة مع تأخير متزايد."""
+    retries = app.config['STOCK_LOCK_RETRIES']
+    for attempt in range(retries + 1):
+        try:
+            if _decrement_stock(quantities):
+                return []
+            db.session.rollback()
+            return [row.id for row in db.session.query(Product.id).filter(
+                Product.id.in_(list(quantities)),
+                Product.stock_quantity < db.case(quantities, value=Product.id)
+            )]
+        except OperationalError as e:
+            db.session.rollback()
+            if not _is_database_locked(e) or attempt == retries:
+                raise
+            time.sleep(app.config['STOCK_LOCK_BACKOFF'] * (2 ** attempt))
+
+def _reserve_invoice_block(size):
+    """حجز size رقماً من عداد الفواتير في معاملة مستقلة قصيرة، ويعيد أول رقم.
+    يبدأ العداد عند أول استخدام بعد أكبر رقم عملية بيع موجودة"""
+    table = InvoiceCounter.__table__
+    with db.engine.begin() as connection:
+        connection.execute(sqlite_insert(table).values(
+            name='sale',
+            next_value=db.select(db.func.coalesce(db.func.max(Sale.id), 0) + 1).scalar_subquery()
+        ).on_conflict_do_nothing())
+        end = connection.execute(
+            table.update().where(table.c.name == 'sale')
+            .values(next_value=table.c.next_value + size)
+            .returning(table.c.next_value)
+        ).scalar_one()
+    return end - size
+
+invoice_numbers = InvoiceNumberAllocator(_reserve_invoice_block, app.config['INVOICE_BLOCK_SIZE'],
+                                         app.config['INVOICE_PREFIX'])
+
+# طرق الدفع المقبولة في عملية البيع (عمود Sale.payment_method)
+PAYMENT_METHODS = ('cash', 'card', 'mixed')
+
+def _record_sale(quantities, products_by_id, payment_method, customer_id, cashier_id, created_at, invoice_number):
+    """إنشاء عملية البيع وأسطرها وتحديث التجميع اليومي ونقاط العميل داخل المعاملة الحالية.
+    المخزون محجوز مسبقاً، وproducts_by_id صفوف المنتجات (السعر والتكلفة والفئة)"""
+    total_amount = sum(products_by_id[pid].price * qty for pid, qty in quantities.items())
+
+    sale = Sale(
+        invoice_number=invoice_number,
+        total_amount=total_amount,
+        payment_method=payment_method,
+        cashier_id=cashier_id,
+        customer_id=customer_id if customer_id else None,
+        created_at=created_at
+    )
+    db.session.add(sale)
+    db.session.flush()  # للحصول على ID
+
+    # إضافة جميع عناصر البيع بإدراج جماعي واحد
+    db.session.execute(SaleItem.__table__.insert(), [
+        {
+            'sale_id': sale.id,
+            'product_id': pid,
+            'quantity': qty,
+            'unit_price': products_by_id[pid].price,
+            'total_price': products_by_id[pid].price * qty,
+            'unit_cost': products_by_id[pid].cost_price or 0,
+            'category_id': products_by_id[pid].category_id
+        }
+        for pid, qty in quantities.items()
+    ])
+
+    # تحديث التجميع اليومي في نفس المعاملة
+    _record_sale_rollups(created_at.date(), cashier_id, payment_method, total_amount, [
+        (pid, products_by_id[pid].category_id, qty, products_by_id[pid].price * qty,
+         (products_by_id[pid].cost_price or 0) * qty)
+        for pid, qty in quantities.items()
+    ])
+
+    # نقاط العميل (1 نقطة لكل 10 جنيه) سطر في دفتر الولاء، ولا يحدث صف العميل في معاملة البيع
+    if customer_id:
+        db.session.execute(LoyaltyLedger.__table__.insert().values(
+            customer_id=customer_id, sale_id=sale.id, points=int(total_amount / 10),
+            amount=total_amount, created_at=created_at
+        ))
+    return sale
+
 # API لإتمام عملية البيع
 @app.route('/api/pos/complete_sale', methods=['POST'])
 @login_required
@@ -650,91 +1835,296 @@ def complete_sale():
         items = data.get('items', [])
         payment_method = data.get('payment_method', 'cash')
         customer_id = data.get('customer_id')
+        # معرف عملية البيع من المتصفح: إن انقطع الرد ووضعت في طابور المزامنة لا تسجل مرتين
+        client_id = str(data.get('id') or '')[:36] or None
 
         if not items:
             return jsonify({'success': False, 'message': 'لا توجد منتجات في السلة'})
-
-        # حساب المجموع
-        total_amount = 0
-        sale_items = []
-
+        if payment_method not in PAYMENT_METHODS:
+            return jsonify({'success': False, 'message': 'طريقة دفع غير معروفة'})
+        if client_id:
+            duplicate = _synced_sale_response(client_id)
+            if duplicate is not None:
+                return duplicate
+
+        # تجميع الكميات حسب المنتج (قد يتكرر المنتج في أكثر من سطر)
+        quantities = {}
+        names = {}
         for item in items:
-            product = Product.query.get(item['product_id'])
-            if not product:
-                return jsonify({'success': False, 'message': f'المنتج غير موجود: {item["name"]}'})
-
-            if product.stock_quantity < item['quantity']:
-                return jsonify({'success': False, 'message': f'المخزون غير كافي للمنتج: {product.name}'})
-
-            item_total = product.price * item['quantity']
-            total_amount += item_total
-
-            sale_items.append({
-                'product': product,
-                'quantity': item['quantity'],
-                'price': product.price,
-                'total': item_total
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+            if quantity <= 0:
+                return jsonify({'success': False, 'message': f'كمية غير صحيحة للمنتج: {item.get("name", product_id)}'})
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+            names.setdefault(product_id, item.get('name', product_id))
+
+        # تحميل جميع منتجات السلة باستعلام واحد
+        products_by_id = {
+            row.id: row for row in db.session.query(
+                Product.id, Product.name, Product.price, Product.cost_price, Product.category_id
+            ).filter(Product.id.in_(list(quantities)), Product.is_active == True).all()
+        }
+        for product_id in quantities:
+            if product_id not in products_by_id:
+                return jsonify({'success': False, 'message': f'المنتج غير موجود: {names[product_id]}'})
+
+        # نقاط الولاء تكتب في الدفتر لعميل موجود ونشط فقط
+        if customer_id not in (None, ''):
+            customer_id = _int_or_none(customer_id)
+            if customer_id not in _active_customer_ids([customer_id] if customer_id else []):
+                return jsonify({'success': False, 'message': 'العميل غير موجود'}), 400
+
+        # رقم الفاتورة قبل أي كتابة: حجز كتلة جديدة (مرة كل INVOICE_BLOCK_SIZE) يتم في معاملة مستقلة
+        invoice_number = invoice_numbers.next()
+
+        # حجز المخزون لكل السلة دفعة واحدة
+        failed = reserve_stock(quantities)
+        if failed:
+            return jsonify({
+                'success': False,
+                'message': 'المخزون غير كافي للمنتج: ' + '، '.join(products_by_id[pid].name for pid in failed),
+                'failed_items': failed
             })
 
-        # إنشاء عملية البيع
-        sale = Sale(
-            total_amount=total_amount,
-            payment_method=payment_method,
-            cashier_id=current_user.id,
-            customer_id=customer_id if customer_id else None
-        )
-        db.session.add(sale)
-        db.session.flush()  # للحصول على ID
-
-        # إضافة عناصر البيع وتحديث المخزون
-        for item in sale_items:
-            sale_item = SaleItem(
-                sale_id=sale.id,
-                product_id=item['product'].id,
-                quantity=item['quantity'],
-                price=item['price'],
-                total=item['total']
-            )
-            db.session.add(sale_item)
-
-            # تحديث المخزون
-            item['product'].stock_quantity -= item['quantity']
-
-        # تحديث نقاط العميل إذا كان موجود
-        if customer_id:
-            customer = Customer.query.get(customer_id)
-            if customer:
-                # إضافة نقاط (1 نقطة لكل 10 جنيه)
-                points_earned = int(total_amount / 10)
-                customer.loyalty_points += points_earned
-                customer.total_purchases += total_amount
+        sale = _record_sale(quantities, products_by_id, payment_method, customer_id, current_user.id,
+                            datetime.utcnow(), invoice_number)
+        total_amount = sale.total_amount
+        sale_id = sale.id
+        if client_id:
+            db.session.execute(SyncedSale.__table__.insert().values(client_id=client_id, sale_id=sale_id))
+        _record_catalog_changes('products', quantities)
 
         db.session.commit()
+        catalog.sync(force=True)
+        if customer_id:
+            listing_stats.invalidate('customers')
+        _publish_stock_events(quantities)
 
         return jsonify({
             'success': True,
             'message': 'تم إتمام عملية البيع بنجاح',
-            'sale_id': sale.id,
+            'sale_id': sale_id,
+            'invoice_number': invoice_number,
             'total': total_amount
         })
 
+    except IntegrityError:
+        # طلب آخر بالمعرف نفسه (إعادة إرسال أو مزامنة الطابور) سجل عملية البيع أولاً
+        db.session.rollback()
+        duplicate = _synced_sale_response(client_id) if client_id else None
+        return duplicate or jsonify({'success': False, 'message': 'حدث خطأ أثناء إتمام البيع'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': 'حدث خطأ أثناء إتمام البيع'})
 
+def _synced_sale_response(client_id):
+    """رد complete_sale لعملية بيع سجلت من قبل بمعرف المتصفح نفسه، أو None"""
+    row = db.session.execute(
+        db.select(Sale.id, Sale.invoice_number, Sale.total_amount)
+        .join(SyncedSale, SyncedSale.sale_id == Sale.id)
+        .where(SyncedSale.client_id == client_id)
+    ).first()
+    if row is None:
+        return None
+    return jsonify({
+        'success': True,
+        'duplicate': True,
+        'message': 'تم تسجيل عملية البيع من قبل',
+        'sale_id': row.id,
+        'invoice_number': row.invoice_number,
+        'total': row.total_amount
+    })
+
+# نقطة البيع غير المتصلة: نسخة من الكتالوج للمتصفح، ومزامنة طابور المبيعات المحلي على دفعات
+# رقم إصدار الكتالوج خاص بكل عملية، فيميز ETag العملية حتى لا تطابق نسخة من عامل آخر بالخطأ
+_CATALOG_ETAG_PREFIX = uuid.uuid4().hex[:12]
+
+@app.route('/api/pos/catalog')
+@login_required
+def pos_catalog():
+    """كل المنتجات النشطة (بما فيها نافدة المخزون للبحث بالباركود) مع ETag برقم إصدار الكتالوج.
+    العملاء لا يرسلون هنا، بل يبحث عنهم برقم الهاتف من /api/customers/lookup"""
+    products = [_product_json(product) for product in catalog.products(in_stock=False)]
+    response = jsonify({'version': catalog.version, 'products': products})
+    response.set_etag(f'{_CATALOG_ETAG_PREFIX}-{catalog.version}')
+    return response.make_conditional(request)
+
+def _parse_client_time(value):
+    """وقت البيع كما سجله المتصفح (ISO بتوقيت UTC)، ولا يقبل وقتاً في المستقبل"""
+    now = datetime.utcnow()
+    try:
+        created_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return now
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(created_at, now)
+
+def _int_or_none(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def _active_customer_ids(ids):
+    """معرفات العملاء النشطين من بين ids (لا تكتب نقاط ولاء لعميل محذوف أو موقوف)"""
+    ids = list(ids)
+    if not ids:
+        return set()
+    return set(db.session.execute(
+        db.select(Customer.id).where(Customer.id.in_(ids), Customer.is_active == True)
+    ).scalars())
+
+def _apply_synced_sales(sales, cashier_id):
+    """تسجيل دفعة مبيعات غير متصلة في معاملة واحدة باسم الكاشير cashier_id (المستخدم الذي يزامن).
+    المبيعات تمت فعلاً عند الكاشير فلا ترفض لنقص المخزون: يخصم حتى الصفر، ويعاد لكل عملية بيع
+    تجاوزت المخزون المسجل سطر في conflicts بالمنتج والكمية الناقصة (shortfall) للمراجعة والجرد"""
+    result = {'synced': [], 'duplicates': [], 'rejected': [], 'conflicts': [], 'invoices': {}}
+    client_ids = [str(sale.get('id', '')) for sale in sales]
+    # المبيعات المسجلة من قبل تعاد في duplicates مع رقم فاتورتها (قد تكون سجلت عبر complete_sale)
+    existing = dict(db.session.execute(
+        db.select(SyncedSale.client_id, Sale.invoice_number)
+        .join(Sale, Sale.id == SyncedSale.sale_id)
+        .where(SyncedSale.client_id.in_(client_ids))
+    ).all())
+
+    accepted = []
+    for client_id, sale in zip(client_ids, sales):
+        if client_id in existing:
+            result['duplicates'].append(client_id)
+            if existing[client_id]:
+                result['invoices'][client_id] = existing[client_id]
+            continue
+        if not 8 <= len(client_id) <= 36:
+            result['rejected'].append({'id': client_id, 'message': 'معرف عملية البيع غير صالح'})
+            continue
+        quantities = {}
+        try:
+            for item in sale.get('items') or []:
+                product_id = int(item['product_id'])
+                quantity = int(item['quantity'])
+                if quantity <= 0:
+                    raise ValueError
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+        except (KeyError, TypeError, ValueError):
+            quantities = {}
+        if not quantities:
+            result['rejected'].append({'id': client_id, 'message': 'أسطر عملية البيع غير صحيحة'})
+            continue
+        if sale.get('payment_method', 'cash') not in PAYMENT_METHODS:
+            result['rejected'].append({'id': client_id, 'message': 'طريقة دفع غير معروفة'})
+            continue
+        existing[client_id] = None   # تكرار المعرف داخل الدفعة نفسها
+        accepted.append((client_id, sale, quantities))
+    if not accepted:
+        return result
+
+    product_ids = {pid for _, _, quantities in accepted for pid in quantities}
+    # المنتجات المحذوفة أو الموقوفة لا تقبل، مثل complete_sale
+    products_by_id = {
+        row.id: row for row in db.session.query(
+            Product.id, Product.name, Product.price, Product.cost_price, Product.category_id
+        ).filter(Product.id.in_(list(product_ids)), Product.is_active == True).all()
+    }
+    customer_ids = {_int_or_none(sale.get('customer_id')) for _, sale, _ in accepted}
+    known_customers = _active_customer_ids(cid for cid in customer_ids if cid)
+
+    valid = []
+    for client_id, sale, quantities in accepted:
+        missing = [pid for pid in quantities if pid not in products_by_id]
+        customer_id = _int_or_none(sale.get('customer_id'))
+        if missing:
+            message = f'منتج غير موجود: {missing[0]}'
+        elif sale.get('customer_id') and customer_id not in known_customers:
+            message = 'العميل غير موجود'
+        else:
+            valid.append((client_id, sale, quantities, customer_id))
+            continue
+        result['rejected'].append({'id': client_id, 'message': message})
+    if not valid:
+        return result
+
+    # أرقام الفواتير للمبيعات المقبولة فقط، وقبل أول كتابة في المعاملة
+    numbers = invoice_numbers.take(len(valid))
+    totals = {}
+    for (client_id, sale, quantities, customer_id), invoice_number in zip(valid, numbers):
+        record = _record_sale(quantities, products_by_id, sale.get('payment_method', 'cash'), customer_id,
+                              cashier_id, _parse_client_time(sale.get('created_at')), invoice_number)
+        # مزامنة متزامنة للمفتاح نفسه تفشل هنا بـ IntegrityError ويتراجع عن الدفعة كلها
+        db.session.execute(SyncedSale.__table__.insert().values(client_id=client_id, sale_id=record.id))
+        for pid, qty in quantities.items():
+            totals[pid] = totals.get(pid, 0) + qty
+        result['synced'].append(client_id)
+        result['invoices'][client_id] = invoice_number
+
+    # الخصم والقراءة في جملة واحدة داخل معاملة الكتابة، فالفروق من القيم الفعلية لا من قراءة سابقة
+    table = Product.__table__
+    updated = dict(db.session.execute(
+        table.update()
+        .where(table.c.id.in_(list(totals)))
+        .values(stock_quantity=table.c.stock_quantity - db.case(totals, value=table.c.id))
+        .returning(table.c.id, table.c.stock_quantity)
+    ).all())
+    oversold = [pid for pid, stock in updated.items() if stock < 0]
+    if oversold:
+        # المخزون قبل الدفعة من القيمة بعد الخصم، ثم توزيعه على المبيعات بترتيبها لمعرفة ما نقص في كل منها
+        available = {pid: stock + totals[pid] for pid, stock in updated.items()}
+        for client_id, _, quantities, _ in valid:
+            for pid, qty in quantities.items():
+                shortfall = max(qty - max(available[pid], 0), 0)
+                available[pid] -= qty
+                if shortfall:
+                    result['conflicts'].append({'id': client_id, 'product_id': pid,
+                                                'quantity': qty, 'shortfall': shortfall})
+        db.session.execute(table.update().where(table.c.id.in_(oversold)).values(stock_quantity=0))
+    _record_catalog_changes('products', updated)
+    db.session.commit()
+
+    catalog.sync(force=True)
+    if any(customer_id for _, _, _, customer_id in valid):
+        listing_stats.invalidate('customers')
+    _publish_stock_events(totals)
+    return result
+
+@app.route('/api/pos/sync', methods=['POST'])
+@login_required
+def sync_sales():
+    """استقبال طابور المبيعات المحلي. كل عملية بيع تحمل UUID من المتصفح، فإعادة إرسال الدفعة
+    بعد انقطاع الاتصال لا تكررها (تعود في duplicates)"""
+    data = request.get_json(silent=True) or {}
+    sales = data.get('sales')
+    if not isinstance(sales, list) or not sales or not all(isinstance(sale, dict) for sale in sales):
+        return jsonify({'success': False, 'message': 'لا توجد مبيعات للمزامنة'}), 400
+    if len(sales) > app.config['POS_SYNC_MAX_SALES']:
+        return jsonify({'success': False, 'message': 'عدد المبيعات في الدفعة أكبر من المسموح'}), 413
+
+    retries = app.config['STOCK_LOCK_RETRIES']
+    for attempt in range(retries + 1):
+        try:
+            result = _apply_synced_sales(sales, current_user.id)
+            break
+        except (OperationalError, IntegrityError) as e:
+            db.session.rollback()
+            # IntegrityError: مزامنة متزامنة للدفعة نفسها سبقت هذه، وإعادة المحاولة تجدها في duplicates
+            if isinstance(e, OperationalError) and not _is_database_locked(e) or attempt == retries:
+                return jsonify({'success': False, 'message': 'تعذرت المزامنة الآن، ستعاد المحاولة'}), 503
+            time.sleep(app.config['STOCK_LOCK_BACKOFF'] * (2 ** attempt))
+    return jsonify(dict(result, success=True))
+
 # صفحة الملف الشخصي
 @app.route('/profile')
 @login_required
 def profile():
-    return render_template('profile.html', user=current_user)
+    return render_template('profile.html', user=db.session.get(User, current_user.id))
 
 # تحديث الملف الشخصي
 @app.route('/update_profile', methods=['POST'])
 @login_required
 def update_profile():
     try:
-        # تحديث البيانات الأساسية
-        current_user.email = request.form.get('email', current_user.email)
+        # current_user نسخة ثابتة، فالتعديل على صف المستخدم في قاعدة البيانات
+        user = db.session.get(User, current_user.id)
+        user.email = request.form.get('email', user.email)
 
         # تحديث كلمة المرور إذا تم إدخالها
         current_password = request.form.get('current_password')
@@ -742,7 +2132,7 @@ def update_profile():
         confirm_password = request.form.get('confirm_password')
 
         if current_password and new_password:
-            if not current_user.check_password(current_password):
+            if not user.check_password(current_password):
                 flash('كلمة المرور الحالية غير صحيحة', 'error')
                 return redirect(url_for('profile'))
 
@@ -754,10 +2144,11 @@ def update_profile():
                 flash('كلمة المرور يجب أن تكون 6 أحرف على الأقل', 'error')
                 return redirect(url_for('profile'))
 
-            current_user.set_password(new_password)
+            user.set_password(new_password)
             flash('تم تحديث كلمة المرور بنجاح', 'success')
 
         db.session.commit()
+        user_cache.invalidate(user.id)
         flash('تم تحديث الملف الشخصي بنجاح', 'success')
 
     except Exception as e:
@@ -766,10 +2157,73 @@ def update_profile():
 
     return redirect(url_for('profile'))
 
+# مستشار الفهارس: فحص خطط تنفيذ استعلامات الصفحات
+# صفحات لا تفحص (بث مستمر أو تغير الجلسة)
+INDEX_ADVISOR_SKIP = {'static', 'logout', 'events_stream'}
+# روابط إضافية بمرشحات تغير شكل الاستعلام
+INDEX_ADVISOR_URLS = [
+    '/products?stock=low_stock',
+    '/products?stock=out_of_stock',
+    '/products?category=1',
+    '/customers?type=vip&status=active',
+    '/users?role=admin&status=active',
+    '/api/products/search?q=a&category=1'
+]
+# جداول صغيرة بطبيعتها لا يضر قراءتها بالكامل
+INDEX_ADVISOR_ALLOWED_SCANS = {'user', 'category'}
+
+def advise_indexes():
+    """تنفيذ كل صفحة GET بدون معاملات والروابط الإضافية كمدير، وإرجاع
+    [(الرابط، الاستعلام، خطة التنفيذ، الجداول المقروءة بالكامل)]"""
+    urls = [rule.rule for rule in app.url_map.iter_rules()
+            if 'GET' in rule.methods and not rule.arguments and rule.endpoint not in INDEX_ADVISOR_SKIP]
+    urls += INDEX_ADVISOR_URLS
+
+    admin = User.query.filter_by(role='admin', is_active=True).first()
+    if admin is None:
+        raise RuntimeError('يلزم مستخدم مدير نشط لفحص الصفحات')
+    # تحميل الكتالوج كاملاً إلى الذاكرة مقصود، لذلك يحمل قبل التقاط الاستعلامات
+    catalog.products()
+    catalog.customers()
+
+    client = app.test_client()
+    with client.session_transaction() as client_session:
+        client_session['_user_id'] = str(admin.id)
+        client_session['_fresh'] = True
+
+    tables = set(db.metadata.tables) - INDEX_ADVISOR_ALLOWED_SCANS
+    findings = []
+    with db.engine.connect() as connection:
+        for url in urls:
+            with capture_queries(db.engine) as statements:
+                client.get(url)
+            for statement, parameters in statements.items():
+                plan = explain(connection, statement, parameters)
+                findings.append((url, statement, plan, full_scans(plan, tables)))
+    return findings
+
+@app.cli.command('index-advisor')
+@click.option('--verbose', is_flag=True, help='عرض خطة كل الاستعلامات وليس فقط التي تقرأ جداول كاملة')
+def index_advisor_command(verbose):
+    """فحص استعلامات الصفحات بـ EXPLAIN QUERY PLAN وتحديد القراءة الكاملة للجداول"""
+    init_db()
+    flagged = 0
+    for url, statement, plan, scans in advise_indexes():
+        if scans:
+            flagged += 1
+        if scans or verbose:
+            print(f"{'⚠ SCAN ' + ', '.join(scans) if scans else '✔'}  {url}")
+            print('    ' + ' '.join(statement.split()))
+            for detail in plan:
+                print('      ' + detail)
+    print(f'عدد الاستعلامات التي تقرأ جداول كاملة: {flagged}')
+    if flagged:
+        raise SystemExit(1)
+
 if __name__ == '__main__':
     print("🚀 بدء تشغيل نظام إدارة السوبر ماركت...")
+    init_db()
     with app.app_context():
-        db.create_all()
         
         # إنشاء مستخدم افتراضي إذا لم يكن موجوداً
         if not User.query.filter_by(username='admin').first():
@@ -847,4 +2301,5 @@ if __name__ == '__main__':
     print("🔑 كلمة المرور: admin123")
     print("=" * 50)
 
+    start_scheduler(use_reloader=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
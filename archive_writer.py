@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""كتابة أرشيف zip بضغط متوازٍ وبرنامج ضغط قابل للاختيار.
+
+الملفات تقسم إلى كتل تضغط في مجموعة خيوط (zlib وlzma وzstd تحرر قفل المفسر أثناء الضغط)
+ثم تكتب في الأرشيف بالترتيب. كتلة deflate تضغط مستقلة بقاموس من آخر 32 كيلوبايت قبلها
+وتنتهي بتفريغ متزامن، فتكون الكتل المتتالية تيار deflate واحداً صالحاً يقرؤه أي برنامج zip
+(نفس طريقة pigz)، وكتل zstd إطارات مستقلة متتالية. تيار lzma في zip لا يقسم، لذلك تتوازى
+فيه الملفات الصغيرة فقط. الملفات المضغوطة أصلاً (صور، أرشيفات، ملفات office) تخزن كما هي.
+
+التوافق: store وdeflate (الافتراضي) يفتحهما أي برنامج zip وzipfile في Python. lzma (الطريقة 14)
+يقرؤه zipfile و7-Zip وليس كل البرامج. zstd (الطريقة 93) اختياري ولا يقرؤه zipfile ولا أغلب
+برامج فك الضغط، وتستعيده backup_restore فقط عند تثبيت zstandard.
+"""
+
+import hashlib
+import lzma
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # zstd اختياري: pip install zstandard
+    zstandard = None
+
+BLOCK_SIZE = 1024 * 1024
+DEFLATE_WINDOW = 32 * 1024
+ZIP64_LIMIT = (1 << 31) - 1
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP_LZMA = 14
+ZIP_ZSTANDARD = 93
+
+INCOMPRESSIBLE_EXTENSIONS = frozenset({
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.ico', '.mp3', '.mp4', '.webm',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar',
+    '.xlsx', '.docx', '.pptx', '.pdf', '.woff', '.woff2'
+})
+
+# حجم القاموس لكل مستوى lzma (كما في مستويات xz الافتراضية)
+_LZMA_DICT_SIZES = [1 << 18, 1 << 20, 1 << 21, 1 << 22, 1 << 22, 1 << 23, 1 << 23, 1 << 24, 1 << 25, 1 << 26]
+
+_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<4sBBHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<4sHHHHIIH')
+_END_RECORD64 = struct.Struct('<4sQHHIIQQQQ')
+_END_LOCATOR64 = struct.Struct('<4sIQI')
+_UTF8_NAME = 0x800
+
+
+class StoreCodec:
+    name = 'store'
+    method = ZIP_STORED
+    version = 20
+    flags = 0
+    blocks = True
+
+    def __init__(self, level=None):
+        self.level = None
+
+    def compress_block(self, data, previous, last):
+        return data
+
+
+class DeflateCodec:
+    name = 'deflate'
+    method = ZIP_DEFLATED
+    version = 20
+    flags = 0
+    blocks = True
+
+    def __init__(self, level=None):
+        self.level = 6 if level is None else level
+
+    def compress_block(self, data, previous, last):
+        if previous:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=previous[-DEFLATE_WINDOW:])
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class _LzmaCompressor:
+    """ضاغط lzma بصيغة zip: ترويسة الإصدار وخصائص المرشح قبل التيار الخام"""
+
+    def __init__(self, level):
+        dict_size = _LZMA_DICT_SIZES[level]
+        self._compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[{
+            'id': lzma.FILTER_LZMA1, 'preset': level, 'dict_size': dict_size, 'lc': 3, 'lp': 0, 'pb': 2
+        }])
+        properties = bytes([(2 * 5 + 0) * 9 + 3]) + struct.pack('<I', dict_size)
+        self._header = struct.pack('<BBH', 9, 4, len(properties)) + properties
+
+    def compress(self, data):
+        header, self._header = self._header, b''
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        header, self._header = self._header, b''
+        return header + self._compressor.flush()
+
+
+class LzmaCodec:
+    name = 'lzma'
+    method = ZIP_LZMA
+    version = 63
+    flags = 0x02   # نهاية التيار معلمة
+    blocks = False
+
+    def __init__(self, level=None):
+        self.level = 6 if level is None else level
+
+    def compressor(self):
+        return _LzmaCompressor(self.level)
+
+    def compress_block(self, data, previous, last):
+        """ملف كامل في كتلة واحدة فقط"""
+        compressor = self.compressor()
+        return compressor.compress(data) + compressor.flush()
+
+
+class ZstdCodec:
+    name = 'zstd'
+    method = ZIP_ZSTANDARD
+    version = 63
+    flags = 0
+    blocks = True
+
+    def __init__(self, level=None):
+        self.level = 3 if level is None else level
+
+    def compress_block(self, data, previous, last):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+
+CODECS = {codec.name: codec for codec in (StoreCodec, DeflateCodec, LzmaCodec, ZstdCodec)}
+
+
+def available_codecs():
+    return [name for name in CODECS if name != 'zstd' or zstandard is not None]
+
+
+def get_codec(name='deflate', level=None):
+    if name not in available_codecs():
+        raise ValueError(f'برنامج الضغط غير مدعوم: {name}')
+    return CODECS[name](level)
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), \
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class _Member:
+    def __init__(self, arcname, codec, mtime, mode, size):
+        self.name = arcname.replace(os.sep, '/').encode('utf-8')
+        self.codec = codec
+        self.flags = codec.flags | (0 if self.name.isascii() else _UTF8_NAME)
+        self.dos_time, self.dos_date = _dos_datetime(mtime)
+        self.mode = mode
+        self.zip64 = size * 1.05 > ZIP64_LIMIT
+        self.crc = 0
+        self.sha256 = hashlib.sha256()
+        self.file_size = 0
+        self.compress_size = 0
+        self.offset = 0
+
+    @property
+    def version(self):
+        return 45 if self.zip64 and self.codec.version < 45 else self.codec.version
+
+
+class ArchiveWriter:
+    """أرشيف zip تضغط ملفاته في مجموعة خيوط، مع إحصائيات الحجم والسرعة في stats بعد الإغلاق
+    وبصمة SHA-256 لكل ملف في hashes للتحقق عند الاستعادة.
+
+    progress(processed_bytes) بعد كتابة كل كتلة."""
+
+    def __init__(self, path, codec='deflate', level=None, workers=None, progress=None):
+        self.codec = get_codec(codec, level)
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = progress
+        self._store = StoreCodec()
+        self._file = open(path, 'wb')
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+        self._members = []
+        self.hashes = {}
+        self._started = time.perf_counter()
+        self.stats = {
+            'codec': self.codec.name,
+            'level': self.codec.level,
+            'workers': self.workers,
+            'members': 0,
+            'stored_members': 0,
+            'input_bytes': 0,
+            'output_bytes': 0,
+            'seconds': 0,
+            'mb_per_s': 0,
+            'ratio': 0
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _codec_for(self, arcname):
+        if os.path.splitext(arcname)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+            return self._store
+        return self.codec
+
+    def add_file(self, path, arcname):
+        stat = os.stat(path)
+        member = _Member(arcname, self._codec_for(arcname), stat.st_mtime, stat.st_mode, stat.st_size)
+        with open(path, 'rb') as f:
+            if not member.codec.blocks and stat.st_size > BLOCK_SIZE:
+                self._add_stream(member, f)
+                return
+            data = f.read(BLOCK_SIZE)
+            previous, first = None, True
+            while True:
+                following = f.read(BLOCK_SIZE) if len(data) == BLOCK_SIZE else b''
+                self._submit(member, data, previous, first, not following)
+                if not following:
+                    break
+                previous, data, first = data, following, False
+
+    def add_bytes(self, data, arcname):
+        member = _Member(arcname, self._codec_for(arcname), time.time(), 0o100600, len(data))
+        self._submit(member, data, None, True, True)
+
+    def _submit(self, member, data, previous, first, last):
+        member.crc = zlib.crc32(data, member.crc)
+        member.sha256.update(data)
+        member.file_size += len(data)
+        if last:
+            self._record_hash(member)
+        future = self._pool.submit(member.codec.compress_block, data, previous, last)
+        self._pending.append((member, future, first, last, len(data)))
+        while len(self._pending) > self.workers * 2:
+            self._write_next()
+
+    def _write_next(self):
+        member, future, first, last, size = self._pending.popleft()
+        if first:
+            self._write_local_header(member)
+        self._write_data(member, future.result(), size)
+        if last:
+            self._finish_member(member)
+
+    def _drain(self):
+        while self._pending:
+            self._write_next()
+
+    def _add_stream(self, member, source):
+        """ملف كبير لبرنامج ضغط لا يقسم إلى كتل: يضغط تدفقياً بعد كتابة ما سبقه"""
+        self._drain()
+        self._write_local_header(member)
+        compressor = member.codec.compressor()
+        while True:
+            data = source.read(BLOCK_SIZE)
+            if not data:
+                break
+            member.crc = zlib.crc32(data, member.crc)
+            member.sha256.update(data)
+            member.file_size += len(data)
+            self._write_data(member, compressor.compress(data), len(data))
+        self._record_hash(member)
+        self._write_data(member, compressor.flush(), 0)
+        self._finish_member(member)
+
+    def _write_data(self, member, data, size):
+        self._file.write(data)
+        member.compress_size += len(data)
+        self.stats['input_bytes'] += size
+        if self.progress is not None and size:
+            self.progress(self.stats['input_bytes'])
+
+    def _local_header(self, member):
+        extra = struct.pack('<HHQQ', 1, 16, member.file_size, member.compress_size) if member.zip64 else b''
+        sizes = (0xFFFFFFFF, 0xFFFFFFFF) if member.zip64 else (member.compress_size, member.file_size)
+        return _LOCAL_HEADER.pack(b'PK\x03\x04', member.version, member.flags, member.codec.method,
+                                  member.dos_time, member.dos_date, member.crc, *sizes,
+                                  len(member.name), len(extra)) + member.name + extra
+
+    def _record_hash(self, member):
+        """البصمة مكتملة بعد تقديم آخر كتلة، قبل أن تنتهي خيوط الضغط من كتابة الملف"""
+        self.hashes[member.name.decode('utf-8')] = member.sha256.hexdigest()
+
+    def _write_local_header(self, member):
+        member.offset = self._file.tell()
+        self._file.write(self._local_header(member))
+
+    def _finish_member(self, member):
+        """إعادة كتابة الترويسة المحلية بعد معرفة CRC والأحجام"""
+        if not member.zip64 and max(member.file_size, member.compress_size) > 0xFFFFFFFF:
+            raise ValueError(f'حجم الملف أكبر من المتوقع أثناء الأرشفة: {member.name.decode()}')
+        end = self._file.tell()
+        self._file.seek(member.offset)
+        self._file.write(self._local_header(member))
+        self._file.seek(end)
+        self._members.append(member)
+        self.stats['members'] += 1
+        if member.codec is self._store and self.codec is not self._store:
+            self.stats['stored_members'] += 1
+
+    def _central_directory(self):
+        records = []
+        for member in self._members:
+            fields, extra_values = [], []
+            for value in (member.file_size, member.compress_size, member.offset):
+                if value > ZIP64_LIMIT:
+                    fields.append(0xFFFFFFFF)
+                    extra_values.append(value)
+                else:
+                    fields.append(value)
+            extra = struct.pack(f'<HH{len(extra_values)}Q', 1, 8 * len(extra_values), *extra_values) \
+                if extra_values else b''
+            version = max(member.version, 45) if extra_values else member.version
+            records.append(_CENTRAL_HEADER.pack(
+                b'PK\x01\x02', version, 3, version, member.flags, member.codec.method,
+                member.dos_time, member.dos_date, member.crc, fields[1], fields[0],
+                len(member.name), len(extra), 0, 0, 0, (member.mode & 0xFFFF) << 16, fields[2]
+            ) + member.name + extra)
+        return b''.join(records)
+
+    def close(self):
+        try:
+            self._drain()
+            directory = self._central_directory()
+            offset = self._file.tell()
+            self._file.write(directory)
+            count = len(self._members)
+            if count >= 0xFFFF or offset > ZIP64_LIMIT or len(directory) > ZIP64_LIMIT:
+                end64 = self._file.tell()
+                self._file.write(_END_RECORD64.pack(b'PK\x06\x06', 44, 45, 45, 0, 0, count, count,
+                                                    len(directory), offset))
+                self._file.write(_END_LOCATOR64.pack(b'PK\x06\x07', 0, end64, 1))
+                self._file.write(_END_RECORD.pack(b'PK\x05\x06', 0, 0, 0xFFFF, 0xFFFF,
+                                                  0xFFFFFFFF, 0xFFFFFFFF, 0))
+            else:
+                self._file.write(_END_RECORD.pack(b'PK\x05\x06', 0, 0, count, count, len(directory), offset, 0))
+            self.stats['output_bytes'] = self._file.tell()
+        finally:
+            self._file.close()
+            self._pool.shutdown()
+        seconds = time.perf_counter() - self._started
+        self.stats['seconds'] = round(seconds, 3)
+        self.stats['mb_per_s'] = round(self.stats['input_bytes'] / (1024 * 1024) / seconds, 1) if seconds else 0
+        self.stats['ratio'] = round(self.stats['output_bytes'] / self.stats['input_bytes'], 3) \
+            if self.stats['input_bytes'] else 0
+        return self.stats
+
+    def abort(self):
+        for _, future, _, _, _ in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown()
+        self._file.close()
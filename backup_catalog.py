@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""فهرس النسخ الاحتياطية: ملف JSON صغير بجوار النسخ يحدث عند الإنشاء والحذف.
+
+صفحة النسخ الاحتياطية وlist_backups تقرأ منه مباشرة بدلاً من فتح كل أرشيف لقراءة
+backup_info.json. كل كتابة تتم في ملف مؤقت ثم os.replace فلا يرى القارئ فهرساً نصف مكتوب،
+ويعاد تحميله تلقائياً إذا عدله كائن آخر (محرك النسخ في الخلفية ونظام النسخ يشتركان فيه).
+"""
+
+import json
+import os
+import threading
+import zipfile
+from datetime import datetime
+
+from backup_restore import RestoreError, open_source, read_backup_info
+
+CATALOG_FILENAME = 'catalog.json'
+
+# حالة التحقق: pending (البصمات مسجلة ولم يفحص بعد)، verified، failed، unverifiable (بدون بصمات)
+VERIFICATION_STATES = ('pending', 'verified', 'failed', 'unverifiable')
+
+
+class BackupCatalog:
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.path = os.path.join(backup_dir, CATALOG_FILENAME)
+        self._entries = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        stamp = self._file_stamp()
+        if self._entries is None or stamp != self._stamp:
+            if stamp is None:
+                self._entries = self._scan()
+                self._save()
+            else:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = {entry['name']: entry for entry in json.load(f)['backups']}
+                self._stamp = stamp
+        return self._entries
+
+    def _save(self):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        temp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'backups': list(self._entries.values())}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        self._stamp = self._file_stamp()
+
+    def _scan(self):
+        """بناء الفهرس مرة واحدة من النسخ الموجودة (أول تشغيل بعد التحديث)"""
+        entries = {}
+        if not os.path.isdir(self.backup_dir):
+            return entries
+        for name in os.listdir(self.backup_dir):
+            path = os.path.join(self.backup_dir, name)
+            if name.startswith('.') or name in ('snapshots', CATALOG_FILENAME):
+                continue
+            if name.endswith('.zip'):
+                # عبر قارئ الاستعادة: backup_info.json في أرشيف zstd لا يقرؤه zipfile
+                try:
+                    source = open_source(path)
+                    try:
+                        info = read_backup_info(source)
+                    finally:
+                        source.close()
+                except (zipfile.BadZipFile, ValueError, RestoreError):
+                    info = {}
+                entries[name] = self._entry_from_info(name, 'archive', path, info)
+            elif os.path.isdir(path):
+                info = {}
+                info_file = os.path.join(path, 'backup_info.json')
+                if os.path.exists(info_file):
+                    with open(info_file, 'r', encoding='utf-8') as f:
+                        info = json.load(f)
+                entries[name] = self._entry_from_info(name, 'directory', path, info)
+        manifest_dir = os.path.join(self.backup_dir, 'snapshots', 'manifests')
+        if os.path.isdir(manifest_dir):
+            for name in os.listdir(manifest_dir):
+                if name.endswith('.json'):
+                    with open(os.path.join(manifest_dir, name), 'r', encoding='utf-8') as f:
+                        manifest = json.load(f)
+                    entries[manifest['id']] = self.snapshot_entry(manifest)
+        return entries
+
+    @staticmethod
+    def _entry_from_info(name, kind, path, info):
+        if os.path.isdir(path):
+            size = sum(os.path.getsize(os.path.join(root, file))
+                       for root, _, files in os.walk(path) for file in files)
+        else:
+            size = os.path.getsize(path)
+        created_at = info.get('created_at') or datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+        return {
+            'name': name,
+            'kind': kind,
+            'type': info.get('type', 'unknown'),
+            'created_at': created_at,
+            'size': size,
+            'duration': None,
+            'codec': info.get('codec') or (info.get('compression') or {}).get('codec'),
+            'verification': 'pending' if info.get('hashes') else 'unverifiable',
+            'verified_at': None
+        }
+
+    @staticmethod
+    def snapshot_entry(manifest, duration=None):
+        return {
+            'name': manifest['id'],
+            'kind': 'snapshot',
+            'type': manifest['type'],
+            'created_at': manifest['created_at'],
+            'size': manifest['stats']['stored_bytes'],
+            'duration': duration,
+            'codec': 'zlib',
+            'verification': 'pending',
+            'verified_at': None
+        }
+
+    def add(self, entry):
+        with self._lock:
+            self._load()[entry['name']] = entry
+            self._save()
+
+    def add_archive(self, path, kind='archive', info=None, duration=None, hashed=None):
+        """إضافة أرشيف أو مجلد نسخة معروف المحتوى دون إعادة فتحه.
+        hashed: هل سجلت البصمات داخل النسخة (الافتراضي وجود hashes في info)"""
+        entry = self._entry_from_info(os.path.basename(path), kind, path, info or {})
+        entry['duration'] = duration
+        if hashed is not None:
+            entry['verification'] = 'pending' if hashed else 'unverifiable'
+        self.add(entry)
+        return entry
+
+    def remove(self, *names):
+        with self._lock:
+            entries = self._load()
+            for name in names:
+                entries.pop(name, None)
+            self._save()
+
+    def set_verification(self, name, state):
+        with self._lock:
+            entry = self._load().get(name)
+            if entry is not None:
+                entry['verification'] = state
+                entry['verified_at'] = datetime.now().isoformat()
+                self._save()
+
+    def get(self, name):
+        with self._lock:
+            return self._load().get(name)
+
+    def list(self, kind=None):
+        """النسخ من الأحدث للأقدم"""
+        with self._lock:
+            entries = list(self._load().values())
+        if kind is not None:
+            entries = [entry for entry in entries if entry['kind'] == kind]
+        return sorted(entries, key=lambda entry: entry['created_at'], reverse=True)
+
+    def summary(self):
+        entries = self.list()
+        return {
+            'count': len(entries),
+            'total_size': sum(entry['size'] for entry in entries),
+            'last_backup': entries[0]['created_at'] if entries else None
+        }
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""محرك النسخ الاحتياطي في الخلفية.
+
+تؤخذ لقطة متسقة من قاعدة البيانات عبر واجهة النسخ الاحتياطي في SQLite على دفعات من الصفحات،
+فلا تنتظر عمليات البيع إلا مدة دفعة واحدة على الأكثر، ثم تكتب اللقطة والملفات مباشرة
+داخل ملف zip يضغط بالتوازي دون إنشاء مجلد وسيط غير مضغوط، أو تخزن كلقطة تزايدية في مخزن الأجزاء.
+كل عملية نسخ تعمل في خيط خلفي برقم مهمة يمكن متابعة تقدمه.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from archive_writer import ArchiveWriter, get_codec
+from backup_catalog import BackupCatalog
+from backup_restore import verify_backup
+from incremental_backup import SnapshotStore
+
+BACKUP_STEP_PAGES = 1024       # صفحات كل دفعة (4 ميجابايت بحجم الصفحة الافتراضي)
+BACKUP_STEP_SLEEP = 0.005      # انتظار بين الدفعات عند انشغال القاعدة (بالثواني)
+MAX_TRACKED_JOBS = 20
+
+# نسبة مرحلة لقطة قاعدة البيانات من شريط التقدم، والباقي لكتابة الأرشيف
+SNAPSHOT_WEIGHT = 0.4
+
+
+def snapshot_database(source_path, target_path, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP, progress=None):
+    """نسخ قاعدة SQLite حية إلى target_path بواجهة backup على دفعات، مع progress(copied, total) بعد كل دفعة.
+
+    في وضع WAL تثبت معاملة قراءة مفتوحة لقطة واحدة طوال النسخ، فلا يعاد النسخ من البداية
+    عند كل عملية بيع ولا تنتظر الكتابة شيئاً. في وضع سجل التراجع تحجب معاملة القراءة الكتابة،
+    لذلك تنسخ الدفعات دون تثبيت وتنتظر الكتابة دفعة واحدة على الأكثر."""
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        def report(status, remaining, total):
+            if progress is not None:
+                progress(total - remaining, total)
+
+        pinned = source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        if pinned:
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        source.backup(target, pages=pages, progress=report, sleep=sleep)
+        if pinned:
+            source.execute('COMMIT')
+    finally:
+        target.close()
+        source.close()
+
+
+class BackupJob:
+    def __init__(self, backup_type, mode='archive', codec='deflate', level=None):
+        self.id = uuid.uuid4().hex
+        self.backup_type = backup_type
+        self.mode = mode          # archive: ملف zip كامل، incremental: لقطة في مخزن الأجزاء
+        self.codec = codec
+        self.level = level
+        self.archive_stats = None  # الحجم والسرعة (MB/s) بعد كتابة الأرشيف
+        self.status = 'pending'  # pending, running, completed, failed
+        self.stage = None        # database, files, finalizing
+        self.progress = 0.0
+        self.filename = None
+        self.size = 0
+        self.error = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'backup_type': self.backup_type,
+            'mode': self.mode,
+            'codec': self.codec,
+            'archive_stats': self.archive_stats,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress * 100, 1),
+            'filename': self.filename,
+            'size': self.size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class BackupEngine:
+    def __init__(self, backup_dir, directories=(), step_pages=BACKUP_STEP_PAGES,
+                 codec='deflate', level=None, workers=None, max_backups=None):
+        """directories: [(اسم داخل الأرشيف، مسار المجلد)] تضاف مع قاعدة البيانات.
+        codec/level/workers: برنامج ضغط الأرشيف الافتراضي ومستواه وعدد خيوط الضغط.
+        max_backups: عدد الأرشيفات وعدد اللقطات المحتفظ بها بعد كل نسخة (None بلا حد)"""
+        get_codec(codec, level)
+        self.backup_dir = backup_dir
+        self.directories = list(directories)
+        self.step_pages = step_pages
+        self.codec = codec
+        self.level = level
+        self.workers = workers
+        self.max_backups = max_backups
+        self.snapshots = SnapshotStore(os.path.join(backup_dir, 'snapshots'))
+        self.catalog = BackupCatalog(backup_dir)
+        self._jobs = OrderedDict()
+        self._running = None
+        self._pinned = Counter()   # نسخ قيد الاستخدام لا تحذفها سياسة الاحتفاظ
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _claim(self, backup_type, mode, codec, level):
+        """إرجاع (المهمة، جديدة؟): مهمة جديدة أو المهمة الجارية إن وجدت"""
+        if codec is None:
+            codec, level = self.codec, self.level
+        get_codec(codec, level)
+        with self._lock:
+            if self._running is not None:
+                return self._running, False
+            job = self._running = BackupJob(backup_type, mode, codec, level)
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+        return job, True
+
+    def start(self, db_path, backup_type='manual', mode='archive', codec=None, level=None):
+        """بدء نسخ احتياطي في الخلفية وإرجاع المهمة (أو المهمة الجارية إن وجدت).
+        يرفع ValueError لبرنامج ضغط غير مدعوم"""
+        job, created = self._claim(backup_type, mode, codec, level)
+        if created:
+            threading.Thread(target=self._run, args=(job, db_path), daemon=True).start()
+        return job
+
+    def run(self, db_path, backup_type='manual', mode='archive', codec=None, level=None):
+        """نسخ احتياطي متزامن في خيط المستدعي (مثل نسخة ما قبل الاستعادة)، ويعيد المهمة بعد انتهائها.
+        يرفع RuntimeError إذا كانت هناك نسخة أخرى قيد التنفيذ"""
+        job, created = self._claim(backup_type, mode, codec, level)
+        if not created:
+            raise RuntimeError('توجد نسخة احتياطية أخرى قيد التنفيذ')
+        self._run(job, db_path)
+        return job
+
+    def _run(self, job, db_path):
+        job.status = 'running'
+        os.makedirs(self.backup_dir, exist_ok=True)
+        snapshot_path = os.path.join(self.backup_dir, f'.snapshot_{job.id}.db')
+        try:
+            job.stage = 'database'
+            snapshot_database(db_path, snapshot_path, pages=self.step_pages,
+                              progress=lambda copied, total: self._set_progress(job, 0, copied / total if total else 1))
+            job.stage = 'files'
+            if job.mode == 'incremental':
+                self._write_snapshot(job, snapshot_path)
+            else:
+                self._write_archive(job, snapshot_path)
+            job.progress = 1.0
+            job.status = 'completed'
+            try:
+                self.apply_retention()
+            except Exception as e:
+                job.error = f'فشل حذف النسخ القديمة: {e}'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            job.finished_at = datetime.now()
+            with self._lock:
+                if self._running is job:
+                    self._running = None
+
+    def _write_archive(self, job, snapshot_path):
+        """كتابة اللقطة والملفات مباشرة في ملف zip كامل يضغط بالتوازي"""
+        filename = f"backup_{job.backup_type}_{job.created_at.strftime('%Y_%m_%d_%H_%M_%S')}.zip"
+        final_path = os.path.join(self.backup_dir, filename)
+        partial_path = final_path + '.part'
+        members = [(snapshot_path, 'supermarket.db')] + self._directory_members()
+        total_bytes = sum(os.path.getsize(path) for path, _ in members) or 1
+        try:
+            with ArchiveWriter(partial_path, job.codec, job.level, self.workers,
+                               progress=lambda written: self._set_progress(job, 1, written / total_bytes)) as archive:
+                for path, arcname in members:
+                    archive.add_file(path, arcname)
+
+                job.stage = 'finalizing'
+                info = {
+                    'type': job.backup_type,
+                    'created_at': job.created_at.isoformat(),
+                    'codec': job.codec,
+                    'files': [arcname for _, arcname in members],
+                    'hashes': archive.hashes
+                }
+                archive.add_bytes(json.dumps(info, ensure_ascii=False, indent=2).encode('utf-8'), 'backup_info.json')
+            os.replace(partial_path, final_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        job.filename = filename
+        job.size = os.path.getsize(final_path)
+        job.archive_stats = archive.stats
+        self.catalog.add_archive(final_path, 'archive', info, self._elapsed(job))
+
+    def _write_snapshot(self, job, snapshot_path):
+        """تخزين الأجزاء الجديدة فقط في مخزن الأجزاء مع manifest للقطة"""
+        files = [('supermarket.db', snapshot_path, False)]
+        files += [(arcname, path, True) for path, arcname in self._directory_members()]
+        manifest = self.snapshots.create(
+            files, job.backup_type,
+            progress=lambda processed, total: self._set_progress(job, 1, processed / total)
+        )
+        job.filename = manifest['id']
+        job.size = manifest['stats']['stored_bytes']
+        self.catalog.add(BackupCatalog.snapshot_entry(manifest, self._elapsed(job)))
+
+    @contextmanager
+    def pinned(self, *names):
+        """منع حذف نسخ محددة بسياسة الاحتفاظ أثناء استخدامها (مثل النسخة قيد الاستعادة)"""
+        with self._lock:
+            self._pinned.update(names)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pinned.subtract(names)
+                self._pinned += Counter()   # حذف الأسماء التي وصل عدادها للصفر
+
+    def apply_retention(self, keep=None):
+        """الإبقاء على أحدث keep أرشيف وأحدث keep لقطة (الافتراضي max_backups) وحذف الأقدم
+        من القرص والفهرس. النسخ المثبتة بـ pinned لا تحذف ولا تحسب من keep.
+        يعمل تحت قفل مخزن اللقطات فلا يتداخل مع نسخة من عملية أخرى"""
+        keep = self.max_backups if keep is None else keep
+        if keep is None:
+            return {'archives': [], 'snapshots': [], 'freed_bytes': 0}
+        with self._lock:
+            pinned = set(self._pinned)
+        with self.snapshots.lock:
+            pruned = self.snapshots.prune(keep, exclude=pinned)
+            self.catalog.remove(*pruned['snapshots'])
+            archives = [entry['name'] for entry in self.catalog.list()
+                        if entry['kind'] != 'snapshot' and entry['name'] not in pinned][keep:]
+            for name in archives:
+                path = os.path.join(self.backup_dir, name)
+                if os.path.isdir(path):
+                    pruned['freed_bytes'] += sum(os.path.getsize(os.path.join(root, file))
+                                                 for root, dirs, files in os.walk(path) for file in files)
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    pruned['freed_bytes'] += os.path.getsize(path)
+                    os.remove(path)
+            self.catalog.remove(*archives)
+        pruned['archives'] = archives
+        return pruned
+
+    def delete(self, name):
+        """حذف أرشيف أو لقطة من القرص والفهرس، ويعيد False إن لم تكن في الفهرس"""
+        entry = self.catalog.get(name)
+        if entry is None:
+            return False
+        if entry['kind'] == 'snapshot':
+            self.snapshots.remove([name])
+        else:
+            path = os.path.join(self.backup_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        self.catalog.remove(name)
+        return True
+
+    def verify(self, name):
+        """التحقق من سلامة نسخة في الفهرس وتسجيل النتيجة، ويعيد None إن لم تكن في الفهرس"""
+        entry = self.catalog.get(name)
+        if entry is None:
+            return None
+        if entry['kind'] == 'snapshot':
+            failed = self.snapshots.verify(name)
+            result = {'state': 'failed' if failed else 'verified', 'failed': failed}
+        else:
+            result = verify_backup(os.path.join(self.backup_dir, name))
+        self.catalog.set_verification(name, result['state'])
+        return result
+
+    @staticmethod
+    def _elapsed(job):
+        return round((datetime.now() - job.created_at).total_seconds(), 2)
+
+    def _directory_members(self):
+        members = []
+        for name, directory in self.directories:
+            for root, dirs, files in os.walk(directory):
+                for file in files:
+                    path = os.path.join(root, file)
+                    members.append((path, os.path.join(name, os.path.relpath(path, directory))))
+        return members
+
+    @staticmethod
+    def _set_progress(job, stage_index, fraction):
+        if stage_index == 0:
+            job.progress = SNAPSHOT_WEIGHT * fraction
+        else:
+            job.progress = SNAPSHOT_WEIGHT + (1 - SNAPSHOT_WEIGHT) * fraction
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""استعادة نسخة احتياطية مع التحقق من سلامة كل ملف واستبدال قاعدة البيانات بإعادة تسمية.
+
+تقرأ الملفات المختارة فقط (قاعدة البيانات أو الملفات الثابتة أو الإعدادات) من ملف zip أو مجلد
+نسخة، وتستخرج بالتوازي إلى ملفات مؤقتة بجوار أماكنها مع حساب SHA-256 أثناء القراءة ومقارنته
+بما سجل في backup_info.json. لا يستبدل أي ملف حي إلا بعد نجاح التحقق من جميع الملفات،
+وقاعدة البيانات تستبدل بـ os.replace فيقتصر التوقف على لحظة الاستبدال.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import struct
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from archive_writer import ZIP_ZSTANDARD, zstandard
+
+COPY_CHUNK_SIZE = 1024 * 1024
+STAGING_SUFFIX = '.restoring'
+
+# أسماء ملفات قاعدة البيانات داخل النسخ (محرك النسخ في الخلفية، ونظام النسخ الاحتياطي)
+DATABASE_MEMBERS = ('supermarket.db', 'database/supermarket.db')
+# ملفات الإعدادات التي ينسخها BackupSystem تحت config/، ولا يستعاد غيرها من هذا المجلد
+CONFIG_FILES = ('backup_config.json', '.env', 'config.py')
+
+
+class RestoreError(Exception):
+    pass
+
+
+def default_routes(app_path, db_path=None):
+    """[(المجموعة، اسم الملف أو بادئة المجلد داخل النسخة، المسار الهدف)] لتخطيط النسخ في هذا المشروع"""
+    db_path = db_path or os.path.join(app_path, 'supermarket.db')
+    return [
+        ('database', 'supermarket.db', db_path),
+        ('database', 'database/supermarket.db', db_path),
+        ('static', 'static/', os.path.join(app_path, 'static')),
+        ('static', 'uploads/', os.path.join(app_path, 'static', 'uploads')),
+    ] + [('config', f'config/{name}', os.path.join(app_path, name)) for name in CONFIG_FILES]
+
+
+class _ArchiveSource:
+    """قراءة ملفات zip تدفقياً، بما فيها ملفات zstd التي لا يدعمها zipfile"""
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+
+    def names(self):
+        return [info.filename for info in self._zip.infolist() if not info.is_dir()]
+
+    def read_bytes(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+    def open(self, name):
+        info = self._zip.getinfo(name)
+        if info.compress_type != ZIP_ZSTANDARD:
+            return self._zip.open(info)
+        if zstandard is None:
+            raise RestoreError(f'الملف {name} مضغوط بـ zstd ويلزم تثبيت zstandard')
+        raw = open(self.path, 'rb')
+        raw.seek(info.header_offset)
+        header = raw.read(30)
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        raw.seek(info.header_offset + 30 + name_length + extra_length)
+        return zstandard.ZstdDecompressor().stream_reader(_LimitedReader(raw, info.compress_size),
+                                                          read_across_frames=True, closefd=True)
+
+    def close(self):
+        self._zip.close()
+
+
+class _LimitedReader(io.RawIOBase):
+    def __init__(self, raw, length):
+        self._raw = raw
+        self._remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._raw.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._raw.close()
+        super().close()
+
+
+class _DirectorySource:
+    """نسخة غير مضغوطة (مجلد)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def names(self):
+        names = []
+        for root, dirs, files in os.walk(self.path):
+            for file in files:
+                names.append(os.path.relpath(os.path.join(root, file), self.path).replace(os.sep, '/'))
+        return names
+
+    def read_bytes(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+    def open(self, name):
+        return open(os.path.join(self.path, name), 'rb')
+
+    def close(self):
+        pass
+
+
+def open_source(path):
+    if os.path.isdir(path):
+        return _DirectorySource(path)
+    return _ArchiveSource(path)
+
+
+def read_backup_info(source):
+    try:
+        return json.loads(source.read_bytes('backup_info.json').decode('utf-8'))
+    except (KeyError, FileNotFoundError):
+        return {}
+
+
+def _target_for(name, routes, groups):
+    if '..' in name.split('/') or name.startswith('/'):
+        raise RestoreError(f'مسار غير آمن داخل النسخة: {name}')
+    # config/ يقابل مجلد التطبيق نفسه، فأي ملف آخر فيه (مثل config/app.py) قد يستبدل شيفرة التطبيق
+    if name.startswith('config/') and name[len('config/'):] not in CONFIG_FILES:
+        raise RestoreError(f'ملف إعدادات غير مسموح باستعادته: {name}')
+    for group, member, target in routes:
+        if groups is not None and group not in groups:
+            continue
+        if member.endswith('/'):
+            if name.startswith(member):
+                return group, os.path.join(target, *name[len(member):].split('/'))
+        elif name == member:
+            return group, target
+    return None
+
+
+def verify_backup(path):
+    """قراءة كل ملفات النسخة ومقارنة بصماتها بما في backup_info.json دون استخراج شيء.
+    يعيد {'state': verified/failed/unverifiable, 'verified': عدد, 'failed': [أسماء]}"""
+    try:
+        source = open_source(path)
+    except zipfile.BadZipFile:
+        return {'state': 'failed', 'verified': 0, 'failed': [os.path.basename(path)]}
+    try:
+        hashes = read_backup_info(source).get('hashes', {})
+        if not hashes:
+            return {'state': 'unverifiable', 'verified': 0, 'failed': []}
+        failed = []
+        for name, expected in hashes.items():
+            digest = hashlib.sha256()
+            try:
+                with source.open(name) as reader:
+                    for chunk in iter(lambda: reader.read(COPY_CHUNK_SIZE), b''):
+                        digest.update(chunk)
+            except (KeyError, FileNotFoundError, zipfile.BadZipFile):
+                failed.append(name)
+                continue
+            if digest.hexdigest() != expected:
+                failed.append(name)
+        return {'state': 'failed' if failed else 'verified', 'verified': len(hashes) - len(failed), 'failed': failed}
+    finally:
+        source.close()
+
+
+def swap_database(staged_path, live_path, before_swap=None):
+    """استبدال قاعدة البيانات الحية بالملف المستعاد بإعادة تسمية، ويعيد مدة التوقف بالثواني.
+
+    before_swap يغلق اتصالات التطبيق ويعيد عدد الاتصالات التي ما زالت مستخدمة؛ وترفض الاستعادة إن لم
+    يكن صفراً، لأن الاتصال المفتوح بعد os.replace يبقى يكتب في الملف القديم المحذوف (في وضع سجل التراجع
+    لا توجد طريقة أخرى لاكتشافه). تخرج القاعدة الحية من وضع WAL قبل الاستبدال حتى لا يطبق ملف -wal
+    القديم على الملف الجديد."""
+    conn = sqlite3.connect(staged_path)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE').fetchone()
+    finally:
+        conn.close()
+
+    started = time.perf_counter()
+    if before_swap is not None and before_swap():
+        raise RestoreError('قاعدة البيانات ما زالت مستخدمة ولا يمكن استبدالها الآن')
+    if os.path.exists(live_path):
+        conn = sqlite3.connect(live_path, timeout=5)
+        try:
+            mode = conn.execute('PRAGMA journal_mode=DELETE').fetchone()[0]
+        except sqlite3.OperationalError:
+            mode = 'wal'   # قفل من اتصال خارج التطبيق
+        finally:
+            conn.close()
+        if mode.lower() == 'wal':
+            raise RestoreError('قاعدة البيانات ما زالت مستخدمة ولا يمكن استبدالها الآن')
+    for suffix in ('-wal', '-shm', '-journal'):
+        if os.path.exists(live_path + suffix):
+            os.remove(live_path + suffix)
+    os.replace(staged_path, live_path)
+    return time.perf_counter() - started
+
+
+def restore_backup(path, routes, groups=None, workers=None, before_swap=None):
+    """استعادة ملفات النسخة في path حسب routes، واختيارياً المجموعات groups فقط (مثل {'database'}).
+
+    يرفع RestoreError إذا اختلفت بصمة أي ملف عما في backup_info.json، ولا يستبدل شيئاً حينها."""
+    started = time.perf_counter()
+    source = open_source(path)
+    staged = []
+    try:
+        hashes = read_backup_info(source).get('hashes', {})
+        selected = []
+        for name in source.names():
+            if name == 'backup_info.json':
+                continue
+            found = _target_for(name, routes, groups)
+            if found is not None:
+                selected.append((name,) + found)
+        if not selected:
+            raise RestoreError('لا توجد ملفات مطابقة للاستعادة في النسخة')
+
+        def extract(name, target):
+            staging = target + STAGING_SUFFIX
+            os.makedirs(os.path.dirname(staging), exist_ok=True)
+            digest = hashlib.sha256()
+            size = 0
+            with source.open(name) as reader, open(staging, 'wb') as writer:
+                while True:
+                    chunk = reader.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    writer.write(chunk)
+                    size += len(chunk)
+            expected = hashes.get(name)
+            if expected is not None and digest.hexdigest() != expected:
+                raise RestoreError(f'فشل التحقق من سلامة الملف {name}')
+            return size, expected is not None
+
+        # قاعدة البيانات (أكبر ملف) أولاً حتى لا تتأخر إلى آخر الاستعادة
+        selected.sort(key=lambda item: item[0] not in DATABASE_MEMBERS)
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            futures = []
+            for name, group, target in selected:
+                staged.append((group, target))
+                futures.append(pool.submit(extract, name, target))
+            results = [future.result() for future in futures]
+
+        swap_seconds = 0
+        for group, target in staged:
+            if group == 'database':
+                swap_seconds = swap_database(target + STAGING_SUFFIX, target, before_swap)
+            else:
+                os.replace(target + STAGING_SUFFIX, target)
+        staged = []
+    except zipfile.BadZipFile as e:
+        raise RestoreError(f'ملف النسخة تالف: {e}')
+    finally:
+        source.close()
+        for _, target in staged:
+            if os.path.exists(target + STAGING_SUFFIX):
+                os.remove(target + STAGING_SUFFIX)
+
+    seconds = time.perf_counter() - started
+    restored_bytes = sum(size for size, _ in results)
+    return {
+        'files': [name for name, _, _ in selected],
+        'groups': sorted({group for _, group, _ in selected}),
+        'verified': sum(1 for _, verified in results if verified),
+        'unverified': sum(1 for _, verified in results if not verified),
+        'bytes': restored_bytes,
+        'seconds': round(seconds, 3),
+        'mb_per_s': round(restored_bytes / (1024 * 1024) / seconds, 1) if seconds else 0,
+        'swap_seconds': round(swap_seconds, 4)
+    }
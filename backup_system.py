@@ -2,13 +2,16 @@ import os
 import shutil
 import sqlite3
 import json
-import zipfile
-import schedule
+import hashlib
 import time
 from datetime import datetime, timedelta
-import threading
 import psutil
 from pathlib import Path
+from archive_writer import ArchiveWriter
+from backup_catalog import BackupCatalog
+from backup_engine import BackupEngine, snapshot_database
+from backup_restore import CONFIG_FILES, default_routes, restore_backup
+from job_scheduler import JobScheduler
 
 class BackupSystem:
     def __init__(self, app_path=None):
@@ -17,6 +20,10 @@ class BackupSystem:
         self.config_file = os.path.join(self.app_path, 'backup_config.json')
         self.ensure_backup_directory()
         self.load_config()
+        # مخزن اللقطات والفهرس وسياسة الاحتفاظ من محرك النسخ نفسه الذي يستخدمه الخادم
+        self.engine = BackupEngine(self.backup_dir)
+        self.snapshots = self.engine.snapshots
+        self.catalog = self.engine.catalog
     
     def ensure_backup_directory(self):
         """إنشاء مجلد النسخ الاحتياطية إذا لم يكن موجوداً"""
@@ -33,6 +40,12 @@ class BackupSystem:
             "backup_uploads": True,
             "backup_config": True,
             "compression_enabled": True,
+            "compression_codec": "deflate",   # store, deflate, lzma, zstd (إن كانت zstandard مثبتة، ولا تفتحه برامج zip العادية)
+            "compression_level": None,
+            "compression_workers": None,      # عدد خيوط الضغط (الافتراضي عدد المعالجات)
+            # اللقطات التزايدية اختيارية: تفعل صراحة في backup_config.json، والافتراضي أرشيف zip كامل كما كان
+            # كل لقطة تنسخ القاعدة كاملة وتبقي نسخة غير مضغوطة منها في base/ (نحو ضعف حجم القاعدة على القرص)
+            "incremental_enabled": False,
             "last_backup": None
         }
         
@@ -61,6 +74,9 @@ class BackupSystem:
     
     def create_backup(self, backup_type="manual"):
         """إنشاء نسخة احتياطية شاملة"""
+        if self.config["incremental_enabled"]:
+            return self._create_incremental_backup(backup_type)
+        started = time.time()
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_name = f"backup_{backup_type}_{timestamp}"
@@ -93,14 +109,16 @@ class BackupSystem:
             # نسخ الملفات الثابتة المهمة
             self._backup_static_files(backup_path, backup_info)
             
-            # حفظ معلومات النسخة الاحتياطية
+            # حفظ معلومات النسخة الاحتياطية (النسخة المضغوطة تسجل البصمات أثناء الضغط)
+            if not self.config["compression_enabled"]:
+                backup_info["hashes"] = self._hash_files(backup_path)
             info_file = os.path.join(backup_path, "backup_info.json")
             with open(info_file, 'w', encoding='utf-8') as f:
                 json.dump(backup_info, f, ensure_ascii=False, indent=2)
             
             # ضغط النسخة الاحتياطية إذا كان مفعلاً
             if self.config["compression_enabled"]:
-                compressed_path = self._compress_backup(backup_path)
+                compressed_path, backup_info["compression"] = self._compress_backup(backup_path)
                 shutil.rmtree(backup_path)  # حذف المجلد غير المضغوط
                 backup_path = compressed_path
             
@@ -108,6 +126,10 @@ class BackupSystem:
             backup_size = self._get_folder_size(backup_path)
             backup_info["size_mb"] = round(backup_size / (1024 * 1024), 2)
             
+            # تسجيل النسخة في الفهرس (البصمات مسجلة داخل الأرشيف أو في backup_info للمجلد)
+            self.catalog.add_archive(backup_path, "archive" if backup_path.endswith(".zip") else "directory",
+                                     backup_info, round(time.time() - started, 2), hashed=True)
+            
             # تحديث آخر نسخة احتياطية
             self.config["last_backup"] = datetime.now().isoformat()
             self.save_config()
@@ -129,6 +151,59 @@ class BackupSystem:
                 "message": f"فشل في إنشاء النسخة الاحتياطية: {e}"
             }
     
+    def _create_incremental_backup(self, backup_type):
+        """نسخة تزايدية: تخزن فقط أجزاء قاعدة البيانات والملفات التي تغيرت منذ آخر لقطة"""
+        snapshot_path = os.path.join(self.backup_dir, f".snapshot_{backup_type}.db")
+        started = time.time()
+        try:
+            files = []
+            db_path = os.path.join(self.app_path, "supermarket.db")
+            if self.config["backup_database"] and os.path.exists(db_path):
+                snapshot_database(db_path, snapshot_path)
+                files.append(("database/supermarket.db", snapshot_path, False))
+            if self.config["backup_uploads"]:
+                uploads_path = os.path.join(self.app_path, "static", "uploads")
+                for root, dirs, names in os.walk(uploads_path):
+                    for name in names:
+                        file_path = os.path.join(root, name)
+                        files.append((os.path.join("uploads", os.path.relpath(file_path, uploads_path)), file_path, True))
+            if self.config["backup_config"]:
+                for config_file in CONFIG_FILES:
+                    file_path = os.path.join(self.app_path, config_file)
+                    if os.path.exists(file_path):
+                        files.append((f"config/{config_file}", file_path, True))
+            for static_file in ["requirements.txt", "app.py", "backup_system.py"]:
+                file_path = os.path.join(self.app_path, static_file)
+                if os.path.exists(file_path):
+                    files.append((f"app_files/{static_file}", file_path, True))
+
+            manifest = self.snapshots.create(files, backup_type)
+            self.catalog.add(BackupCatalog.snapshot_entry(manifest, round(time.time() - started, 2)))
+            pruned = self.engine.apply_retention(self.config["max_backups"])
+
+            self.config["last_backup"] = datetime.now().isoformat()
+            self.save_config()
+
+            stats = manifest["stats"]
+            return {
+                "success": True,
+                "snapshot_id": manifest["id"],
+                "backup_info": manifest["stats"],
+                "pruned": pruned,
+                "message": f"تم إنشاء النسخة التزايدية {manifest['id']}: "
+                           f"{round(stats['stored_bytes'] / (1024 * 1024), 2)} MB جديدة "
+                           f"من أصل {round(stats['total_bytes'] / (1024 * 1024), 2)} MB"
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "message": f"فشل في إنشاء النسخة الاحتياطية: {e}"
+            }
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
     def _backup_database(self, backup_path, backup_info):
         """نسخ قاعدة البيانات"""
         db_path = os.path.join(self.app_path, "supermarket.db")
@@ -136,11 +211,12 @@ class BackupSystem:
             backup_db_path = os.path.join(backup_path, "database")
             os.makedirs(backup_db_path, exist_ok=True)
             
-            # نسخ ملف قاعدة البيانات
-            shutil.copy2(db_path, os.path.join(backup_db_path, "supermarket.db"))
+            # لقطة متسقة من قاعدة البيانات الحية بواجهة النسخ الاحتياطي في SQLite
+            snapshot_path = os.path.join(backup_db_path, "supermarket.db")
+            snapshot_database(db_path, snapshot_path)
             
-            # تصدير البيانات كـ SQL
-            self._export_database_sql(db_path, os.path.join(backup_db_path, "database_export.sql"))
+            # تصدير البيانات كـ SQL من اللقطة وليس من الملف الحي
+            self._export_database_sql(snapshot_path, os.path.join(backup_db_path, "database_export.sql"))
             
             backup_info["files_backed_up"].append("database/supermarket.db")
             backup_info["files_backed_up"].append("database/database_export.sql")
@@ -166,16 +242,10 @@ class BackupSystem:
     
     def _backup_config_files(self, backup_path, backup_info):
         """نسخ ملفات الإعدادات"""
-        config_files = [
-            "backup_config.json",
-            ".env",
-            "config.py"
-        ]
-        
         config_backup_path = os.path.join(backup_path, "config")
         os.makedirs(config_backup_path, exist_ok=True)
         
-        for config_file in config_files:
+        for config_file in CONFIG_FILES:
             file_path = os.path.join(self.app_path, config_file)
             if os.path.exists(file_path):
                 shutil.copy2(file_path, config_backup_path)
@@ -199,16 +269,39 @@ class BackupSystem:
                 backup_info["files_backed_up"].append(f"app_files/{static_file}")
     
     def _compress_backup(self, backup_path):
-        """ضغط النسخة الاحتياطية"""
+        """ضغط النسخة الاحتياطية بالتوازي، ويعيد المسار وإحصائيات الضغط (الحجم والسرعة MB/s)"""
         zip_path = backup_path + ".zip"
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        info_file = os.path.join(backup_path, "backup_info.json")
+        with ArchiveWriter(zip_path, self.config["compression_codec"], self.config["compression_level"],
+                           self.config["compression_workers"]) as archive:
             for root, dirs, files in os.walk(backup_path):
                 for file in files:
                     file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, backup_path)
-                    zipf.write(file_path, arcname)
-        return zip_path
+                    if file_path != info_file:
+                        archive.add_file(file_path, os.path.relpath(file_path, backup_path))
+            # معلومات النسخة آخر ملف ومعها بصمات SHA-256 لكل الملفات للتحقق عند الاستعادة
+            with open(info_file, 'r', encoding='utf-8') as f:
+                backup_info = json.load(f)
+            backup_info["hashes"] = archive.hashes
+            archive.add_bytes(json.dumps(backup_info, ensure_ascii=False, indent=2).encode('utf-8'),
+                              "backup_info.json")
+        print(f"ضغط النسخة الاحتياطية ({archive.stats['codec']}): {archive.stats['mb_per_s']} MB/s، "
+              f"نسبة الحجم {archive.stats['ratio']}")
+        return zip_path, archive.stats
     
+    def _hash_files(self, backup_path):
+        """بصمات SHA-256 لملفات نسخة غير مضغوطة"""
+        hashes = {}
+        for root, dirs, files in os.walk(backup_path):
+            for file in files:
+                file_path = os.path.join(root, file)
+                digest = hashlib.sha256()
+                with open(file_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+                hashes[os.path.relpath(file_path, backup_path).replace(os.sep, '/')] = digest.hexdigest()
+        return hashes
+
     def _get_folder_size(self, folder_path):
         """حساب حجم المجلد"""
         if os.path.isfile(folder_path):
@@ -222,33 +315,18 @@ class BackupSystem:
         return total_size
     
     def _cleanup_old_backups(self):
-        """تنظيف النسخ الاحتياطية القديمة"""
+        """تنظيف النسخ الاحتياطية القديمة بسياسة الاحتفاظ نفسها التي يطبقها محرك النسخ"""
         try:
-            backups = []
-            for item in os.listdir(self.backup_dir):
-                item_path = os.path.join(self.backup_dir, item)
-                if os.path.isfile(item_path) or os.path.isdir(item_path):
-                    backups.append((item, os.path.getctime(item_path)))
-            
-            # ترتيب حسب تاريخ الإنشاء
-            backups.sort(key=lambda x: x[1], reverse=True)
-            
-            # حذف النسخ الزائدة
-            max_backups = self.config["max_backups"]
-            if len(backups) > max_backups:
-                for backup_name, _ in backups[max_backups:]:
-                    backup_path = os.path.join(self.backup_dir, backup_name)
-                    if os.path.isfile(backup_path):
-                        os.remove(backup_path)
-                    elif os.path.isdir(backup_path):
-                        shutil.rmtree(backup_path)
-                    print(f"تم حذف النسخة الاحتياطية القديمة: {backup_name}")
+            pruned = self.engine.apply_retention(self.config["max_backups"])
+            for backup_name in pruned["archives"] + pruned["snapshots"]:
+                print(f"تم حذف النسخة الاحتياطية القديمة: {backup_name}")
         
         except Exception as e:
             print(f"خطأ في تنظيف النسخ الاحتياطية: {e}")
     
-    def restore_backup(self, backup_path):
-        """استعادة نسخة احتياطية"""
+    def restore_backup(self, backup_path, groups=None):
+        """استعادة نسخة احتياطية مع التحقق من بصمة كل ملف.
+        groups: مجموعات محددة فقط مثل {"database"} أو {"static"}، والافتراضي الكل"""
         try:
             # التحقق من وجود النسخة الاحتياطية
             if not os.path.exists(backup_path):
@@ -257,38 +335,13 @@ class BackupSystem:
             # إنشاء نسخة احتياطية من الحالة الحالية قبل الاستعادة
             current_backup = self.create_backup("pre_restore")
             
-            # استخراج النسخة الاحتياطية إذا كانت مضغوطة
-            if backup_path.endswith('.zip'):
-                extract_path = backup_path[:-4]
-                with zipfile.ZipFile(backup_path, 'r') as zipf:
-                    zipf.extractall(extract_path)
-                backup_path = extract_path
-            
-            # استعادة قاعدة البيانات
-            db_backup_path = os.path.join(backup_path, "database", "supermarket.db")
-            if os.path.exists(db_backup_path):
-                current_db_path = os.path.join(self.app_path, "supermarket.db")
-                shutil.copy2(db_backup_path, current_db_path)
-            
-            # استعادة الملفات المرفوعة
-            uploads_backup_path = os.path.join(backup_path, "uploads")
-            if os.path.exists(uploads_backup_path):
-                current_uploads_path = os.path.join(self.app_path, "static", "uploads")
-                if os.path.exists(current_uploads_path):
-                    shutil.rmtree(current_uploads_path)
-                shutil.copytree(uploads_backup_path, current_uploads_path)
-            
-            # استعادة ملفات الإعدادات
-            config_backup_path = os.path.join(backup_path, "config")
-            if os.path.exists(config_backup_path):
-                for config_file in os.listdir(config_backup_path):
-                    src = os.path.join(config_backup_path, config_file)
-                    dst = os.path.join(self.app_path, config_file)
-                    shutil.copy2(src, dst)
+            # استخراج متوازٍ مع التحقق، ثم استبدال قاعدة البيانات بإعادة تسمية
+            result = restore_backup(backup_path, default_routes(self.app_path), groups)
             
             return {
                 "success": True,
                 "message": "تم استعادة النسخة الاحتياطية بنجاح",
+                "restore": result,
                 "pre_restore_backup": current_backup
             }
             
@@ -299,44 +352,15 @@ class BackupSystem:
             }
     
     def list_backups(self):
-        """عرض قائمة النسخ الاحتياطية"""
+        """عرض قائمة النسخ الاحتياطية من الفهرس دون فتح الأرشيفات"""
         backups = []
         try:
-            for item in os.listdir(self.backup_dir):
-                item_path = os.path.join(self.backup_dir, item)
-                
-                # قراءة معلومات النسخة الاحتياطية
-                info_file = None
-                if os.path.isdir(item_path):
-                    info_file = os.path.join(item_path, "backup_info.json")
-                elif item.endswith('.zip'):
-                    # استخراج معلومات من الملف المضغوط
-                    try:
-                        with zipfile.ZipFile(item_path, 'r') as zipf:
-                            info_content = zipf.read("backup_info.json")
-                            backup_info = json.loads(info_content.decode('utf-8'))
-                    except:
-                        backup_info = {"timestamp": "unknown", "type": "unknown"}
-                
-                if info_file and os.path.exists(info_file):
-                    with open(info_file, 'r', encoding='utf-8') as f:
-                        backup_info = json.load(f)
-                else:
-                    backup_info = {
-                        "timestamp": datetime.fromtimestamp(os.path.getctime(item_path)).strftime("%Y%m%d_%H%M%S"),
-                        "type": "unknown"
-                    }
-                
-                backup_info["name"] = item
-                backup_info["path"] = item_path
-                backup_info["size_mb"] = round(self._get_folder_size(item_path) / (1024 * 1024), 2)
-                backup_info["created_at"] = datetime.fromtimestamp(os.path.getctime(item_path)).isoformat()
-                
+            for entry in self.catalog.list():
+                backup_info = dict(entry)
+                backup_info["path"] = os.path.join(self.backup_dir, entry["name"])
+                backup_info["size_mb"] = round(entry["size"] / (1024 * 1024), 2)
                 backups.append(backup_info)
             
-            # ترتيب حسب تاريخ الإنشاء
-            backups.sort(key=lambda x: x["created_at"], reverse=True)
-            
         except Exception as e:
             print(f"خطأ في عرض النسخ الاحتياطية: {e}")
         
@@ -348,19 +372,19 @@ class BackupSystem:
             return
         
         interval_hours = self.config["backup_interval_hours"]
-        schedule.every(interval_hours).hours.do(lambda: self.create_backup("auto"))
-        
-        # تشغيل المجدول في خيط منفصل
-        def run_scheduler():
-            while True:
-                schedule.run_pending()
-                time.sleep(60)  # فحص كل دقيقة
-        
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+        # ينام المجدول حتى موعد النسخة التالية، وتنفذها عملية واحدة فقط إذا شغل النظام أكثر من مرة
+        self.scheduler = JobScheduler(os.path.join(self.backup_dir, '.auto_backup_state.json'),
+                                      os.path.join(self.backup_dir, '.auto_backup.lock'))
+        self.scheduler.add('auto_backup', interval_hours * 3600, self._run_auto_backup)
+        self.scheduler.start()
         
         print(f"تم تفعيل النسخ الاحتياطي التلقائي كل {interval_hours} ساعة")
     
+    def _run_auto_backup(self):
+        result = self.create_backup("auto")
+        if not result["success"]:
+            raise RuntimeError(result["message"])
+    
     def get_system_info(self):
         """الحصول على معلومات النظام"""
         return {
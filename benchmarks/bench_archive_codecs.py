@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس برامج ضغط أرشيف النسخ الاحتياطي: السرعة (MB/s) ونسبة الحجم لكل برنامج ومستوى وعدد خيوط.
+
+ينشئ قاعدة بيانات بالحجم المطلوب وبعض الصور (لا يعاد ضغطها)، ويقارن كل خيار بـ zipfile
+أحادي الخيط (DEFLATE مستوى 6) الذي كان يستخدم سابقاً، حتى يختار ما يناسب نافذة النسخ الليلي.
+الاستخدام: python benchmarks/bench_archive_codecs.py [size_mb] [workers]
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_writer import ArchiveWriter, available_codecs
+
+SIZE_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+IMAGES = 50
+WORDS = ['أرز', 'سكر', 'زيت', 'عصير', 'حليب', 'جبنة', 'شاي', 'قهوة', 'صابون', 'تونة', 'فول', 'عدس', 'دقيق']
+OPTIONS = [('store', None), ('deflate', 1), ('deflate', 6), ('lzma', 1), ('zstd', 3), ('zstd', 9)]
+
+workdir = tempfile.mkdtemp(prefix='bench_archive_')
+mb = 1024 * 1024
+
+
+def populate(rng):
+    db_path = os.path.join(workdir, 'supermarket.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE sale_item (id INTEGER PRIMARY KEY, sale_id INTEGER, product_id INTEGER, '
+                 'quantity INTEGER, total_price REAL, note TEXT)')
+    rows = SIZE_MB * mb // 85
+    for start in range(0, rows, 100000):
+        conn.executemany('INSERT INTO sale_item (sale_id, product_id, quantity, total_price, note) VALUES (?, ?, ?, ?, ?)',
+                         [(i // 5, rng.randint(1, 5000), rng.randint(1, 4), round(rng.uniform(2, 800), 2),
+                           ' '.join(rng.choice(WORDS) for _ in range(6)))
+                          for i in range(start, min(start + 100000, rows))])
+        conn.commit()
+    conn.close()
+    members = [(db_path, 'supermarket.db')]
+    os.makedirs(os.path.join(workdir, 'uploads'))
+    for i in range(IMAGES):
+        path = os.path.join(workdir, 'uploads', f'product_{i}.jpg')
+        with open(path, 'wb') as f:
+            f.write(rng.randbytes(200 * 1024))
+        members.append((path, f'static/uploads/product_{i}.jpg'))
+    return members
+
+
+def main():
+    rng = random.Random(5)
+    members = populate(rng)
+    total = sum(os.path.getsize(path) for path, _ in members)
+    print(f"البيانات {total / mb:.0f} MB (قاعدة بيانات + {IMAGES} صورة)، خيوط الضغط {WORKERS}")
+    archive_path = os.path.join(workdir, 'backup.zip')
+
+    started = time.perf_counter()
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path, arcname in members:
+            archive.write(path, arcname)
+    seconds = time.perf_counter() - started
+    print(f"{'البرنامج':<14}{'خيوط':>6}{'MB/s':>10}{'الزمن(s)':>10}{'الناتج MB':>12}{'النسبة':>8}")
+    print(f"{'zipfile-6':<14}{1:>6}{total / mb / seconds:>10.1f}{seconds:>10.1f}"
+          f"{os.path.getsize(archive_path) / mb:>12.1f}{os.path.getsize(archive_path) / total:>8.3f}")
+
+    for codec, level in OPTIONS:
+        if codec not in available_codecs():
+            print(f"{codec}: غير متاح (pip install zstandard)")
+            continue
+        for workers in sorted({1, WORKERS}):
+            with ArchiveWriter(archive_path, codec, level, workers) as archive:
+                for path, arcname in members:
+                    archive.add_file(path, arcname)
+            stats = archive.stats
+            label = codec if level is None else f'{codec}-{level}'
+            print(f"{label:<14}{workers:>6}{stats['mb_per_s']:>10.1f}{stats['seconds']:>10.1f}"
+                  f"{stats['output_bytes'] / mb:>12.1f}{stats['ratio']:>8.3f}")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
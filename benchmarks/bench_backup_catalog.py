@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس عرض قائمة النسخ الاحتياطية: فتح كل أرشيف لقراءة backup_info.json مقابل فهرس النسخ.
+
+الاستخدام: python benchmarks/bench_backup_catalog.py [عدد_النسخ]
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_writer import ArchiveWriter
+from backup_catalog import BackupCatalog
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+REPEAT = 20
+
+
+def main():
+    backup_dir = tempfile.mkdtemp(prefix='bench_catalog_')
+    payload = os.urandom(256 * 1024)
+    started = datetime.now() - timedelta(hours=COUNT * 6)
+    for i in range(COUNT):
+        path = os.path.join(backup_dir, f'backup_auto_{i:05d}.zip')
+        with ArchiveWriter(path, 'store') as archive:
+            archive.add_bytes(payload, 'supermarket.db')
+            archive.add_bytes(json.dumps({
+                'type': 'auto', 'created_at': (started + timedelta(hours=i * 6)).isoformat(),
+                'hashes': archive.hashes
+            }).encode('utf-8'), 'backup_info.json')
+
+    catalog = BackupCatalog(backup_dir)
+    begin = time.perf_counter()
+    for _ in range(REPEAT):
+        catalog._scan()
+    scan_ms = (time.perf_counter() - begin) / REPEAT * 1000
+
+    catalog.list()  # بناء الفهرس لأول مرة
+    begin = time.perf_counter()
+    for _ in range(REPEAT):
+        BackupCatalog(backup_dir).list()
+    cold_ms = (time.perf_counter() - begin) / REPEAT * 1000
+    begin = time.perf_counter()
+    for _ in range(REPEAT):
+        catalog.list()
+    warm_ms = (time.perf_counter() - begin) / REPEAT * 1000
+
+    print(f"{COUNT} نسخة احتياطية:")
+    print(f"  فتح كل أرشيف وقراءة backup_info.json: {scan_ms:8.2f} ms")
+    print(f"  قراءة ملف الفهرس (كائن جديد):        {cold_ms:8.2f} ms")
+    print(f"  الفهرس المحمل (فحص stat فقط):         {warm_ms:8.2f} ms")
+    shutil.rmtree(backup_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس زمن البحث بالباركود (p50/p99) على كتالوج كبير.
+
+يقارن بين فهرس الذاكرة في CatalogCache والفهرس الفريد في SQLite
+والبحث الجزئي القديم (LIKE '%q%').
+الاستخدام: python benchmarks/bench_barcode_lookup.py [skus] [lookups]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_cache import CatalogCache, CatalogProduct
+
+SKUS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+LOOKUPS = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    return p50 * 1e6, p99 * 1e6
+
+
+def measure(label, lookup, codes):
+    samples = []
+    for code in codes:
+        started = time.perf_counter()
+        lookup(code)
+        samples.append(time.perf_counter() - started)
+    p50, p99 = percentiles(samples)
+    print(f"{label:<28} p50={p50:9.2f}µs  p99={p99:9.2f}µs")
+
+
+def main():
+    rows = [
+        CatalogProduct(i, f'منتج {i}', 10.0, 100, f'622{i:010d}', i % 20, '')
+        for i in range(1, SKUS + 1)
+    ]
+    cache = CatalogCache(lambda: rows, lambda: [], lambda: [])
+    codes = [random.choice(rows).barcode for _ in range(LOOKUPS)]
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, barcode TEXT UNIQUE)')
+    conn.executemany('INSERT INTO product VALUES (?, ?, ?)', [(r.id, r.name, r.barcode) for r in rows])
+    conn.commit()
+
+    print(f"عدد المنتجات: {SKUS}  عدد عمليات البحث: {LOOKUPS}")
+    cache.get_by_barcode(codes[0])
+    measure('CatalogCache (dict)', cache.get_by_barcode, codes)
+    measure('SQLite unique index', lambda code: conn.execute(
+        'SELECT id, name FROM product WHERE barcode = ?', (code,)).fetchone(), codes)
+    measure("SQLite LIKE '%q%'", lambda code: conn.execute(
+        "SELECT id, name FROM product WHERE barcode LIKE '%' || ? || '%' LIMIT 20", (code,)).fetchall(),
+        codes[:200])
+
+    started = time.perf_counter()
+    cache.get_by_barcodes(codes[:50])
+    print(f"دفعة من 50 باركود: {(time.perf_counter() - started) * 1e6:.2f}µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس البحث عن العميل ببادئة رقم الهاتف: فهرس الذاكرة المرتب مقابل استعلام LIKE في قاعدة البيانات.
+
+ينشئ العدد المطلوب من العملاء في قاعدة مؤقتة، ثم يبحث ببادئات عشوائية بطول 3 إلى 8 أرقام
+(كما يكتبها الكاشير رقماً بعد رقم) ويعرض متوسط زمن البحث، وحجم ما كانت ترسله صفحة نقطة البيع
+عند تضمين كل العملاء فيها.
+الاستخدام: python benchmarks/bench_customer_lookup.py [customers] [lookups]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+db_file = os.path.join(tempfile.mkdtemp(), 'bench_lookup.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+os.environ['SCHEDULER_ENABLED'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Customer, catalog
+
+CUSTOMERS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+LOOKUPS = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+
+def main():
+    rng = random.Random(5)
+    with app.app_context():
+        db.create_all()
+        phones = [f'01{rng.choice("0125")}{i:08d}' for i in range(CUSTOMERS)]
+        db.session.execute(Customer.__table__.insert(),
+                           [{'name': f'عميل {i}', 'phone': phone} for i, phone in enumerate(phones)])
+        db.session.commit()
+
+        started = time.perf_counter()
+        catalog.customers()
+        build = time.perf_counter() - started
+
+        prefixes = []
+        for _ in range(LOOKUPS):
+            phone = rng.choice(phones)
+            prefixes.append(phone[:rng.randint(3, 8)])
+
+        started = time.perf_counter()
+        for prefix in prefixes:
+            catalog.lookup_customers(prefix, 10)
+        indexed = (time.perf_counter() - started) / LOOKUPS
+
+        started = time.perf_counter()
+        for prefix in prefixes:
+            Customer.query.filter(Customer.phone.like(prefix + '%')).limit(10).all()
+        query = (time.perf_counter() - started) / LOOKUPS
+
+        payload = len(json.dumps([{'id': c.id, 'name': c.name, 'phone': c.phone} for c in catalog.customers()],
+                                 ensure_ascii=False).encode('utf-8'))
+
+    print(f"العملاء {CUSTOMERS}، عمليات البحث {LOOKUPS}")
+    print(f"بناء الفهرس مع تحميل العملاء: {build:.2f} ثانية")
+    print(f"فهرس الذاكرة: {indexed * 1e6:.0f} ميكروثانية/بحث")
+    print(f"استعلام LIKE:  {query * 1e6:.0f} ميكروثانية/بحث")
+    print(f"قائمة العملاء الكاملة في الصفحة سابقاً: {payload / 1024:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
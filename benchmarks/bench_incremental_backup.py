@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس النسخ التزايدي: الزمن والمساحة لكل يوم مع نسبة تغيير يومية صغيرة.
+
+ينشئ قاعدة بيانات بالحجم المطلوب، ويأخذ لقطة أولى كاملة ويقارنها بأرشيف zip كامل،
+ثم يحاكي عدة أيام يتغير في كل منها نسبة من الصفوف (نصفها تعديل عشوائي ونصفها صفوف جديدة)
+ويقيس زمن اللقطة والبيانات الجديدة المخزنة، وأخيراً يستعيد آخر لقطة ويتحقق منها.
+الاستخدام: python benchmarks/bench_incremental_backup.py [size_mb] [days] [churn_percent]
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backup_engine import snapshot_database
+from incremental_backup import SnapshotStore
+
+SIZE_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+DAYS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+CHURN = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+ROW_BYTES = 256
+WORDS = ['أرز', 'سكر', 'زيت', 'عصير', 'حليب', 'جبنة', 'شاي', 'قهوة', 'صابون', 'تونة', 'فول', 'عدس', 'دقيق']
+
+workdir = tempfile.mkdtemp(prefix='bench_incremental_')
+db_path = os.path.join(workdir, 'supermarket.db')
+mb = 1024 * 1024
+
+
+def note(rng):
+    text = ' '.join(rng.choice(WORDS) for _ in range(12)) + f' {rng.getrandbits(64):x}'
+    return (text * 3)[:ROW_BYTES // 2]
+
+
+def populate(rng):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE sale_item (id INTEGER PRIMARY KEY, sale_id INTEGER, product_id INTEGER, '
+                 'quantity INTEGER, total_price REAL, note TEXT)')
+    rows = SIZE_MB * mb // ROW_BYTES
+    batch = 100000
+    for start in range(0, rows, batch):
+        conn.executemany('INSERT INTO sale_item (sale_id, product_id, quantity, total_price, note) VALUES (?, ?, ?, ?, ?)',
+                         [(i // 5, rng.randint(1, 5000), rng.randint(1, 4), rng.uniform(2, 800), note(rng))
+                          for i in range(start, min(start + batch, rows))])
+        conn.commit()
+    conn.close()
+    return rows
+
+
+def churn(rng, rows):
+    """تعديل نصف نسبة التغيير عشوائياً وإضافة النصف الآخر كصفوف جديدة"""
+    changed = int(rows * CHURN / 100)
+    conn = sqlite3.connect(db_path)
+    conn.executemany('UPDATE sale_item SET quantity = ?, total_price = ? WHERE id = ?',
+                     [(rng.randint(1, 4), rng.uniform(2, 800), rng.randint(1, rows)) for _ in range(changed // 2)])
+    conn.executemany('INSERT INTO sale_item (sale_id, product_id, quantity, total_price, note) VALUES (?, ?, ?, ?, ?)',
+                     [(rows + i, rng.randint(1, 5000), 1, rng.uniform(2, 800), note(rng)) for i in range(changed - changed // 2)])
+    conn.commit()
+    conn.close()
+    return rows + changed - changed // 2
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def take_snapshot(store, label):
+    snapshot_path = os.path.join(workdir, 'snapshot.db')
+    started = time.perf_counter()
+    snapshot_database(db_path, snapshot_path)
+    copied = time.perf_counter()
+    manifest = store.create([('supermarket.db', snapshot_path, False)], label)
+    finished = time.perf_counter()
+    stats = manifest['stats']
+    print(f"{label:<10}{stats['total_bytes'] / mb:>10.0f}{copied - started:>10.1f}{finished - copied:>10.1f}"
+          f"{stats['new_bytes'] / mb:>12.1f}{stats['stored_bytes'] / mb:>12.1f}{directory_size(store.root) / mb:>12.1f}")
+    return manifest
+
+
+def main():
+    rng = random.Random(11)
+    started = time.perf_counter()
+    rows = populate(rng)
+    print(f"قاعدة بيانات {os.path.getsize(db_path) / mb:.0f} MB ({rows} صف) في {time.perf_counter() - started:.0f}s، "
+          f"تغيير يومي {CHURN}%")
+
+    store = SnapshotStore(os.path.join(workdir, 'snapshots'))
+    print(f"{'اللقطة':<10}{'MB':>10}{'نسخ(s)':>10}{'تقطيع(s)':>10}{'جديد MB':>12}{'مخزن MB':>12}{'المخزن MB':>12}")
+    take_snapshot(store, 'full')
+
+    started = time.perf_counter()
+    archive_path = os.path.join(workdir, 'full.zip')
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        archive.write(store._base_path('supermarket.db'), 'supermarket.db')
+    print(f"للمقارنة: أرشيف zip كامل {os.path.getsize(archive_path) / mb:.1f} MB في {time.perf_counter() - started:.1f}s لكل نسخة")
+    os.remove(archive_path)
+
+    for day in range(1, DAYS + 1):
+        rows = churn(rng, rows)
+        manifest = take_snapshot(store, f'day {day}')
+
+    started = time.perf_counter()
+    restore_dir = os.path.join(workdir, 'restore')
+    store.restore(manifest['id'], restore_dir)
+    restored = os.path.join(restore_dir, 'supermarket.db')
+    conn = sqlite3.connect(restored)
+    check = conn.execute('PRAGMA quick_check').fetchone()[0]
+    count = conn.execute('SELECT count(*) FROM sale_item').fetchone()[0]
+    conn.close()
+    print(f"استعادة آخر لقطة في {time.perf_counter() - started:.1f}s: quick_check={check}، الصفوف={count} (المتوقع {rows})")
+
+    started = time.perf_counter()
+    pruned = store.prune(1)
+    print(f"حذف {len(pruned['snapshots'])} لقطة قديمة وتحرير {pruned['freed_bytes'] / mb:.1f} MB في "
+          f"{time.perf_counter() - started:.1f}s، المخزن الآن {directory_size(store.root) / mb:.1f} MB")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""اختبار ضغط لأرقام الفواتير: عدة عمليات، في كل منها عدة خيوط، تسجل مبيعات في وقت واحد.
+
+كل خيط يأخذ رقم فاتورة ويسجل عملية بيع به ويلتزم. في النهاية يتحقق من أن جميع الأرقام فريدة
+(في القائمة المجمعة وفي قاعدة البيانات)، ويعرض عدد مرات حجز الكتل مقارنة بعدد الفواتير.
+العملية الأم تحجز كتلة قبل إنشاء العمليات الفرعية للتحقق من عدم توريثها بعد fork.
+الاستخدام: python benchmarks/bench_invoice_numbers.py [processes] [threads] [sales_per_thread]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+db_file = os.path.join(tempfile.mkdtemp(), 'bench_invoice.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+os.environ['SCHEDULER_ENABLED'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Sale, InvoiceCounter, invoice_numbers
+
+PROCESSES = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+SALES_PER_THREAD = int(sys.argv[3]) if len(sys.argv) > 3 else 250
+
+
+def cashier(numbers, start_event):
+    with app.app_context():
+        start_event.wait()
+        for _ in range(SALES_PER_THREAD):
+            invoice_number = invoice_numbers.next()
+            db.session.add(Sale(invoice_number=invoice_number, total_amount=1, payment_method='cash'))
+            db.session.commit()
+            numbers.append(invoice_number)
+
+
+def worker(queue, start_barrier):
+    numbers = []
+    start_event = threading.Event()
+    threads = [threading.Thread(target=cashier, args=(numbers, start_event)) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start_event.set()
+    for thread in threads:
+        thread.join()
+    queue.put(numbers)
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        inherited = invoice_numbers.take(3)
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    start_barrier = context.Barrier(PROCESSES + 1)
+    processes = [context.Process(target=worker, args=(queue, start_barrier)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    numbers = list(inherited)
+    for _ in processes:
+        numbers.extend(queue.get())
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    expected = PROCESSES * THREADS * SALES_PER_THREAD
+    with app.app_context():
+        stored = db.session.query(Sale.invoice_number).count()
+        distinct = db.session.query(Sale.invoice_number).distinct().count()
+        counter = db.session.get(InvoiceCounter, 'sale').next_value
+
+    print(f"العمليات {PROCESSES} × الخيوط {THREADS} × {SALES_PER_THREAD} فاتورة = {expected}")
+    print(f"الزمن {elapsed:.2f} ثانية ({expected / elapsed:.0f} فاتورة/ثانية)")
+    print(f"أرقام فريدة: {len(set(numbers))} من {len(numbers)}، في قاعدة البيانات {distinct} من {stored}")
+    print(f"حجز الكتل: {(counter - 1) // invoice_numbers.block_size} مرة "
+          f"(كتلة {invoice_numbers.block_size}) بدلاً من {expected} استعلام max+1")
+    assert len(set(numbers)) == len(numbers) == expected + len(inherited)
+    assert stored == distinct == expected
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس استيراد وتصدير المنتجات بالجملة (CSV وXLSX).
+
+ينشئ ملف كتالوج مورد بعدد المنتجات المطلوب ويستورده في قاعدة بيانات مؤقتة (إضافة)، ثم
+يستورده مرة ثانية (تحديث بالباركود)، ويقيس التصدير المتدفق، مع أقصى ذاكرة للعملية بعد كل مرحلة
+(القراءة والكتابة تدفقية، والزيادة مع حجم القاعدة من ذاكرة SQLite المؤقتة وmmap).
+الهدف: 100 ألف منتج في أقل من 30 ثانية.
+الاستخدام: python benchmarks/bench_product_import.py [products] [xlsx_products]
+"""
+
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+workdir = tempfile.mkdtemp()
+db_file = os.path.join(workdir, 'bench_import.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+os.environ['SCHEDULER_ENABLED'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, import_products, _export_product_rows
+from product_import import HEADERS, FIELDS, csv_chunks, write_xlsx
+
+PRODUCTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+XLSX_PRODUCTS = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+WORDS = ['أرز', 'سكر', 'زيت', 'عصير', 'حليب', 'جبنة', 'شاي', 'قهوة', 'صابون', 'تونة', 'فول', 'عدس', 'دقيق']
+
+
+def write_catalogue(path, count, rng):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([HEADERS[field] for field in FIELDS])
+        for i in range(count):
+            cost = round(rng.uniform(1, 300), 2)
+            writer.writerow([f'62{i:011d}', ' '.join(rng.choice(WORDS) for _ in range(3)) + f' {i}',
+                             round(cost * 1.25, 2), cost, rng.randint(0, 500), 5,
+                             f'فئة {rng.randint(1, 40)}', ''])
+
+
+def measure(label, count, func):
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{label:<24}{count:>10}{seconds:>10.2f}{count / seconds:>12.0f}{peak:>12.0f}")
+    return result
+
+
+def import_file(path):
+    with open(path, 'rb') as f:
+        result = import_products(f, path)
+    assert result['failed'] == 0, result['errors'][:5]
+    return result
+
+
+def main():
+    rng = random.Random(11)
+    csv_path = os.path.join(workdir, 'catalogue.csv')
+    write_catalogue(csv_path, PRODUCTS, rng)
+    with app.app_context():
+        db.create_all()
+        print(f"{'المرحلة':<24}{'الصفوف':>10}{'الزمن(s)':>10}{'صف/ثانية':>12}{'أقصى ذاكرة MB':>12}")
+        result = measure('استيراد CSV (إضافة)', PRODUCTS, lambda: import_file(csv_path))
+        assert result['created'] == PRODUCTS
+        result = measure('استيراد CSV (تحديث)', PRODUCTS, lambda: import_file(csv_path))
+        assert result['updated'] == PRODUCTS
+
+        export_path = os.path.join(workdir, 'export.csv')
+
+        def export_csv():
+            with open(export_path, 'wb') as f:
+                for chunk in csv_chunks(_export_product_rows()):
+                    f.write(chunk)
+
+        measure('تصدير CSV', PRODUCTS, export_csv)
+
+        xlsx_path = os.path.join(workdir, 'export.xlsx')
+        rows = (row for _, row in zip(range(XLSX_PRODUCTS), _export_product_rows()))
+        measure('تصدير XLSX', XLSX_PRODUCTS, lambda: write_xlsx(rows, xlsx_path))
+        measure('استيراد XLSX (تحديث)', XLSX_PRODUCTS, lambda: import_file(xlsx_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""مقارنة زمن البحث في أسماء المنتجات: فهرس الذاكرة مقابل LIKE '%q%' في SQLite.
+
+الاستخدام: python benchmarks/bench_product_search.py [products]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import ProductSearchIndex
+
+PRODUCTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+WORDS = [
+    'أرز', 'سكر', 'زيت', 'مكرونة', 'عصير', 'مياه', 'حليب', 'جبنة', 'زبادي', 'شاي',
+    'قهوة', 'صابون', 'شامبو', 'منظف', 'بسكويت', 'شوكولاتة', 'تونة', 'فول', 'عدس', 'دقيق',
+    'برتقال', 'مانجو', 'تفاح', 'فراولة', 'ليمون', 'أبيض', 'بني', 'كامل', 'خالي', 'الدسم',
+    'صغير', 'كبير', 'عائلي', 'اقتصادي', 'طبيعي', 'مركز', 'بالنعناع', 'بالفانيليا', 'حار', 'مملح'
+]
+BRANDS = [f'ماركة{i}' for i in range(400)]
+SIZES = ['250 جرام', '500 جرام', '1 كيلو', '1 لتر', '330 مل', '1.5 لتر', '2 كيلو']
+QUERIES = ['ارز', 'أرز أبيض', 'عصير برتقال', 'شوكولا', 'ماركة12', 'منظف', 'حليب كامل', 'فانيليا', 'مانجو 1 لتر']
+
+
+def product_name(rng):
+    return ' '.join([rng.choice(WORDS), rng.choice(WORDS), rng.choice(BRANDS), rng.choice(SIZES)])
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, result
+
+
+def main():
+    rng = random.Random(42)
+    documents = [(i, product_name(rng), f'622{i:010d}') for i in range(1, PRODUCTS + 1)]
+
+    started = time.perf_counter()
+    index = ProductSearchIndex()
+    index.build(documents)
+    print(f"بناء الفهرس لعدد {PRODUCTS} منتج: {time.perf_counter() - started:.2f}s")
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, barcode TEXT)')
+    conn.executemany('INSERT INTO product VALUES (?, ?, ?)', documents)
+    conn.commit()
+
+    print(f"{'البحث':<16}{'الفهرس (ms)':>14}{'LIKE (ms)':>14}{'نتائج الفهرس':>14}{'نتائج LIKE':>12}")
+    for query in QUERIES:
+        index_ms, ids = timed(lambda: index.search(query, 20), 50)
+        like_ms, rows = timed(lambda: conn.execute(
+            "SELECT id, name FROM product WHERE name LIKE '%' || ? || '%' OR barcode LIKE '%' || ? || '%' LIMIT 20",
+            (query, query)).fetchall(), 5)
+        print(f"{query:<16}{index_ms:>14.3f}{like_ms:>14.3f}{len(ids):>14}{len(rows):>12}")
+
+
+if __name__ == '__main__':
+    main()
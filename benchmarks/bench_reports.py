@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس زمن استعلامات التقارير على سجل مبيعات كبير.
+
+ينشئ قاعدة بيانات مؤقتة بعدد كبير من عناصر البيع موزعة على 12 شهراً،
+ويعيد بناء جداول التجميع اليومي منها، ثم يقيس زمن كل دالة من دوال محرك التقارير على الفترة كاملة.
+الاستخدام: python benchmarks/bench_reports.py [sale_items] [products]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+db_file = os.path.join(tempfile.mkdtemp(), 'bench_reports.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, rebuild_sales_rollups, sales_summary, top_products, daily_sales, sales_by_category
+
+SALE_ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+PRODUCTS = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+ITEMS_PER_SALE = 5
+DAYS = 365
+BATCH = 100000
+
+
+def populate():
+    """تعبئة الجداول مباشرة عبر sqlite3 لتسريع إنشاء البيانات"""
+    rng = random.Random(7)
+    conn = sqlite3.connect(db_file)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executemany('INSERT INTO category (id, name, is_active) VALUES (?, ?, 1)',
+                     [(i, f'فئة {i}') for i in range(1, 21)])
+    prices = {}
+    products = []
+    for i in range(1, PRODUCTS + 1):
+        price = round(rng.uniform(2, 200), 2)
+        prices[i] = price
+        products.append((i, f'منتج {i}', f'622{i:010d}', price, round(price * 0.8, 2), 1000, 5, i % 20 + 1, 1))
+    conn.executemany('INSERT INTO product (id, name, barcode, price, cost_price, stock_quantity, min_stock, '
+                     'category_id, is_active) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', products)
+
+    start = datetime.now() - timedelta(days=DAYS)
+    sales_count = SALE_ITEMS // ITEMS_PER_SALE
+    seconds = DAYS * 86400
+    item_id = 0
+    for batch_start in range(0, sales_count, BATCH // ITEMS_PER_SALE):
+        sales = []
+        items = []
+        for sale_id in range(batch_start + 1, min(batch_start + BATCH // ITEMS_PER_SALE, sales_count) + 1):
+            created_at = start + timedelta(seconds=seconds * sale_id // sales_count)
+            total = 0.0
+            for _ in range(ITEMS_PER_SALE):
+                item_id += 1
+                product_id = rng.randint(1, PRODUCTS)
+                quantity = rng.randint(1, 4)
+                line_total = prices[product_id] * quantity
+                total += line_total
+                items.append((item_id, sale_id, product_id, quantity, prices[product_id], line_total))
+            sales.append((sale_id, f'INV-{sale_id}', total, rng.choice(('cash', 'card', 'mixed')), 1,
+                          created_at.strftime('%Y-%m-%d %H:%M:%S.%f')))
+        conn.executemany('INSERT INTO sale (id, invoice_number, total_amount, payment_method, cashier_id, created_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', sales)
+        conn.executemany('INSERT INTO sale_item (id, sale_id, product_id, quantity, unit_price, total_price) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', items)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+
+def measure(label, function):
+    started = time.perf_counter()
+    function()
+    print(f"{label:<24} {(time.perf_counter() - started) * 1000:10.1f} ms")
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()  # إغلاق اتصالات WAL حتى تستطيع التعبئة تغيير journal_mode
+    started = time.perf_counter()
+    populate()
+    print(f"تم إنشاء {SALE_ITEMS} عنصر بيع في {time.perf_counter() - started:.1f}s")
+
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=DAYS)
+    with app.app_context():
+        measure('rebuild_sales_rollups', rebuild_sales_rollups)
+        measure('sales_summary', lambda: sales_summary(start_date, end_date))
+        measure('top_products (qty)', lambda: top_products(start_date, end_date, 10, 'quantity'))
+        measure('top_products (revenue)', lambda: top_products(start_date, end_date, 10, 'revenue'))
+        measure('daily_sales', lambda: daily_sales(start_date, end_date))
+        measure('sales_by_category', lambda: sales_by_category(start_date, end_date))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس عدد الطلبات في الثانية على /api/products/search مع ذاكرة المستخدمين (user_cache) وبدونها.
+
+بدون الذاكرة (مدة صلاحية 0) يحمل load_user المستخدم من قاعدة البيانات في كل طلب كما كان
+سابقاً. يعرض أيضاً عدد استعلامات جدول المستخدمين في كل حالة.
+الاستخدام: python benchmarks/bench_session_user.py [requests] [products]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+db_file = os.path.join(tempfile.mkdtemp(), 'bench_session.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+os.environ['SCHEDULER_ENABLED'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import app, db, Product, User, user_cache
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+PRODUCTS = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+QUERIES = ['ار', 'سكر', 'زيت', 'حليب', '62', 'شاي']
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        cashier = User(username='bench', email='bench@example.com', role='cashier')
+        cashier.set_password('bench123')
+        db.session.add(cashier)
+        db.session.execute(Product.__table__.insert(), [
+            {'name': f'{QUERIES[i % 4]} صنف {i}', 'barcode': f'62{i:011d}', 'price': 10, 'cost_price': 8,
+             'stock_quantity': 100, 'min_stock': 5, 'is_active': True}
+            for i in range(PRODUCTS)
+        ])
+        db.session.commit()
+        cashier_id = cashier.id
+        user_statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: user_statements.append('FROM user' in statement))
+
+    client = app.test_client()
+    with client.session_transaction() as client_session:
+        client_session['_user_id'] = str(cashier_id)
+        client_session['_fresh'] = True
+
+    ttl = user_cache.ttl
+    print(f"{'الحالة':<20}{'طلب/ثانية':>12}{'استعلامات المستخدم':>20}")
+    for label, cache_ttl in (('بدون ذاكرة', 0), ('مع ذاكرة المستخدمين', ttl)):
+        user_cache.ttl = cache_ttl
+        user_cache.invalidate()
+        user_statements.clear()
+        started = time.perf_counter()
+        for i in range(REQUESTS):
+            response = client.get('/api/products/search?q=' + QUERIES[i % len(QUERIES)])
+            assert response.status_code == 200
+        seconds = time.perf_counter() - started
+        print(f"{label:<20}{REQUESTS / seconds:>12.0f}{sum(user_statements):>20}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس تكلفة المشتركين الخاملين في قناة الأحداث المباشرة وزمن توزيع الحدث عليهم.
+
+ينشئ عدداً من المشتركين لكل منهم خيط يستهلك المولد كما يفعل خادم threaded،
+ثم يقيس الذاكرة لكل اتصال وزمن وصول حدث واحد إلى جميع المشتركين.
+الاستخدام: python benchmarks/bench_sse_subscribers.py [subscribers] [events]
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_broker import EventBroker
+
+SUBSCRIBERS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+EVENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+
+def consume(broker, subscription, received, done):
+    for chunk in broker.stream(subscription, heartbeat=60):
+        if chunk.startswith('event:'):
+            received.append(time.perf_counter())
+            done.release()
+
+
+def main():
+    broker = EventBroker()
+    received = [[] for _ in range(SUBSCRIBERS)]
+    done = threading.Semaphore(0)
+    threading.stack_size(256 * 1024)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    subscriptions = []
+    threads = []
+    for i in range(SUBSCRIBERS):
+        subscription = broker.subscribe({'stock'})
+        thread = threading.Thread(target=consume, args=(broker, subscription, received[i], done), daemon=True)
+        thread.start()
+        subscriptions.append(subscription)
+        threads.append(thread)
+    time.sleep(0.5)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    print(f"{SUBSCRIBERS} مشترك خامل: {allocated / 1024:.0f} KiB على heap بايثون "
+          f"({allocated / SUBSCRIBERS:.0f} بايت لكل اتصال، دون مكدس الخيط)")
+
+    payload = {str(pid): pid * 3 for pid in range(1, 11)}
+    samples = []
+    for _ in range(EVENTS):
+        started = time.perf_counter()
+        broker.publish('stock', payload)
+        for _ in range(SUBSCRIBERS):
+            done.acquire()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    print(f"توزيع حدث على {SUBSCRIBERS} مشترك: p50 {samples[len(samples) // 2] * 1000:.1f} ms، "
+          f"الأقصى {samples[-1] * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    broker.publish('stats', payload)
+    print(f"نشر حدث بلا مشتركين في الموضوع: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    for subscription in subscriptions:
+        broker.unsubscribe(subscription)
+    for thread in threads:
+        thread.join()
+    print(f"المشتركون بعد الإغلاق: {len(broker)}")
+
+
+if __name__ == '__main__':
+    main()
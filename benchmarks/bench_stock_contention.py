@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""اختبار ضغط لحجز المخزون: عدة كاشيرات تبيع نفس المنتج في وقت واحد.
+
+يتحقق من أن المخزون لا يُباع أكثر من الموجود ويعرض عدد عمليات البيع في الثانية.
+الاستخدام: python benchmarks/bench_stock_contention.py [cashiers] [stock]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+db_file = os.path.join(tempfile.mkdtemp(), 'bench_stock.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Product, reserve_stock
+
+CASHIERS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+STOCK = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+
+def cashier(product_id, results, index, start_event):
+    sold = 0
+    rejected = 0
+    with app.app_context():
+        start_event.wait()
+        while True:
+            if reserve_stock({product_id: 1}):
+                rejected += 1
+                break
+            db.session.commit()
+            sold += 1
+    results[index] = (sold, rejected)
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        product = Product(name='منتج اختبار', barcode='BENCH-1', price=10, stock_quantity=STOCK)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    results = [None] * CASHIERS
+    start_event = threading.Event()
+    threads = [
+        threading.Thread(target=cashier, args=(product_id, results, i, start_event))
+        for i in range(CASHIERS)
+    ]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    start_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total_sold = sum(sold for sold, _ in results)
+    with app.app_context():
+        remaining = db.session.get(Product, product_id).stock_quantity
+
+    print(f"الكاشيرات: {CASHIERS}  المخزون الابتدائي: {STOCK}")
+    print(f"تم بيع: {total_sold}  المتبقي: {remaining}")
+    print(f"عمليات البيع في الثانية: {total_sold / elapsed:.0f}")
+
+    assert total_sold == STOCK, 'عدد المبيعات لا يساوي المخزون الابتدائي'
+    assert remaining == 0, 'المخزون المتبقي غير صحيح'
+    print("لا يوجد بيع زائد عن المخزون ✔")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""مقارنة إنتاجية القراءة والكتابة المتزامنة بين ملفات أداء التخزين.
+
+لكل ملف (default ثم performance) يشغل عملية مستقلة على قاعدة بيانات جديدة فيها
+كاشيرات يبيعون (حجز مخزون + تأكيد) بالتوازي مع قراء يحسبون إحصائيات لوحة التحكم،
+ويعرض عدد عمليات البيع والقراءة في الثانية وعدد الأخطاء.
+الاستخدام: python benchmarks/bench_storage_profile.py [writers] [readers] [seconds]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+WRITERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+READERS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+SECONDS = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+PRODUCTS = 2000
+
+
+def run_profile():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import app, db, Product, Sale, reserve_stock, _compute_dashboard_stats
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Product.__table__.insert(), [
+            {'name': f'منتج {i}', 'barcode': f'622{i:010d}', 'price': 10, 'cost_price': 8,
+             'stock_quantity': 10 ** 6, 'min_stock': 5, 'is_active': True}
+            for i in range(1, PRODUCTS + 1)
+        ])
+        db.session.commit()
+
+    stop = threading.Event()
+    counts = {'writes': 0, 'reads': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(index):
+        with app.app_context():
+            sale_number = 0
+            while not stop.is_set():
+                sale_number += 1
+                try:
+                    reserve_stock({(sale_number * 7 + index) % PRODUCTS + 1: 1})
+                    db.session.add(Sale(invoice_number=f'B{index}-{sale_number}', total_amount=10,
+                                        payment_method='cash', cashier_id=1))
+                    db.session.commit()
+                    count('writes')
+                except Exception:
+                    db.session.rollback()
+                    count('errors')
+
+    def reader():
+        with app.app_context():
+            while not stop.is_set():
+                try:
+                    _compute_dashboard_stats()
+                    db.session.query(db.func.sum(Product.stock_quantity * Product.price)).scalar()
+                    db.session.rollback()
+                    count('reads')
+                except Exception:
+                    db.session.rollback()
+                    count('errors')
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(WRITERS)]
+    threads += [threading.Thread(target=reader) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        journal = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+    print(f"{app.config['SQLITE_STORAGE_PROFILE']:<12}{journal:>10}{counts['writes'] / SECONDS:>14.0f}"
+          f"{counts['reads'] / SECONDS:>14.0f}{counts['errors']:>10}")
+
+
+def main():
+    print(f"{WRITERS} كاشير و{READERS} قارئ لمدة {SECONDS:.0f} ثوانٍ")
+    print(f"{'الملف':<12}{'journal':>10}{'بيع/ث':>14}{'قراءة/ث':>14}{'أخطاء':>10}")
+    for profile in ('default', 'performance'):
+        env = dict(os.environ, SQLITE_STORAGE_PROFILE=profile,
+                   DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_storage.db'))
+        subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:4]], env=env, check=True)
+
+
+if __name__ == '__main__':
+    if os.environ.get('SQLITE_STORAGE_PROFILE'):
+        run_profile()
+    else:
+        main()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""ذاكرة مؤقتة لكتالوج نقطة البيع على مستوى العملية.
+
+تحتفظ بصفوف مختصرة للمنتجات والفئات والعملاء حتى تُعرض صفحة نقطة البيع
+ويتم البحث دون تحميل كائنات ORM في كل طلب. مسارات الكتابة تسجل الصفوف المتغيرة في سجل
+تغييرات داخل قاعدة البيانات، وكل عملية (عامل) تقرأ السجل عند القراءة وتعيد تحميل تلك الصفوف فقط،
+فلا يعرض عامل مخزوناً أو عميلاً قديماً بعد كتابة في عامل آخر.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from search_index import PhonePrefixIndex, ProductSearchIndex
+
+CatalogProduct = namedtuple('CatalogProduct', 'id name price stock barcode category_id image')
+CatalogCategory = namedtuple('CatalogCategory', 'id name')
+CatalogCustomer = namedtuple('CatalogCustomer', 'id name phone')
+
+
+class CatalogCache:
+    def __init__(self, load_products, load_categories, load_customers, load_changes=None, check_interval=0):
+        """load_*(ids=None): صفوف القسم النشطة كلها، أو النشطة من ids فقط.
+        load_changes(since): (رقم آخر تغيير، [(القسم أو None للكل، المعرف أو None للقسم كله)]) بعد since،
+        والقائمة None إذا حذفت من السجل تغييرات لم تطبق بعد. بدونها يبقى الكتالوج محلياً للعملية.
+        check_interval: أقل مدة بين فحصين للسجل عند القراءة (بالثواني)"""
+        self._loaders = {
+            'products': load_products,
+            'categories': load_categories,
+            'customers': load_customers
+        }
+        self._load_changes = load_changes
+        self.check_interval = check_interval
+        self._seen = None
+        self._next_check = 0.0
+        self._sections = {}
+        self._barcodes = {}
+        self._index = ProductSearchIndex()
+        self._phones = PhonePrefixIndex()
+        self._lock = threading.RLock()
+        self.version = 0
+
+    def _section(self, name):
+        """إرجاع قسم من الكتالوج وتحميله من قاعدة البيانات عند الحاجة"""
+        self.sync()
+        section = self._sections.get(name)
+        if section is None:
+            with self._lock:
+                section = self._sections.get(name)
+                if section is None:
+                    section = {row.id: row for row in self._loaders[name]()}
+                    if name == 'products':
+                        self._barcodes = {row.barcode: row.id for row in section.values() if row.barcode}
+                        self._index.build((row.id, row.name, row.barcode or '') for row in section.values())
+                    elif name == 'customers':
+                        self._phones.build((row.id, row.phone) for row in section.values())
+                    self._sections[name] = section
+        return section
+
+    def _changed(self):
+        self.version += 1
+
+    # القراءة
+    def products(self, in_stock=True):
+        """قائمة المنتجات النشطة (المتوفرة فقط افتراضياً)"""
+        with self._lock:
+            rows = list(self._section('products').values())
+        if in_stock:
+            rows = [row for row in rows if row.stock > 0]
+        return rows
+
+    def get_product(self, product_id):
+        return self._section('products').get(product_id)
+
+    def get_by_barcode(self, barcode):
+        """البحث عن منتج بالباركود المطابق تماماً (بدون اعتبار المخزون)"""
+        products = self._section('products')
+        product_id = self._barcodes.get(barcode)
+        return products.get(product_id) if product_id is not None else None
+
+    def get_by_barcodes(self, barcodes):
+        """البحث عن مجموعة باركودات دفعة واحدة، يعيد {barcode: row} للموجود فقط"""
+        with self._lock:
+            products = self._section('products')
+            found = {}
+            for barcode in barcodes:
+                product_id = self._barcodes.get(barcode)
+                if product_id is not None:
+                    found[barcode] = products[product_id]
+        return found
+
+    def categories(self):
+        with self._lock:
+            return list(self._section('categories').values())
+
+    def customers(self):
+        with self._lock:
+            return list(self._section('customers').values())
+
+    def lookup_customers(self, phone_prefix, limit=10):
+        """العملاء الذين تبدأ أرقام هواتفهم بالبادئة (إرفاق العميل في نقطة البيع)"""
+        customers = self._section('customers')
+        return [customers[customer_id] for customer_id in self._phones.search(phone_prefix, limit)]
+
+    def search(self, query='', category_id=None, limit=20):
+        """البحث في المنتجات المتوفرة بالاسم أو الباركود مرتبة حسب الصلة"""
+        products = self._section('products')
+
+        def accept(product_id):
+            row = products.get(product_id)
+            return row is not None and row.stock > 0 and (not category_id or row.category_id == category_id)
+
+        if query.strip():
+            return [products[product_id] for product_id in self._index.search(query, limit, accept)]
+        return [row for row in self.products() if accept(row.id)][:limit]
+
+    def search_ids(self, query, limit=None):
+        """معرفات كل المنتجات النشطة المطابقة للبحث (بما فيها غير المتوفرة)"""
+        self._section('products')
+        return self._index.search(query, limit)
+
+    # التحديث من سجل التغييرات
+    def sync(self, force=False):
+        """تطبيق التغييرات التي سجلتها أي عملية منذ آخر فحص. force بعد الكتابة في هذه العملية"""
+        if self._load_changes is None:
+            return
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            last, changes = self._load_changes(self._seen)
+            if self._seen is None:
+                # أول فحص قبل تحميل أي قسم: ما بعده فقط يخص هذه العملية
+                self._seen = last
+                return
+            if changes is None or any(section is None for section, _ in changes):
+                self._sections.clear()
+            else:
+                pending = {}
+                for section, item_id in changes:
+                    pending.setdefault(section, set()).add(item_id)
+                for section, ids in pending.items():
+                    if section not in self._sections:
+                        continue
+                    if None in ids:
+                        del self._sections[section]
+                    else:
+                        self._reload(section, ids)
+            self._seen = last
+            if changes is None or changes:
+                self._changed()
+
+    def _reload(self, name, ids):
+        """إعادة تحميل صفوف محددة من قسم محمل مع فهارسه، وحذف ما لم يعد نشطاً"""
+        rows = {row.id: row for row in self._loaders[name](sorted(ids))}
+        section = self._sections[name]
+        for item_id in ids:
+            old = section.pop(item_id, None)
+            row = rows.get(item_id)
+            if name == 'products':
+                if old is not None and old.barcode and self._barcodes.get(old.barcode) == item_id:
+                    del self._barcodes[old.barcode]
+                if row is None:
+                    self._index.remove(item_id)
+                else:
+                    if row.barcode:
+                        self._barcodes[row.barcode] = item_id
+                    self._index.add(item_id, row.name, row.barcode or '')
+            elif name == 'customers':
+                if row is None:
+                    self._phones.remove(item_id)
+                else:
+                    self._phones.add(item_id, row.phone)
+            if row is not None:
+                section[item_id] = row
+
+    def invalidate(self, section=None):
+        """إلغاء قسم معين أو الكتالوج بالكامل في هذه العملية ليعاد تحميله عند أول قراءة"""
+        with self._lock:
+            if section:
+                self._sections.pop(section, None)
+            else:
+                self._sections.clear()
+            self._changed()
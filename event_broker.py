@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""موزع أحداث داخل العملية لبث التحديثات المباشرة عبر Server-Sent Events.
+
+يتم تنسيق كل حدث مرة واحدة ثم توزيع نفس النص على جميع المشتركين،
+ولكل مشترك طابور صغير محدود الحجم حتى لا يستهلك المشترك البطيء الذاكرة.
+"""
+
+import json
+import threading
+from collections import deque
+
+HEARTBEAT_SECONDS = 15
+
+
+class Subscription:
+    __slots__ = ('topics', 'pending', 'ready', 'closed')
+
+    def __init__(self, topics, queue_size):
+        self.topics = topics
+        self.pending = deque(maxlen=queue_size)
+        self.ready = threading.Event()
+        self.closed = False
+
+    def push(self, payload):
+        self.pending.append(payload)
+        self.ready.set()
+
+
+class EventBroker:
+    def __init__(self, queue_size=50):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def has_subscribers(self, topic=None):
+        if topic is None:
+            return bool(self._subscribers)
+        return any(sub.topics is None or topic in sub.topics for sub in list(self._subscribers))
+
+    def subscribe(self, topics=None):
+        """اشتراك جديد في جميع الأحداث أو في مجموعة موضوعات محددة"""
+        subscription = Subscription(frozenset(topics) if topics else None, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        subscription.ready.set()
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, topic, data):
+        """بث حدث لكل المشتركين في الموضوع"""
+        payload = f"event: {topic}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.topics is None or topic in subscription.topics:
+                subscription.push(payload)
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_SECONDS):
+        """مولد نصوص SSE لمشترك واحد، يرسل تعليق keep-alive عند عدم وجود أحداث"""
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscription.closed:
+                if not subscription.ready.wait(heartbeat):
+                    yield ': keep-alive\n\n'
+                    continue
+                subscription.ready.clear()
+                while subscription.pending:
+                    yield subscription.pending.popleft()
+        finally:
+            self.unsubscribe(subscription)
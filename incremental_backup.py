@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""نسخ احتياطي تزايدي بمخزن أجزاء معنون بالمحتوى.
+
+يقسم كل ملف إلى أجزاء (صفحة واحدة لملفات SQLite، و64 كيلوبايت لغيرها)، ويعرف كل جزء
+ببصمته (BLAKE2b)، فلا يكتب إلا الأجزاء التي لم تظهر في أي لقطة سابقة. الأجزاء الجديدة
+لكل لقطة تضغط وتكتب متتالية في ملف pack واحد مع فهرس ثنائي، ولكل لقطة manifest يسرد
+أجزاء كل ملف بالترتيب فيمكن استعادة أي لقطة كاملة. الملفات التي لم يتغير حجمها ووقت
+تعديلها عن اللقطة السابقة تأخذ قائمة أجزائها دون قراءتها، ولقطة قاعدة البيانات تقارن
+بنسخة اللقطة السابقة المحفوظة في base/ فلا تحسب البصمات إلا للصفحات التي تغيرت.
+لكن إنشاء اللقطة ما زال ينسخ القاعدة كاملة ويقرؤها كلها، والنسخة في base/ غير مضغوطة، فالوقت
+يتناسب مع حجم القاعدة والمساحة الإضافية نحو ضعفه (base/ + النسخة المؤقتة أثناء الإنشاء).
+"""
+
+import base64
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CHUNK_SIZE = 64 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 1
+DIGEST_SIZE = 20
+REPACK_LIVE_RATIO = 0.5   # إعادة كتابة pack عند الحذف إذا قل الجزء المستخدم منه عن هذه النسبة
+
+_SQLITE_MAGIC = b'SQLite format 3\x00'
+_INDEX_ENTRY = struct.Struct(f'>{DIGEST_SIZE}sQI')  # البصمة، الموضع، الطول المضغوط
+LOCK_FILENAME = '.lock'
+LOCK_RETRY_SECONDS = 0.1   # إعادة محاولة أخذ القفل في Windows فقط (لا يوجد قفل معلق فيه)
+
+
+def chunk_digest(data):
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def _encode_digests(digests):
+    """قائمة البصمات في manifest كنص base64 واحد (أصغر بكثير من قائمة JSON)"""
+    return base64.b64encode(b''.join(digests)).decode('ascii')
+
+
+def _decode_digests(text):
+    data = base64.b64decode(text)
+    return [data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)]
+
+
+def chunk_size_for(path, default=CHUNK_SIZE):
+    """حجم صفحة SQLite من ترويسة الملف، أو الحجم الافتراضي لباقي الملفات"""
+    with open(path, 'rb') as f:
+        header = f.read(18)
+    if len(header) == 18 and header.startswith(_SQLITE_MAGIC):
+        page_size = struct.unpack('>H', header[16:18])[0]
+        return 65536 if page_size == 1 else page_size
+    return default
+
+
+class StoreLock:
+    """قفل المخزن بين الخيوط والعمليات: محرك النسخ في الخادم وBackupSystem من سطر الأوامر
+    يكتبان في المخزن نفسه، فلا تحذف عملية أجزاء تستخدمها لقطة تكتبها الأخرى"""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, 'a+')
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                            break
+                        except OSError:
+                            time.sleep(LOCK_RETRY_SECONDS)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            self._file.close()   # إغلاق الملف يحرر القفل في النظامين
+            self._file = None
+        self._thread_lock.release()
+
+
+class ChunkStore:
+    """أجزاء مضغوطة داخل ملفات pack، مع فهرس في الذاكرة: البصمة -> (pack، الموضع، الطول)"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._index = None
+        self._packs = None
+        self._lock = threading.Lock()
+
+    def _pack_ids(self):
+        return frozenset(name[:-4] for name in os.listdir(self.root) if name.endswith('.idx'))
+
+    def _load_index(self):
+        if self._index is None:
+            index = {}
+            packs = self._pack_ids()
+            for pack_id in packs:
+                for digest, offset, length in self._read_pack_index(pack_id):
+                    index[digest] = (pack_id, offset, length)
+            self._index, self._packs = index, packs
+        return self._index
+
+    def refresh(self):
+        """إعادة تحميل الفهرس إذا أضافت عملية أخرى ملفات pack أو حذفتها (تحت قفل المخزن)"""
+        with self._lock:
+            if self._index is not None and self._pack_ids() != self._packs:
+                self._index = None
+
+    def _read_pack_index(self, pack_id):
+        with open(os.path.join(self.root, pack_id + '.idx'), 'rb') as f:
+            data = f.read()
+        return list(_INDEX_ENTRY.iter_unpack(data))
+
+    def __contains__(self, digest):
+        return digest in self._load_index()
+
+    def digests(self):
+        return set(self._load_index())
+
+    def writer(self):
+        return PackWriter(self)
+
+    def get(self, digest):
+        """قراءة جزء مع التحقق من بصمته"""
+        pack_id, offset, length = self._load_index()[digest]
+        with open(os.path.join(self.root, pack_id + '.pack'), 'rb') as f:
+            f.seek(offset)
+            data = zlib.decompress(f.read(length))
+        if chunk_digest(data) != digest:
+            raise ValueError(f'الجزء {digest.hex()} تالف')
+        return data
+
+    def read_many(self, digests):
+        """قراءة أجزاء متتالية مع إبقاء ملف pack الحالي مفتوحاً"""
+        index = self._load_index()
+        current_id, current = None, None
+        try:
+            for digest in digests:
+                pack_id, offset, length = index[digest]
+                if pack_id != current_id:
+                    if current is not None:
+                        current.close()
+                    current_id, current = pack_id, open(os.path.join(self.root, pack_id + '.pack'), 'rb')
+                current.seek(offset)
+                data = zlib.decompress(current.read(length))
+                if chunk_digest(data) != digest:
+                    raise ValueError(f'الجزء {digest.hex()} تالف')
+                yield data
+        finally:
+            if current is not None:
+                current.close()
+
+    def collect(self, referenced):
+        """حذف الأجزاء غير المستخدمة: حذف pack بالكامل أو إعادة كتابة المستخدم منه فقط"""
+        with self._lock:
+            index = self._load_index()
+            freed = 0
+            packs = {}
+            for digest, (pack_id, offset, length) in index.items():
+                packs.setdefault(pack_id, []).append((digest, offset, length))
+            for pack_id, entries in packs.items():
+                live = [entry for entry in entries if entry[0] in referenced]
+                pack_path = os.path.join(self.root, pack_id + '.pack')
+                pack_size = os.path.getsize(pack_path)
+                live_bytes = sum(length for _, _, length in live)
+                if live and live_bytes >= pack_size * REPACK_LIVE_RATIO:
+                    continue
+                if live:
+                    with open(pack_path, 'rb') as source, self.writer() as writer:
+                        for digest, offset, length in live:
+                            source.seek(offset)
+                            writer.put_compressed(digest, source.read(length))
+                    freed += pack_size - live_bytes
+                else:
+                    freed += pack_size
+                for digest, _, _ in entries:
+                    if index.get(digest, (None,))[0] == pack_id:
+                        del index[digest]
+                os.remove(os.path.join(self.root, pack_id + '.idx'))
+                os.remove(pack_path)
+            self._packs = self._pack_ids()
+            return freed
+
+
+class PackWriter:
+    """كتابة الأجزاء الجديدة في pack واحد، ولا تظهر في الفهرس إلا بعد إغلاقه بنجاح"""
+
+    def __init__(self, store):
+        self.store = store
+        self.pack_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self._path = os.path.join(store.root, self.pack_id + '.pack')
+        self._file = open(self._path + '.tmp', 'wb')
+        self._entries = []
+        self._pending = set()
+        self._offset = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def put(self, digest, data):
+        """إضافة جزء إن لم يكن مخزناً، وإرجاع عدد البايتات المكتوبة على القرص"""
+        if digest in self._pending or digest in self.store:
+            return 0
+        return self.put_compressed(digest, zlib.compress(data, COMPRESS_LEVEL))
+
+    def put_compressed(self, digest, compressed):
+        self._file.write(compressed)
+        self._entries.append((digest, self._offset, len(compressed)))
+        self._pending.add(digest)
+        self._offset += len(compressed)
+        return len(compressed)
+
+    def commit(self):
+        self._file.close()
+        if not self._entries:
+            os.remove(self._path + '.tmp')
+            return
+        os.replace(self._path + '.tmp', self._path)
+        index_path = os.path.join(self.store.root, self.pack_id + '.idx')
+        with open(index_path + '.tmp', 'wb') as f:
+            f.write(b''.join(_INDEX_ENTRY.pack(*entry) for entry in self._entries))
+        os.replace(index_path + '.tmp', index_path)
+        index = self.store._load_index()
+        for digest, offset, length in self._entries:
+            index[digest] = (self.pack_id, offset, length)
+        self.store._packs = self.store._pack_ids()
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._path + '.tmp')
+
+
+class SnapshotStore:
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.chunks = ChunkStore(os.path.join(root, 'packs'))
+        self.manifest_dir = os.path.join(root, 'manifests')
+        self.base_dir = os.path.join(root, 'base')
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.lock = StoreLock(os.path.join(root, LOCK_FILENAME))
+
+    def snapshot_ids(self):
+        """معرفات اللقطات من الأقدم للأحدث"""
+        return sorted(name[:-5] for name in os.listdir(self.manifest_dir) if name.endswith('.json'))
+
+    def load(self, snapshot_id):
+        with open(os.path.join(self.manifest_dir, snapshot_id + '.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def latest(self):
+        ids = self.snapshot_ids()
+        return self.load(ids[-1]) if ids else None
+
+    def create(self, files, snapshot_type='manual', progress=None):
+        """إنشاء لقطة من [(الاسم داخل اللقطة، المسار، قابل لإعادة الاستخدام بالحجم ووقت التعديل)].
+
+        الملف غير القابل لإعادة الاستخدام نسخة مؤقتة (لقطة قاعدة البيانات): يقارن صفحة بصفحة
+        بالنسخة المحفوظة من اللقطة السابقة فلا تحسب البصمة إلا للصفحات المختلفة، ثم ينقل
+        ليصبح أساس المقارنة التالية. progress(processed_bytes, total_bytes) أثناء القراءة."""
+        with self.lock:
+            self.chunks.refresh()
+            created_at = datetime.now()
+            snapshot_id = f"{created_at.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            parent = self.latest()
+            previous = {entry['path']: entry for entry in parent['files']} if parent else {}
+            old_id = parent['id'] if parent else None
+            based = []
+
+            total_bytes = sum(os.path.getsize(path) for _, path, _ in files) or 1
+            processed = 0
+            stats = {'total_bytes': 0, 'new_chunks': 0, 'new_bytes': 0, 'stored_bytes': 0, 'reused_files': 0}
+            entries = []
+            with self.chunks.writer() as writer:
+                for name, path, reusable in files:
+                    stat = os.stat(path)
+                    stats['total_bytes'] += stat.st_size
+                    old = previous.get(name)
+                    if reusable and old and old['size'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns:
+                        entries.append(old)
+                        stats['reused_files'] += 1
+                        processed += stat.st_size
+                        continue
+
+                    chunk_size = chunk_size_for(path, self.chunk_size)
+                    base_digests = None
+                    if not reusable and old and old['chunk_size'] == chunk_size and \
+                            self._base_snapshot(name) == old_id:
+                        base_digests = _decode_digests(old['chunks'])
+                    digests = []
+                    for data, base_data in self._read_pairs(path, name if base_digests else None, chunk_size):
+                        index = len(digests)
+                        if base_data == data and index < len(base_digests):
+                            # صفحة مطابقة للنسخة السابقة: بصمتها معروفة من manifest السابق
+                            digests.append(base_digests[index])
+                        else:
+                            digest = chunk_digest(data)
+                            stored = writer.put(digest, data)
+                            if stored:
+                                stats['new_chunks'] += 1
+                                stats['new_bytes'] += len(data)
+                                stats['stored_bytes'] += stored
+                            digests.append(digest)
+                        processed += len(data)
+                        if progress is not None and len(digests) % 4096 == 0:
+                            progress(processed, total_bytes)
+                    if not reusable:
+                        based.append((name, path))
+                    entries.append({'path': name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                    'chunk_size': chunk_size, 'chunks': _encode_digests(digests)})
+                    if progress is not None:
+                        progress(processed, total_bytes)
+
+            manifest = {
+                'id': snapshot_id,
+                'type': snapshot_type,
+                'created_at': created_at.isoformat(),
+                'parent': parent['id'] if parent else None,
+                'stats': stats,
+                'files': entries
+            }
+            manifest_path = os.path.join(self.manifest_dir, snapshot_id + '.json')
+            with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(manifest_path + '.tmp', manifest_path)
+            for name, path in based:
+                self._keep_base(name, path, snapshot_id)
+            return manifest
+
+    def _base_path(self, name):
+        return os.path.join(self.base_dir, name.replace('/', '_').replace(os.sep, '_'))
+
+    def _base_snapshot(self, name):
+        """معرف اللقطة التي تطابقها النسخة المحفوظة من الملف، أو None"""
+        try:
+            with open(self._base_path(name) + '.id', 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _keep_base(self, name, path, snapshot_id):
+        """نقل النسخة المؤقتة لتصبح أساس المقارنة في اللقطة التالية"""
+        base_path = self._base_path(name)
+        if os.path.exists(base_path + '.id'):
+            os.remove(base_path + '.id')
+        os.replace(path, base_path)
+        with open(base_path + '.id', 'w', encoding='utf-8') as f:
+            f.write(snapshot_id)
+
+    def _read_pairs(self, path, base_name, chunk_size):
+        """أجزاء الملف مع الجزء المقابل من النسخة السابقة (أو None)، بقراءة كتل كبيرة من الملفين"""
+        block = chunk_size * max(1, READ_BLOCK_SIZE // chunk_size)
+        base = open(self._base_path(base_name), 'rb') if base_name else None
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    data = f.read(block)
+                    if not data:
+                        break
+                    base_block = base.read(block) if base else b''
+                    for offset in range(0, len(data), chunk_size):
+                        end = offset + chunk_size
+                        yield data[offset:end], base_block[offset:end] if base_block else None
+        finally:
+            if base is not None:
+                base.close()
+
+    def restore(self, snapshot_id, destination, paths=None):
+        """إعادة بناء ملفات لقطة (أو ملفات محددة منها) داخل destination مع التحقق من كل جزء"""
+        manifest = self.load(snapshot_id)
+        restored = []
+        for entry in manifest['files']:
+            if paths is not None and entry['path'] not in paths:
+                continue
+            target = os.path.join(destination, entry['path'])
+            os.makedirs(os.path.dirname(target) or destination, exist_ok=True)
+            with open(target + '.tmp', 'wb') as f:
+                for data in self.chunks.read_many(_decode_digests(entry['chunks'])):
+                    f.write(data)
+            os.replace(target + '.tmp', target)
+            restored.append(entry['path'])
+        return restored
+
+    def verify(self, snapshot_id):
+        """قراءة كل أجزاء اللقطة والتحقق من بصماتها، ويعيد أسماء الملفات التالفة"""
+        failed = []
+        for entry in self.load(snapshot_id)['files']:
+            try:
+                for _ in self.chunks.read_many(_decode_digests(entry['chunks'])):
+                    pass
+            except (KeyError, ValueError, OSError, zlib.error):
+                failed.append(entry['path'])
+        return failed
+
+    def prune(self, keep, exclude=()):
+        """الإبقاء على أحدث keep لقطة وحذف الأجزاء التي لم تعد أي لقطة تستخدمها.
+        اللقطات في exclude لا تحذف ولا تحسب من keep"""
+        with self.lock:
+            ids = [snapshot_id for snapshot_id in self.snapshot_ids() if snapshot_id not in exclude]
+            return self.remove(ids[:-keep] if keep > 0 else ids)
+
+    def remove(self, snapshot_ids):
+        """حذف لقطات محددة ثم الأجزاء التي لم تعد مستخدمة"""
+        with self.lock:
+            self.chunks.refresh()
+            removed = []
+            for snapshot_id in snapshot_ids:
+                path = os.path.join(self.manifest_dir, snapshot_id + '.json')
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed.append(snapshot_id)
+
+            referenced = set()
+            for snapshot_id in self.snapshot_ids():
+                for entry in self.load(snapshot_id)['files']:
+                    referenced.update(_decode_digests(entry['chunks']))
+            return {'snapshots': removed, 'freed_bytes': self.chunks.collect(referenced)}
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""مستشار الفهارس: التقاط استعلامات SELECT التي تنفذها الصفحات وفحص خطة تنفيذها.
+
+يعيد تنفيذ كل استعلام بـ EXPLAIN QUERY PLAN بنفس المعاملات، ويحدد الاستعلامات
+التي تقرأ جدولاً كاملاً (SCAN بدون فهرس) حتى تظهر أي صفحة جديدة تحتاج فهرساً.
+"""
+
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+_FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+@contextmanager
+def capture_queries(engine):
+    """تجميع {نص الاستعلام: المعاملات} لكل SELECT ينفذ داخل الكتلة"""
+    statements = {}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.setdefault(statement, parameters)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(connection, statement, parameters):
+    """إرجاع أسطر خطة التنفيذ كما يعرضها SQLite"""
+    return [row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+
+def full_scans(plan, tables):
+    """أسماء الجداول التي تقرأ بالكامل في الخطة (تتجاهل الاستعلامات الفرعية والمؤقتة)"""
+    scans = []
+    for detail in plan:
+        match = _FULL_SCAN.match(detail)
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans
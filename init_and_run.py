@@ -5,7 +5,7 @@ print("Initializing Supermarket Management System...")
 
 try:
     # Import the app and database
-    from app import app, db, User, Category, Customer
+    from app import app, db, init_db, User, Category, Customer, start_scheduler
     
     print("Creating database tables...")
     
@@ -16,7 +16,7 @@ try:
         print("Dropped existing tables")
         
         # Create all tables
-        db.create_all()
+        init_db()
         print("Created all database tables")
         
         # Create default admin user
@@ -125,6 +125,7 @@ try:
     print("=" * 50)
     
     # Start the Flask application
+    start_scheduler(use_reloader=True)
     app.run(host='127.0.0.1', port=5000, debug=True)
     
 except Exception as e:
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""أرقام الفواتير من عداد واحد في قاعدة البيانات بحجز كتل.
+
+كل عملية خادم تحجز كتلة من N رقماً بزيادة العداد مرة واحدة في معاملة قصيرة مستقلة، ثم توزع
+أرقامها من الذاكرة، فلا تضيف عملية البيع أي استعلام إلا مرة كل N فاتورة ولا تتزاحم نقاط البيع
+على صف العداد أو على استعلام max+1. الأرقام فريدة ومتزايدة داخل كل عملية؛ وقد تظهر فجوات
+(أرقام كتلة عملية أعيد تشغيلها، أو عملية بيع فشلت بعد أخذ رقمها).
+"""
+
+import os
+import threading
+
+
+class InvoiceNumberAllocator:
+    def __init__(self, reserve_block, block_size=50, prefix='INV', width=8):
+        """reserve_block(size) يزيد العداد بمقدار size ذرياً ويعيد أول رقم في الكتلة المحجوزة"""
+        self._reserve_block = reserve_block
+        self.block_size = block_size
+        self.prefix = prefix
+        self.width = width
+        self._next = 0
+        self._end = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def take(self, count=1):
+        """count رقم فاتورة منسق (يحجز كتلة جديدة عند نفاد الحالية)"""
+        numbers = []
+        with self._lock:
+            if self._pid != os.getpid():
+                # عملية جديدة بعد fork: الكتلة الموروثة تخص العملية الأم
+                self._next = self._end = 0
+                self._pid = os.getpid()
+            while len(numbers) < count:
+                if self._next >= self._end:
+                    size = max(self.block_size, count - len(numbers))
+                    self._next = self._reserve_block(size)
+                    self._end = self._next + size
+                taken = min(count - len(numbers), self._end - self._next)
+                numbers.extend(range(self._next, self._next + taken))
+                self._next += taken
+        return [self.format(number) for number in numbers]
+
+    def next(self):
+        return self.take(1)[0]
+
+    def format(self, number):
+        return f'{self.prefix}-{number:0{self.width}d}'
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""مجدول المهام الخلفية (النسخ الاحتياطي، إعادة بناء التجميعات، تسخين الذاكرة المؤقتة).
+
+خيط واحد ينام حتى أقرب موعد مهمة بدلاً من الاستيقاظ كل دقيقة. عند تشغيل التطبيق بعدة
+عمليات (عدة workers أو مُعيد التحميل في وضع التطوير) تتنافس العمليات على قفل ملف، فتنفذ
+عملية واحدة فقط (القائد) المهام المشتركة، وتبقى البقية معلقة على القفل في النواة دون أي
+استيقاظ حتى تنتهي عملية القائد فتأخذ إحداها مكانه. آخر تشغيل لكل مهمة يحفظ في ملف JSON
+فلا تعاد المهام عند إعادة التشغيل ولا تضيع المواعيد الفائتة.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_RETRY_SECONDS = 60   # إعادة محاولة أخذ القفل في Windows فقط (لا يوجد قفل معلق فيه)
+
+
+class Job:
+    def __init__(self, name, interval, func, leader_only=True):
+        self.name = name
+        self.interval = interval    # بالثواني، أو None لمهمة تنفذ مرة واحدة عند البدء
+        self.func = func
+        self.leader_only = leader_only
+        self.next_run = None
+
+
+class JobScheduler:
+    def __init__(self, state_path, lock_path):
+        self.state_path = state_path
+        self.lock_path = lock_path
+        self._jobs = {}
+        self._state = {}     # المهام المشتركة (تحفظ في state_path)
+        self._local = {}     # مهام هذه العملية فقط
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock_file = None
+        self.is_leader = False
+
+    def add(self, name, interval, func, leader_only=True):
+        """interval بالثواني؛ leader_only=False للمهام المحلية في كل عملية (مثل تسخين الذاكرة)
+        وتنفذ مرة واحدة عند البدء إذا كان interval هو None"""
+        self._jobs[name] = Job(name, interval, func, leader_only)
+
+    def start(self):
+        # خيط ثان في العملية نفسها سيبقى معلقاً على قفل الملف الذي يملكه الأول إلى الأبد
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._main, name='job-scheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def status(self):
+        state = dict(self._state if self.is_leader else self._load_state(), **self._local)
+        return {
+            'leader': self.is_leader,
+            'pid': os.getpid(),
+            'jobs': [
+                dict(state.get(job.name, {}), name=job.name, interval=job.interval,
+                     leader_only=job.leader_only,
+                     next_run=datetime.fromtimestamp(job.next_run).isoformat() if job.next_run else None)
+                for job in self._jobs.values()
+            ]
+        }
+
+    def _main(self):
+        for job in self._jobs.values():
+            if not job.leader_only:
+                self._run(job, persist=False)
+        if not any(job.leader_only for job in self._jobs.values()):
+            return
+        self._acquire_leadership()
+        try:
+            if self._stopped:
+                return
+            self.is_leader = True
+            self._state = self._load_state()
+            self._loop()
+        finally:
+            # بعد stop تتسلم عملية أخرى القيادة دون انتظار انتهاء هذه العملية
+            self.is_leader = False
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _acquire_leadership(self):
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        self._lock_file = open(self.lock_path, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            return
+        while not self._stopped:
+            try:
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                self._wakeup.wait(LOCK_RETRY_SECONDS)
+
+    def _loop(self):
+        now = time.time()
+        queue = []
+        for job in self._jobs.values():
+            if not job.leader_only or job.interval is None:
+                continue
+            last_run = self._state.get(job.name, {}).get('last_run_ts')
+            # المواعيد الفائتة أثناء التوقف تنفذ مرة واحدة فوراً
+            job.next_run = max(now, last_run + job.interval) if last_run else now
+            heapq.heappush(queue, (job.next_run, job.name))
+
+        while not self._stopped and queue:
+            deadline, name = queue[0]
+            job = self._jobs[name]
+            delay = deadline - time.time()
+            if delay > 0:
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+                continue
+            self._run(job, persist=True)
+            job.next_run = time.time() + job.interval
+            heapq.heapreplace(queue, (job.next_run, name))
+
+    def _run(self, job, persist):
+        started = time.time()
+        record = {'last_run': datetime.fromtimestamp(started).isoformat(), 'last_run_ts': started}
+        try:
+            result = job.func()
+            record['last_status'] = 'skipped' if result is False else 'ok'
+            record['last_error'] = None
+        except Exception as e:
+            traceback.print_exc()
+            record['last_status'] = 'failed'
+            record['last_error'] = str(e)
+        record['duration'] = round(time.time() - started, 3)
+        records = self._state if persist else self._local
+        record['runs'] = records.get(job.name, {}).get('runs', 0) + 1
+        records[job.name] = record
+        if persist:
+            self._save_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        with open(self.state_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(self.state_path + '.tmp', self.state_path)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""ترقيم الصفحات بالمؤشر (keyset) بدلاً من OFFSET.
+
+الترتيب تنازلي حسب (created_at, id)، وكل صفحة تطلب السجلات التي تلي مفتاح آخر سجل
+في الصفحة السابقة مباشرة من الفهرس، لذلك تكلفة الصفحة رقم N مثل تكلفة الصفحة الأولى.
+رموز التالي/السابق نصوص موقعة لا يعتمد عليها العميل في شيء.
+
+السجلات التي created_at فيها NULL لا مفتاح لها فتستبعد (init_db في app يملؤها لقاعدة قديمة).
+نتائج البحث تعرض بترتيب الصلة (paginate_ranked) بدلاً من تاريخ الإنشاء.
+"""
+
+from datetime import datetime
+
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import tuple_
+
+
+class KeysetPage:
+    def __init__(self, items, next_token=None, prev_token=None, total=None):
+        self.items = items
+        self.next_token = next_token
+        self.prev_token = prev_token
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_token is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class KeysetPaginator:
+    def __init__(self, secret_key, salt='keyset-page'):
+        self._serializer = URLSafeSerializer(secret_key, salt=salt)
+
+    def _encode(self, item, direction):
+        return self._serializer.dumps([direction, item.created_at.isoformat(), item.id])
+
+    def _decode(self, token):
+        """إرجاع (الاتجاه، المفتاح) أو (None, None) لرمز غير صالح فيعرض أول صفحة"""
+        if not token:
+            return None, None
+        try:
+            direction, created_at, item_id = self._serializer.loads(token)
+            if direction not in ('next', 'prev'):
+                return None, None
+            return direction, (datetime.fromisoformat(created_at), int(item_id))
+        except (BadSignature, TypeError, ValueError):
+            return None, None
+
+    def paginate(self, query, model, token=None, per_page=20, total=None):
+        """صفحة من query مرتبة تنازلياً حسب (model.created_at, model.id) تبدأ بعد/قبل مفتاح الرمز"""
+        key = tuple_(model.created_at, model.id)
+        direction, position = self._decode(token)
+        query = query.filter(model.created_at.isnot(None))
+
+        if direction == 'prev':
+            rows = query.filter(key > position) \
+                .order_by(model.created_at.asc(), model.id.asc()).limit(per_page + 1).all()
+            has_more = len(rows) > per_page
+            items = rows[:per_page][::-1]
+            has_prev, has_next = has_more, True
+        else:
+            if position is not None:
+                query = query.filter(key < position)
+            rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+            has_more = len(rows) > per_page
+            items = rows[:per_page]
+            has_prev, has_next = position is not None, has_more
+
+        if not items:
+            return KeysetPage(items, total=total)
+        return KeysetPage(
+            items,
+            next_token=self._encode(items[-1], 'next') if has_next else None,
+            prev_token=self._encode(items[0], 'prev') if has_prev else None,
+            total=total
+        )
+
+    def paginate_ranked(self, query, model, ranked_ids, token=None, per_page=20):
+        """صفحة من query بترتيب ranked_ids (نتائج بحث مرتبة بالصلة ومحدودة العدد مسبقاً).
+        الرمز موضع في القائمة بعد تطبيق مرشحات query، والإجمالي عدد المطابق منها"""
+        matching = {item_id for item_id, in query.filter(model.id.in_(ranked_ids)).with_entities(model.id)}
+        ordered = [item_id for item_id in ranked_ids if item_id in matching]
+        try:
+            direction, offset = self._serializer.loads(token) if token else ('rank', 0)
+            offset = int(offset) if direction == 'rank' else 0
+        except (BadSignature, TypeError, ValueError):
+            offset = 0
+        offset = min(max(offset, 0), len(ordered))
+
+        page_ids = ordered[offset:offset + per_page]
+        by_id = {item.id: item for item in query.filter(model.id.in_(page_ids))} if page_ids else {}
+        return KeysetPage(
+            [by_id[item_id] for item_id in page_ids if item_id in by_id],
+            next_token=self._serializer.dumps(['rank', offset + per_page]) if offset + per_page < len(ordered) else None,
+            prev_token=self._serializer.dumps(['rank', max(offset - per_page, 0)]) if offset > 0 else None,
+            total=len(ordered)
+        )
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""قراءة وكتابة ملفات المنتجات (CSV وXLSX) تدفقياً لاستيراد وتصدير الكتالوج بالجملة.
+
+القراءة تعيد الصفوف واحداً تلو الآخر (openpyxl في وضع read_only للـ XLSX) فتبقى الذاكرة
+ثابتة مهما كان حجم الملف، والتحقق من كل صف يعيد رسالة خطأ برقم السطر بدلاً من إيقاف
+الاستيراد. الكتابة في قاعدة البيانات (upsert بالباركود على دفعات) في app.import_products.
+"""
+
+import csv
+import io
+import os
+
+import openpyxl
+
+# الحقول بترتيب التصدير، وعناوين الأعمدة العربية المقبولة في الاستيراد إلى جانب أسماء الحقول
+FIELDS = ('barcode', 'name', 'price', 'cost_price', 'stock_quantity', 'min_stock', 'category', 'description')
+HEADERS = {
+    'barcode': 'الباركود',
+    'name': 'اسم المنتج',
+    'price': 'سعر البيع',
+    'cost_price': 'سعر التكلفة',
+    'stock_quantity': 'الكمية',
+    'min_stock': 'الحد الأدنى',
+    'category': 'الفئة',
+    'description': 'الوصف'
+}
+REQUIRED_FIELDS = ('barcode', 'name', 'price')
+EXPORT_FLUSH_ROWS = 1000
+
+_FIELD_BY_HEADER = dict({field: field for field in FIELDS}, **{header: field for field, header in HEADERS.items()})
+_ARABIC_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩٫', '0123456789.')
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def read_rows(stream, filename):
+    """قراءة ملف منتجات من stream ثنائي. يعيد (الحقول الموجودة في الملف، مولد (رقم السطر، قاموس القيم)).
+    يرفع ImportFileError لصيغة غير مدعومة أو عناوين ناقصة"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        rows = _csv_rows(stream)
+    elif extension in ('.xlsx', '.xlsm'):
+        rows = _xlsx_rows(stream)
+    else:
+        raise ImportFileError('صيغة الملف غير مدعومة (CSV أو XLSX فقط)')
+
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError('الملف فارغ')
+    fields = [_FIELD_BY_HEADER.get(str(title).strip()) if title is not None else None for title in header]
+    missing = [HEADERS[field] for field in REQUIRED_FIELDS if field not in fields]
+    if missing:
+        raise ImportFileError('أعمدة مطلوبة غير موجودة: ' + '، '.join(missing))
+
+    present = [field for field in fields if field]
+
+    def records():
+        try:
+            for number, values in enumerate(rows, start=2):
+                if all(value is None or str(value).strip() == '' for value in values):
+                    continue
+                # الخلايا الفارغة في آخر السطر قد لا تكون موجودة أصلاً
+                record = dict.fromkeys(present)
+                record.update((field, value) for field, value in zip(fields, values) if field)
+                yield number, record
+        finally:
+            rows.close()   # إغلاق الملف فوراً إن توقف المستدعي قبل آخر سطر
+
+    return present, records()
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    except UnicodeDecodeError:
+        raise ImportFileError('ملف CSV يجب أن يكون بترميز UTF-8')
+    finally:
+        text.detach()
+
+
+def _xlsx_rows(stream):
+    try:
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f'ملف Excel غير صالح: {e}')
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))   # الباركود في Excel يقرأ رقماً
+    return str(value).strip()
+
+
+def _number(value, label, integer=False, default=None):
+    text = _text(value).translate(_ARABIC_DIGITS).replace(',', '')
+    if text == '':
+        if default is None:
+            raise ValueError(f'{label} مطلوب')
+        return default
+    try:
+        number = float(text)
+    except ValueError:
+        raise ValueError(f'{label} غير صالح: {text}')
+    if number < 0:
+        raise ValueError(f'{label} لا يمكن أن يكون سالباً')
+    if integer:
+        if not number.is_integer():
+            raise ValueError(f'{label} يجب أن يكون عدداً صحيحاً')
+        return int(number)
+    return number
+
+
+def clean_row(record):
+    """تحويل قيم صف إلى أنواعها. يعيد قاموس الحقول الموجودة، ويرفع ValueError برسالة الخطأ"""
+    barcode = _text(record['barcode']).translate(_ARABIC_DIGITS)
+    name = _text(record['name'])
+    if not barcode:
+        raise ValueError('الباركود مطلوب')
+    if len(barcode) > 50:
+        raise ValueError('الباركود أطول من 50 حرفاً')
+    if not name:
+        raise ValueError('اسم المنتج مطلوب')
+    if len(name) > 200:
+        raise ValueError('اسم المنتج أطول من 200 حرف')
+
+    values = {'barcode': barcode, 'name': name, 'price': _number(record['price'], HEADERS['price'])}
+    if 'cost_price' in record:
+        values['cost_price'] = _number(record['cost_price'], HEADERS['cost_price'], default=0)
+    if 'stock_quantity' in record:
+        values['stock_quantity'] = _number(record['stock_quantity'], HEADERS['stock_quantity'], integer=True, default=0)
+    if 'min_stock' in record:
+        values['min_stock'] = _number(record['min_stock'], HEADERS['min_stock'], integer=True, default=5)
+    if 'category' in record:
+        values['category'] = _text(record['category'])
+    if 'description' in record:
+        values['description'] = _text(record['description'])
+    return values
+
+
+def csv_chunks(rows):
+    """تصدير صفوف (بترتيب FIELDS) إلى CSV كأجزاء bytes لاستجابة متدفقة"""
+    buffer = io.StringIO()
+    buffer.write('\ufeff')   # حتى يفتح Excel الملف العربي بترميز UTF-8
+    writer = csv.writer(buffer)
+    writer.writerow([HEADERS[field] for field in FIELDS])
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_FLUSH_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_xlsx(rows, path):
+    """تصدير صفوف إلى ملف XLSX في وضع write_only (الذاكرة ثابتة)"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('المنتجات')
+    sheet.append([HEADERS[field] for field in FIELDS])
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(path)
@@ -5,14 +5,13 @@ print("Starting Supermarket Management System...")
 
 try:
     print("Loading application...")
-    from app import app, db
+    from app import app, init_db, start_scheduler
     print("Application loaded successfully!")
 
     # Initialize database
     print("Initializing database...")
-    with app.app_context():
-        db.create_all()
-        print("Database initialized!")
+    init_db()
+    print("Database initialized!")
 
     print("Starting server on port 5000...")
     print("=" * 50)
@@ -23,6 +22,7 @@ try:
     print("Press Ctrl+C to stop server")
     print()
 
+    start_scheduler(use_reloader=True)
     app.run(host='127.0.0.1', port=5000, debug=True)
     
 except ImportError as e:
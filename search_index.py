@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""فهرس بحث نصي لأسماء المنتجات داخل الذاكرة.
+
+يوحّد أشكال الحروف العربية (الألف والهمزات والتاء المربوطة والتشكيل)،
+ويبحث بالبادئة عبر قائمة مرتبة من الكلمات، وبأجزاء الكلمات عبر فهرس ثلاثي الأحرف،
+ويرتب النتائج بحيث تظهر المطابقات من بداية الاسم أولاً.
+"""
+
+import bisect
+import itertools
+import re
+import threading
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_TOKEN_SPLIT = re.compile(r'[^\w]+')
+_CHAR_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9'
+})
+
+GRAM_SIZE = 3
+
+
+def normalize_arabic(text):
+    """توحيد النص العربي للبحث: إزالة التشكيل والتطويل وتوحيد أشكال الحروف"""
+    if not text:
+        return ''
+    return _DIACRITICS.sub('', text).translate(_CHAR_MAP).casefold()
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_SPLIT.split(normalize_arabic(text)) if token]
+
+
+def _grams(token):
+    return {token[i:i + GRAM_SIZE] for i in range(len(token) - GRAM_SIZE + 1)}
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._names = {}      # id -> الاسم بعد التوحيد
+        self._keys = {}       # id -> مفتاح الترتيب داخل نفس المجموعة (الأقصر أولاً)
+        self._doc_tokens = {}  # id -> كلمات المستند
+        self._postings = {}   # كلمة -> مجموعة المعرفات
+        self._leading = {}    # أول كلمة في الاسم -> مجموعة المعرفات
+        self._gram_tokens = {}  # ثلاثي أحرف -> مجموعة الكلمات
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+
+    def __len__(self):
+        return len(self._names)
+
+    def build(self, documents):
+        """بناء الفهرس من [(id, text, extra)]"""
+        with self._lock:
+            self._reset()
+            for doc_id, text, extra in documents:
+                self.add(doc_id, text, extra)
+
+    def add(self, doc_id, text, extra=''):
+        """إضافة مستند أو تحديثه. extra نص إضافي يفهرس دون أن يدخل في الترتيب (مثل الباركود)"""
+        with self._lock:
+            self.remove(doc_id)
+            name_tokens = tokenize(text)
+            tokens = set(name_tokens) | set(tokenize(extra))
+            name = self._names[doc_id] = normalize_arabic(text)
+            self._keys[doc_id] = (len(name) << 40) + doc_id
+            self._doc_tokens[doc_id] = tokens
+            if name_tokens:
+                self._leading.setdefault(name_tokens[0], set()).add(doc_id)
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = set()
+                    for gram in _grams(token):
+                        self._gram_tokens.setdefault(gram, set()).add(token)
+                    self._vocabulary_dirty = True
+                postings.add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            tokens = self._doc_tokens.pop(doc_id, None)
+            if tokens is None:
+                return
+            self._keys.pop(doc_id, None)
+            leading = tokenize(self._names.pop(doc_id))
+            if leading:
+                self._leading[leading[0]].discard(doc_id)
+            for token in tokens:
+                postings = self._postings[token]
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[token]
+                    for gram in _grams(token):
+                        self._gram_tokens[gram].discard(token)
+                    self._vocabulary_dirty = True
+
+    def _prefix_tokens(self, term):
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, term)
+        end = bisect.bisect_left(vocabulary, term + '\U0010ffff', start)
+        return vocabulary[start:end]
+
+    def _infix_tokens(self, term):
+        if len(term) < GRAM_SIZE:
+            return []
+        candidates = None
+        for gram in sorted(_grams(term), key=lambda g: len(self._gram_tokens.get(g, ()))):
+            tokens = self._gram_tokens.get(gram)
+            if not tokens:
+                return []
+            candidates = set(tokens) if candidates is None else candidates & tokens
+            if not candidates:
+                return []
+        return [token for token in candidates if term in token]
+
+    def _ranked(self, ids, limit, accept):
+        """ترتيب مجموعة معرفات بمفتاح الترتيب مع تطبيق accept على أقل عدد ممكن منها"""
+        ordered = sorted(ids, key=self._keys.__getitem__)
+        if accept is not None:
+            ordered = filter(accept, ordered)
+        return list(itertools.islice(ordered, limit))
+
+    def search(self, query, limit=20, accept=None):
+        """إرجاع معرفات أفضل limit نتيجة مرتبة، مع تصفية اختيارية بالدالة accept(id).
+        الترتيب: الاسم يبدأ بالبحث، ثم كل الكلمات مطابقة كبادئة، ثم المطابقة داخل الكلمات."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            # البدء بأقل الكلمات نتائج ثم تضييق المرشحين بالتقاطع مع باقي الكلمات
+            expanded = []
+            for term in terms:
+                prefix_tokens = self._prefix_tokens(term)
+                infix_tokens = [token for token in self._infix_tokens(term) if not token.startswith(term)]
+                size = sum(len(self._postings[token]) for token in prefix_tokens + infix_tokens)
+                expanded.append((size, prefix_tokens, infix_tokens))
+            expanded.sort(key=lambda item: item[0])
+
+            prefix_ids = None
+            matched_ids = None
+            for _, prefix_tokens, infix_tokens in expanded:
+                term_prefix = set()
+                term_all = set()
+                for token in prefix_tokens:
+                    postings = self._postings[token]
+                    term_prefix |= postings if prefix_ids is None else prefix_ids & postings
+                    term_all |= postings if matched_ids is None else matched_ids & postings
+                for token in infix_tokens:
+                    postings = self._postings[token]
+                    term_all |= postings if matched_ids is None else matched_ids & postings
+                prefix_ids = term_prefix
+                matched_ids = term_all
+                if not matched_ids:
+                    return []
+
+            # الأسماء التي تبدأ بنص البحث: تُفحص فقط المرشحة من أول كلمة
+            phrase = normalize_arabic(query).strip()
+            names = self._names
+            starts = set()
+            for token in self._prefix_tokens(terms[0]):
+                starts |= self._leading.get(token, set())
+            starts &= prefix_ids
+            if phrase != terms[0]:
+                starts = {doc_id for doc_id in starts if names[doc_id].startswith(phrase)}
+
+            results = []
+            for group in (starts, prefix_ids - starts, matched_ids - prefix_ids):
+                remaining = None if limit is None else limit - len(results)
+                if remaining == 0:
+                    break
+                results.extend(self._ranked(group, remaining, accept))
+            return results
+
+
+def normalize_phone(phone):
+    """أرقام الهاتف فقط (مع تحويل الأرقام العربية)، ومفتاح الدولة +20 / 0020 يصبح 0 محلياً"""
+    digits = ''.join(ch for ch in (phone or '').translate(_CHAR_MAP) if ch.isdigit())
+    if digits.startswith('0020'):
+        digits = '0' + digits[4:]
+    elif digits.startswith('20') and len(digits) == 12:
+        digits = '0' + digits[2:]
+    return digits
+
+
+class PhonePrefixIndex:
+    """أرقام هواتف العملاء في قائمة مرتبة، والبحث ببادئة الرقم نطاق bisect واحد"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []    # (الرقم بعد التوحيد، id) مرتبة
+        self._phones = {}     # id -> الرقم بعد التوحيد
+
+    def __len__(self):
+        return len(self._phones)
+
+    def build(self, documents):
+        """بناء الفهرس من [(id, phone)]"""
+        with self._lock:
+            self._phones = {doc_id: normalize_phone(phone) for doc_id, phone in documents}
+            self._entries = sorted((phone, doc_id) for doc_id, phone in self._phones.items() if phone)
+
+    def add(self, doc_id, phone):
+        with self._lock:
+            self.remove(doc_id)
+            phone = self._phones[doc_id] = normalize_phone(phone)
+            if phone:
+                bisect.insort(self._entries, (phone, doc_id))
+
+    def remove(self, doc_id):
+        with self._lock:
+            phone = self._phones.pop(doc_id, None)
+            if phone:
+                index = bisect.bisect_left(self._entries, (phone, doc_id))
+                if index < len(self._entries) and self._entries[index] == (phone, doc_id):
+                    del self._entries[index]
+
+    def search(self, prefix, limit=10):
+        """معرفات العملاء الذين تبدأ أرقامهم بالبادئة، بترتيب الرقم"""
+        prefix = normalize_phone(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._entries, (prefix,))
+            results = []
+            for phone, doc_id in itertools.islice(self._entries, start, start + limit):
+                if not phone.startswith(prefix):
+                    break
+                results.append(doc_id)
+            return results
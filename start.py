@@ -1,5 +1,7 @@
-from app import app
+from app import app, init_db, start_scheduler
 
 if __name__ == '__main__':
     print("Starting server...")
+    init_db()
+    start_scheduler(use_reloader=True)
     app.run(host='127.0.0.1', port=5000, debug=True)
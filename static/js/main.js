@@ -76,9 +76,13 @@ function bindEvents() {
         });
     });
     
-    // تحديث تلقائي للإحصائيات
+    // تحديث تلقائي للإحصائيات (بث مباشر، أو كل 30 ثانية إذا لم يدعمه المتصفح)
     if ($('#dashboard').length) {
-        setInterval(updateDashboardStats, 30000); // كل 30 ثانية
+        if (window.EventSource) {
+            subscribeDashboardEvents();
+        } else {
+            setInterval(updateDashboardStats, 30000);
+        }
     }
     
     // حفظ تلقائي للنماذج
@@ -177,23 +181,36 @@ function showConfirmDialog(title, message, confirmText, cancelText, onConfirm) {
     });
 }
 
+// عرض إحصائيات لوحة التحكم
+function renderDashboardStats(data) {
+    $('#total-products').text(data.total_products);
+    $('#low-stock-products').text(data.low_stock_products);
+    $('#today-sales').text(data.today_sales);
+    $('#today-revenue').text(data.today_revenue.toFixed(2) + ' ج.م');
+}
+
 // تحديث إحصائيات لوحة التحكم
 function updateDashboardStats() {
     $.ajax({
         url: '/api/dashboard-stats',
         method: 'GET',
-        success: function(data) {
-            $('#total-products').text(data.total_products);
-            $('#low-stock-products').text(data.low_stock_products);
-            $('#today-sales').text(data.today_sales);
-            $('#today-revenue').text(data.today_revenue.toFixed(2) + ' ج.م');
-        },
+        success: renderDashboardStats,
         error: function() {
             console.log('فشل في تحديث الإحصائيات');
         }
     });
 }
 
+// الاشتراك في تحديثات لوحة التحكم المباشرة
+function subscribeDashboardEvents() {
+    const source = new EventSource('/api/events?topics=stats');
+    source.addEventListener('stats', function(e) {
+        renderDashboardStats(JSON.parse(e.data));
+    });
+    // عند إعادة الاتصال نجلب آخر إحصائيات لتعويض ما فات
+    source.addEventListener('open', updateDashboardStats);
+}
+
 // حفظ تلقائي للنماذج
 function autoSaveForm() {
     const form = $(this);
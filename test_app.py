@@ -9,12 +9,11 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     print("بدء تشغيل التطبيق...")
-    from app import app, db
+    from app import app, init_db, start_scheduler
     
     print("إنشاء قاعدة البيانات...")
-    with app.app_context():
-        db.create_all()
-        print("تم إنشاء قاعدة البيانات بنجاح")
+    init_db()
+    print("تم إنشاء قاعدة البيانات بنجاح")
     
     print("تشغيل الخادم...")
     print("الرابط: http://localhost:5000")
@@ -22,6 +21,7 @@ try:
     print("كلمة المرور: admin123")
     print("-" * 50)
     
+    start_scheduler(use_reloader=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
     
 except Exception as e:
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""إعداد الاختبارات: قاعدة SQLite مؤقتة للجلسة كلها، وجداول فارغة وذاكرة مؤقتة نظيفة لكل اختبار."""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# قبل استيراد التطبيق: محرك قاعدة البيانات ينشأ عند الاستيراد
+_DB_DIR = tempfile.mkdtemp(prefix='supermarket-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_DB_DIR, 'test.db')
+os.environ['SCHEDULER_ENABLED'] = '0'
+
+import app as app_module  # noqa: E402
+from backup_engine import BackupEngine  # noqa: E402
+
+# الصفحات التي تفتحها الاختبارات (مثل /backup في مستشار الفهارس) لا تكتب في مجلد backups الحقيقي
+app_module.backup_engine = BackupEngine(os.path.join(_DB_DIR, 'backups'))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def app():
+    flask_app = app_module.app
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+    app_module.catalog.check_interval = 0
+    app_module.catalog.invalidate()
+    for cache in (app_module.dashboard_cache, app_module.listing_counts,
+                  app_module.listing_stats, app_module.user_cache):
+        cache.invalidate()
+    # كتلة أرقام الفواتير المحجوزة من قاعدة الاختبار السابقة
+    app_module.invoice_numbers._next = app_module.invoice_numbers._end = 0
+    yield flask_app
+    with flask_app.app_context():
+        app_module.db.session.remove()
+
+
+def create_user(username='admin', role='admin', password='secret'):
+    user = app_module.User(username=username, email=f'{username}@example.com', role=role, is_active=True)
+    user.set_password(password)
+    app_module.db.session.add(user)
+    app_module.db.session.commit()
+    return user.id
+
+
+def login(client, username='admin', password='secret'):
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+    return client
+
+
+def login_as(client, user_id):
+    """جلسة مستخدم دون المرور بتجزئة كلمة المرور (للاختبارات التي تفتح جلسات كثيرة)"""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def admin_id(app):
+    with app.app_context():
+        return create_user()
+
+
+@pytest.fixture
+def client(app, admin_id):
+    return login_as(app.test_client(), admin_id)
+
+
+@pytest.fixture
+def products(app):
+    """خمسة منتجات في فئة واحدة، مخزون كل منها 5، ويعيد معرفاتها"""
+    with app.app_context():
+        category = app_module.Category(name='عام', is_active=True)
+        app_module.db.session.add(category)
+        app_module.db.session.flush()
+        rows = [app_module.Product(name=f'منتج {i}', barcode=f'B{i:04d}', price=10 + i, cost_price=5,
+                                   stock_quantity=5, min_stock=1, category_id=category.id, is_active=True)
+                for i in range(5)]
+        app_module.db.session.add_all(rows)
+        app_module.db.session.commit()
+        return [row.id for row in rows]
+
+
+def stock_of(product_id):
+    return app_module.db.session.get(app_module.Product, product_id).stock_quantity
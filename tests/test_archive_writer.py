@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import zipfile
+
+import pytest
+
+import archive_writer
+from archive_writer import ArchiveWriter
+from backup_restore import open_source
+
+
+@pytest.fixture
+def files(tmp_path):
+    """ملف نصي يمتد على عدة كتل، وملف عشوائي، وصورة تخزن دون ضغط"""
+    paths = {
+        'data/text.txt': ''.join(f'سطر تجريبي {i}\n' for i in range(150000)).encode('utf-8'),
+        'data/random.bin': os.urandom(archive_writer.BLOCK_SIZE + 12345),
+        'static/logo.png': os.urandom(5000),
+    }
+    for name, data in paths.items():
+        path = tmp_path / 'src' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return tmp_path / 'src', paths
+
+
+def _write(tmp_path, source, members, codec, **options):
+    path = str(tmp_path / f'out_{codec}.zip')
+    with ArchiveWriter(path, codec, workers=3, **options) as archive:
+        for name in members:
+            archive.add_file(str(source / name), name)
+        archive.add_bytes('{"ملاحظة": 1}'.encode('utf-8'), 'backup_info.json')
+    return path, archive
+
+
+@pytest.mark.parametrize('codec', ['store', 'deflate', 'lzma'])
+def test_standard_codecs_are_readable_by_zipfile(tmp_path, files, codec):
+    source, members = files
+    assert len(members['data/text.txt']) > 2 * archive_writer.BLOCK_SIZE
+    path, archive = _write(tmp_path, source, members, codec)
+
+    with zipfile.ZipFile(path) as result:
+        assert result.testzip() is None
+        for name, data in members.items():
+            assert result.read(name) == data
+            assert archive.hashes[name] == hashlib.sha256(data).hexdigest()
+        assert result.getinfo('static/logo.png').compress_type == zipfile.ZIP_STORED
+        assert result.read('backup_info.json').decode('utf-8') == '{"ملاحظة": 1}'
+        if codec != 'store':
+            assert result.getinfo('data/text.txt').compress_size < len(members['data/text.txt']) / 4
+    assert archive.stats['members'] == 4
+
+
+def test_default_codec_is_deflate(tmp_path, files):
+    source, members = files
+    path = str(tmp_path / 'default.zip')
+    with ArchiveWriter(path) as archive:
+        archive.add_file(str(source / 'data/text.txt'), 'data/text.txt')
+    with zipfile.ZipFile(path) as result:
+        assert result.getinfo('data/text.txt').compress_type == zipfile.ZIP_DEFLATED
+    assert archive.stats['codec'] == 'deflate'
+
+
+def test_zip64_members_are_readable(tmp_path, files, monkeypatch):
+    source, members = files
+    monkeypatch.setattr(archive_writer, 'ZIP64_LIMIT', 1000)
+    path, _ = _write(tmp_path, source, members, 'deflate')
+    with zipfile.ZipFile(path) as result:
+        for name, data in members.items():
+            assert result.read(name) == data
+
+
+@pytest.mark.skipif(archive_writer.zstandard is None, reason='zstandard غير مثبت')
+def test_zstd_is_opt_in_and_read_by_the_restore_reader(tmp_path, files):
+    source, members = files
+    path, _ = _write(tmp_path, source, members, 'zstd')
+    with zipfile.ZipFile(path) as result:
+        with pytest.raises(NotImplementedError):
+            result.read('data/text.txt')
+    reader = open_source(path)
+    try:
+        for name, data in members.items():
+            assert reader.read_bytes(name) == data
+    finally:
+        reader.close()
+
+
+def test_unknown_codec_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ArchiveWriter(str(tmp_path / 'x.zip'), 'brotli')
+    assert not (tmp_path / 'x.zip').exists()
+
+
+@pytest.mark.parametrize('codec', ['deflate', 'lzma'])
+def test_hashes_are_complete_before_the_archive_is_closed(tmp_path, files, codec):
+    """backup_info.json يكتب قبل الإغلاق، وقد تكون كتل الملفات ما زالت في خيوط الضغط"""
+    source, members = files
+    with ArchiveWriter(str(tmp_path / 'out.zip'), codec, workers=3) as archive:
+        for name in members:
+            archive.add_file(str(source / name), name)
+        assert archive.hashes == {name: hashlib.sha256(data).hexdigest() for name, data in members.items()}
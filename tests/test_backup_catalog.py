@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+import app as app_module
+from archive_writer import zstandard
+from backup_catalog import CATALOG_FILENAME, BackupCatalog
+from backup_engine import BackupEngine
+
+
+def _zip(path, info):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('supermarket.db', b'data')
+        archive.writestr('backup_info.json', json.dumps(info))
+
+
+@pytest.fixture
+def backup_dir(tmp_path):
+    """نسخ قديمة من قبل وجود الفهرس: أرشيف ببصمات، ومجلد نسخة، وأرشيف تالف"""
+    path = tmp_path / 'backups'
+    path.mkdir()
+    _zip(path / 'backup_manual_1.zip', {'type': 'manual', 'created_at': '2026-01-01T10:00:00', 'hashes': {'x': 'y'}})
+    (path / 'backup_auto_0').mkdir()
+    (path / 'backup_auto_0' / 'backup_info.json').write_text(
+        json.dumps({'type': 'auto', 'created_at': '2025-12-31T10:00:00'}))
+    (path / 'broken.zip').write_bytes(b'not a zip')
+    return path
+
+
+def test_first_load_scans_existing_backups_once(backup_dir):
+    catalog = BackupCatalog(str(backup_dir))
+    entries = {entry['name']: entry for entry in catalog.list()}
+
+    assert (backup_dir / CATALOG_FILENAME).exists()
+    assert (entries['backup_manual_1.zip']['type'], entries['backup_manual_1.zip']['verification']) == \
+        ('manual', 'pending')
+    assert (entries['backup_auto_0']['kind'], entries['backup_auto_0']['verification']) == ('directory', 'unverifiable')
+    assert entries['broken.zip']['type'] == 'unknown'
+
+    # القائمة التالية من الفهرس دون فتح النسخ
+    os.remove(backup_dir / 'backup_manual_1.zip')
+    assert 'backup_manual_1.zip' in {entry['name'] for entry in BackupCatalog(str(backup_dir)).list()}
+
+
+def test_list_is_newest_first_and_summary_adds_sizes(backup_dir):
+    catalog = BackupCatalog(str(backup_dir))
+    names = [entry['name'] for entry in catalog.list()]
+    assert names.index('backup_manual_1.zip') < names.index('backup_auto_0')
+    summary = catalog.summary()
+    assert summary['count'] == 3
+    assert summary['total_size'] == sum(entry['size'] for entry in catalog.list())
+    assert summary['last_backup'] == catalog.list()[0]['created_at']
+
+
+def test_changes_by_another_instance_are_picked_up(backup_dir):
+    reader, writer = BackupCatalog(str(backup_dir)), BackupCatalog(str(backup_dir))
+    assert len(reader.list()) == 3
+
+    writer.set_verification('backup_manual_1.zip', 'verified')
+    writer.remove('broken.zip')
+    assert reader.get('backup_manual_1.zip')['verification'] == 'verified'
+    assert reader.get('broken.zip') is None
+
+
+def test_engine_backups_are_added_and_deleted(tmp_path):
+    db_path = str(tmp_path / 'live.db')
+    sqlite3.connect(db_path).close()
+    engine = BackupEngine(str(tmp_path / 'backups'))
+    archive = engine.run(db_path).filename
+    snapshot = engine.run(db_path, mode='incremental').filename
+
+    entries = {entry['name']: entry for entry in engine.catalog.list()}
+    assert (entries[archive]['kind'], entries[archive]['codec']) == ('archive', 'deflate')
+    assert (entries[snapshot]['kind'], entries[snapshot]['verification']) == ('snapshot', 'pending')
+    assert entries[archive]['duration'] is not None
+
+    assert engine.delete(archive) and engine.delete(snapshot)
+    assert engine.catalog.list() == [] and not os.path.exists(os.path.join(engine.backup_dir, archive))
+    assert not engine.delete(archive)
+
+
+@pytest.mark.skipif(zstandard is None, reason='zstandard غير مثبت')
+def test_scan_reads_the_info_of_zstd_archives(tmp_path):
+    db_path = str(tmp_path / 'live.db')
+    sqlite3.connect(db_path).close()
+    engine = BackupEngine(str(tmp_path / 'backups'), codec='zstd')
+    name = engine.run(db_path, backup_type='auto').filename
+    os.remove(engine.catalog.path)
+
+    entry = BackupCatalog(engine.backup_dir).get(name)
+    assert (entry['type'], entry['codec'], entry['verification']) == ('auto', 'zstd', 'pending')
+
+
+def test_backup_page_renders_from_the_catalog(client, monkeypatch, backup_dir):
+    monkeypatch.setattr(app_module, 'backup_engine', BackupEngine(str(backup_dir)))
+    page = client.get('/backup')
+    assert page.status_code == 200
+    assert 'backup_manual_1.zip' in page.get_data(as_text=True)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+from backup_engine import BackupEngine, snapshot_database
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT count(*) FROM t').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _insert(path, count=1):
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO t VALUES (?)', [(os.urandom(2048),) for _ in range(count)])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def live(tmp_path):
+    """قاعدة حية في وضع WAL بعدة صفحات ومجلد ملفات ثابتة"""
+    db_path = str(tmp_path / 'live.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE t (value BLOB)')
+    conn.commit()
+    conn.close()
+    _insert(db_path, 50)
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'site.css').write_text('body {}')
+    return db_path, str(static)
+
+
+def test_snapshot_is_consistent_while_sales_are_written(tmp_path, live):
+    db_path, _ = live
+    progress = []
+
+    def write_during_copy(copied, total):
+        progress.append((copied, total))
+        _insert(db_path)   # لا تنتظر الكتابة انتهاء النسخ ولا تعيده من البداية
+
+    target = str(tmp_path / 'copy.db')
+    snapshot_database(db_path, target, pages=1, sleep=0, progress=write_during_copy)
+
+    assert _rows(target) == 50
+    assert _rows(db_path) == 50 + len(progress)
+    assert len(progress) > 1 and progress[-1][0] == progress[-1][1]
+
+
+def test_archive_job_writes_a_verifiable_zip(tmp_path, live):
+    db_path, static = live
+    engine = BackupEngine(str(tmp_path / 'backups'), [('static', static)], step_pages=4)
+    job = engine.run(db_path)
+
+    assert job.status == 'completed' and job.to_dict()['progress'] == 100.0
+    archive_path = os.path.join(engine.backup_dir, job.filename)
+    assert job.size == os.path.getsize(archive_path)
+    assert not [name for name in os.listdir(engine.backup_dir) if name.startswith('.snapshot_') or name.endswith('.part')]
+    with zipfile.ZipFile(archive_path) as archive:
+        info = json.loads(archive.read('backup_info.json'))
+        assert sorted(archive.namelist()) == ['backup_info.json', 'static/site.css', 'supermarket.db']
+        restored = tmp_path / 'restored.db'
+        restored.write_bytes(archive.read('supermarket.db'))
+    assert set(info['hashes']) == {'supermarket.db', 'static/site.css'}
+    assert _rows(str(restored)) == 50
+
+    assert engine.catalog.get(job.filename)['verification'] == 'pending'
+    assert engine.verify(job.filename)['state'] == 'verified'
+    assert engine.catalog.get(job.filename)['verification'] == 'verified'
+
+
+def test_verify_detects_a_changed_member(tmp_path, live):
+    db_path, static = live
+    engine = BackupEngine(str(tmp_path / 'backups'), [('static', static)])
+    job = engine.run(db_path)
+    archive_path = os.path.join(engine.backup_dir, job.filename)
+    with zipfile.ZipFile(archive_path) as archive:
+        members = {name: archive.read(name) for name in archive.namelist()}
+    members['static/site.css'] = b'tampered'
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+    result = engine.verify(job.filename)
+    assert (result['state'], result['failed']) == ('failed', ['static/site.css'])
+    assert engine.catalog.get(job.filename)['verification'] == 'failed'
+    assert engine.verify('missing.zip') is None
+
+
+def test_incremental_job_stores_only_new_pages(tmp_path, live):
+    db_path, static = live
+    engine = BackupEngine(str(tmp_path / 'backups'), [('static', static)])
+    first = engine.run(db_path, mode='incremental')
+    _insert(db_path)
+    second = engine.run(db_path, mode='incremental')
+
+    assert first.status == second.status == 'completed'
+    assert 0 < second.size < first.size
+    assert engine.verify(second.filename) == {'state': 'verified', 'failed': []}
+    restored = tmp_path / 'restored'
+    engine.snapshots.restore(second.filename, str(restored))
+    assert _rows(str(restored / 'supermarket.db')) == 51
+    assert (restored / 'static' / 'site.css').read_text() == 'body {}'
+
+
+def test_failed_job_reports_the_error_and_frees_the_engine(tmp_path):
+    engine = BackupEngine(str(tmp_path / 'backups'))
+    job = engine.run(str(tmp_path / 'missing' / 'live.db'))
+    assert job.status == 'failed' and job.error
+    assert engine.get(job.id) is job and engine._running is None
+    with pytest.raises(ValueError):
+        engine.run(str(tmp_path / 'live.db'), codec='rar')
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zipfile
+
+import pytest
+
+import app as app_module
+from backup_engine import BackupEngine
+from backup_restore import RestoreError, default_routes, restore_backup, verify_backup
+from conftest import stock_of
+
+
+def _database(path, value):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE IF NOT EXISTS t (value TEXT)')
+    conn.execute('DELETE FROM t')
+    conn.execute('INSERT INTO t VALUES (?)', (value,))
+    conn.commit()
+    conn.close()
+
+
+def _value(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT value FROM t').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _archive(path, members, hashes=None):
+    """أرشيف zip بملفات {الاسم: bytes} وbackup_info.json ببصماتها (أو hashes المعطاة)"""
+    if hashes is None:
+        hashes = {name: hashlib.sha256(data).hexdigest() for name, data in members.items()}
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+        archive.writestr('backup_info.json', json.dumps({'type': 'manual', 'hashes': hashes}))
+    return str(path)
+
+
+@pytest.fixture
+def site(tmp_path):
+    """مجلد تطبيق فيه قاعدة بيانات حية وملف ثابت، ونسخة بمحتوى مختلف"""
+    app_path = tmp_path / 'app'
+    (app_path / 'static').mkdir(parents=True)
+    (app_path / 'static' / 'site.css').write_text('live')
+    db_path = str(app_path / 'supermarket.db')
+    _database(db_path, 'live')
+    backup_db = str(tmp_path / 'backup.db')
+    _database(backup_db, 'backup')
+    with open(backup_db, 'rb') as f:
+        members = {'supermarket.db': f.read(), 'static/site.css': b'backup'}
+    return app_path, db_path, members
+
+
+def test_verified_restore_replaces_database_and_files(tmp_path, site):
+    app_path, db_path, members = site
+    path = _archive(tmp_path / 'good.zip', members)
+    assert verify_backup(path)['state'] == 'verified'
+
+    result = restore_backup(path, default_routes(str(app_path), db_path))
+    assert result['verified'] == 2 and result['unverified'] == 0
+    assert _value(db_path) == 'backup'
+    assert (app_path / 'static' / 'site.css').read_text() == 'backup'
+
+
+def test_group_selection_restores_only_that_group(tmp_path, site):
+    app_path, db_path, members = site
+    path = _archive(tmp_path / 'good.zip', members)
+    result = restore_backup(path, default_routes(str(app_path), db_path), {'static'})
+    assert result['groups'] == ['static']
+    assert _value(db_path) == 'live'
+
+
+def test_hash_mismatch_fails_verification_and_changes_nothing(tmp_path, site):
+    app_path, db_path, members = site
+    hashes = {name: hashlib.sha256(data).hexdigest() for name, data in members.items()}
+    hashes['static/site.css'] = hashlib.sha256(b'something else').hexdigest()
+    path = _archive(tmp_path / 'bad.zip', members, hashes)
+
+    report = verify_backup(path)
+    assert report['state'] == 'failed' and report['failed'] == ['static/site.css']
+    with pytest.raises(RestoreError):
+        restore_backup(path, default_routes(str(app_path), db_path))
+    assert _value(db_path) == 'live'
+    assert (app_path / 'static' / 'site.css').read_text() == 'live'
+    assert not [name for name in os.listdir(app_path / 'static') if name.endswith('.restoring')]
+
+
+@pytest.mark.parametrize('name', ['static/../../outside.txt', '/etc/passwd', 'config/app.py', 'config/../app.py'])
+def test_unsafe_or_code_paths_are_rejected(tmp_path, site, name):
+    app_path, db_path, members = site
+    path = _archive(tmp_path / 'evil.zip', dict(members, **{name: b'x'}))
+    with pytest.raises(RestoreError):
+        restore_backup(path, default_routes(str(app_path), db_path))
+    assert _value(db_path) == 'live'
+    assert not (tmp_path / 'outside.txt').exists()
+
+
+def test_allowed_config_file_is_restored(tmp_path, site):
+    app_path, db_path, members = site
+    path = _archive(tmp_path / 'config.zip', {'config/.env': b'SECRET=1'})
+    restore_backup(path, default_routes(str(app_path), db_path))
+    assert (app_path / '.env').read_bytes() == b'SECRET=1'
+
+
+def test_open_connection_blocks_the_database_swap(tmp_path, site):
+    app_path, db_path, members = site
+    path = _archive(tmp_path / 'good.zip', members)
+    with pytest.raises(RestoreError):
+        restore_backup(path, default_routes(str(app_path), db_path), {'database'}, before_swap=lambda: 1)
+    assert _value(db_path) == 'live'
+    assert not os.path.exists(db_path + '.restoring')
+
+
+def test_restoring_the_oldest_snapshot_at_the_retention_cap(app, client, products, tmp_path, monkeypatch):
+    engine = BackupEngine(str(tmp_path / 'backups'), max_backups=2)
+    monkeypatch.setattr(app_module, 'backup_engine', engine)
+    with app.app_context():
+        db_path = app_module.db.engine.url.database
+    snapshot_ids = []
+    for stock in (1, 2):
+        with app.app_context():
+            app_module.db.session.get(app_module.Product, products[0]).stock_quantity = stock
+            app_module.db.session.commit()
+        snapshot_ids.append(engine.run(db_path, 'manual', 'incremental').filename)
+        time.sleep(1.05)   # معرفات اللقطات بدقة الثانية
+
+    # لقطة ما قبل الاستعادة تتجاوز الحد، والنسخة المختارة هي الأقدم
+    response = client.post('/api/backup/restore', json={'filename': snapshot_ids[0]})
+    assert response.status_code == 200 and response.get_json()['success']
+    with app.app_context():
+        assert stock_of(products[0]) == 1
+
+    pre_restore = response.get_json()['pre_restore']
+    assert engine.snapshots.snapshot_ids() == snapshot_ids + [pre_restore]
+    engine.apply_retention()
+    assert engine.snapshots.snapshot_ids() == [snapshot_ids[1], pre_restore]
+
+
+def test_restore_reports_a_missing_snapshot_instead_of_failing(app, client, tmp_path, monkeypatch):
+    engine = BackupEngine(str(tmp_path / 'backups'))
+    monkeypatch.setattr(app_module, 'backup_engine', engine)
+    with app.app_context():
+        db_path = app_module.db.engine.url.database
+    snapshot_id = engine.run(db_path, 'manual', 'incremental').filename
+    os.remove(os.path.join(engine.snapshots.manifest_dir, snapshot_id + '.json'))
+
+    response = client.post('/api/backup/restore', json={'filename': snapshot_id})
+    assert response.status_code == 500 and not response.get_json()['success']
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import time
+
+import pytest
+
+from backup_engine import BackupEngine
+
+
+@pytest.fixture
+def live(tmp_path):
+    db_path = str(tmp_path / 'live.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE t (value BLOB)')
+    conn.commit()
+    conn.close()
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'a.css').write_text('body {}')
+    return db_path, str(static)
+
+
+def _write(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT INTO t VALUES (?)', (os.urandom(4096),))
+    conn.commit()
+    conn.close()
+
+
+def test_engine_keeps_only_the_newest_backups_of_each_kind(tmp_path, live):
+    db_path, static = live
+    engine = BackupEngine(str(tmp_path / 'backups'), [('static', static)], max_backups=2)
+    for _ in range(3):
+        _write(db_path)
+        assert engine.run(db_path, 'manual', 'archive').status == 'completed'
+        assert engine.run(db_path, 'manual', 'incremental').status == 'completed'
+        time.sleep(1.05)   # أسماء الأرشيفات بدقة الثانية
+
+    archives = [entry['name'] for entry in engine.catalog.list('archive')]
+    snapshots = [entry['name'] for entry in engine.catalog.list('snapshot')]
+    assert len(archives) == 2 and len(snapshots) == 2
+    assert sorted(snapshots) == engine.snapshots.snapshot_ids()
+    assert sorted(name for name in os.listdir(engine.backup_dir) if name.endswith('.zip')) == sorted(archives)
+    for snapshot_id in snapshots:
+        assert engine.snapshots.verify(snapshot_id) == []
+
+
+def test_two_owners_of_one_store_share_retention(tmp_path, live):
+    db_path, static = live
+    backup_dir = str(tmp_path / 'backups')
+    engine = BackupEngine(backup_dir, [('static', static)], max_backups=5)
+    other = BackupEngine(backup_dir)   # مثل BackupSystem من سطر الأوامر
+    for _ in range(3):
+        _write(db_path)
+        engine.run(db_path, 'manual', 'incremental')
+    pruned = other.apply_retention(1)
+
+    assert len(pruned['snapshots']) == 2
+    remaining = engine.snapshots.snapshot_ids()
+    assert [entry['name'] for entry in engine.catalog.list()] == remaining
+    assert engine.snapshots.verify(remaining[0]) == []
+    _write(db_path)
+    assert engine.run(db_path, 'manual', 'incremental').status == 'completed'
+    assert all(engine.snapshots.verify(snapshot_id) == [] for snapshot_id in engine.snapshots.snapshot_ids())
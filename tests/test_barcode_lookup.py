@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import app as app_module
+
+
+def test_exact_barcode_returns_the_product(client, products):
+    response = client.get('/api/products/barcode/B0002')
+    product = response.get_json()['product']
+    assert response.status_code == 200
+    assert (product['id'], product['barcode'], product['price'], product['stock']) == (products[2], 'B0002', 12, 5)
+
+
+def test_partial_or_unknown_barcode_is_not_found(client, products):
+    assert client.get('/api/products/barcode/B000').status_code == 404
+    assert client.get('/api/products/barcode/X9999').status_code == 404
+
+
+def test_batch_lookup_splits_found_and_missing(client, products):
+    result = client.post('/api/products/barcodes', json={'barcodes': ['B0000', ' B0004 ', 'X1']}).get_json()
+    assert result['success']
+    assert {code: product['id'] for code, product in result['products'].items()} == \
+        {'B0000': products[0], 'B0004': products[4]}
+    assert result['missing'] == ['X1']
+
+
+def test_new_and_sold_products_are_reflected_immediately(app, client, products):
+    with app.app_context():
+        category_id = app_module.db.session.get(app_module.Product, products[0]).category_id
+    client.post('/add_product', data={'name': 'جديد', 'barcode': 'N0001', 'category_id': category_id,
+                                      'cost_price': '1', 'price': '2', 'stock_quantity': '3'})
+    assert client.get('/api/products/barcode/N0001').get_json()['product']['stock'] == 3
+
+    client.post('/api/pos/complete_sale', json={'items': [{'product_id': products[1], 'quantity': 2}]})
+    assert client.get('/api/products/barcode/B0001').get_json()['product']['stock'] == 3
+
+
+def test_deactivated_products_are_not_returned(app, client, products):
+    with app.app_context():
+        app_module.db.session.get(app_module.Product, products[3]).is_active = False
+        app_module._record_catalog_changes('products', [products[3]])
+        app_module.db.session.commit()
+        app_module.catalog.sync(force=True)
+    assert client.get('/api/products/barcode/B0003').status_code == 404
+    assert client.post('/api/products/barcodes', json={'barcodes': ['B0003']}).get_json()['missing'] == ['B0003']
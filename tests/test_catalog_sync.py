@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import uuid
+
+import app as app_module
+from catalog_cache import CatalogCache
+
+
+def _other_worker():
+    """ذاكرة كتالوج مستقلة كما في عملية خادم أخرى تقرأ القاعدة نفسها"""
+    return CatalogCache(app_module._load_catalog_products, app_module._load_catalog_categories,
+                        app_module._load_catalog_customers, app_module._load_catalog_changes)
+
+
+def test_other_worker_sees_stock_from_online_and_synced_sales(app, client, products):
+    other = _other_worker()
+    with app.app_context():
+        assert other.get_product(products[0]).stock == 5
+
+    client.post('/api/pos/complete_sale', json={'items': [{'product_id': products[0], 'quantity': 2}]})
+    client.post('/api/pos/sync', json={'sales': [
+        {'id': str(uuid.uuid4()), 'items': [{'product_id': products[1], 'quantity': 1}]}
+    ]})
+    with app.app_context():
+        assert other.get_product(products[0]).stock == 3
+        assert other.get_product(products[1]).stock == 4
+        assert app_module.catalog.get_product(products[0]).stock == 3
+
+
+def test_other_worker_indexes_new_and_deactivated_products(app, client, products):
+    other = _other_worker()
+    with app.app_context():
+        assert other.get_by_barcode('B0001') is not None
+        assert other.search('جديد') == []
+
+    client.post('/add_product', data={'name': 'منتج جديد', 'barcode': 'NEW1', 'category_id': '1',
+                                      'cost_price': '1', 'price': '2', 'stock_quantity': '3'})
+    with app.app_context():
+        app_module.db.session.get(app_module.Product, products[1]).is_active = False
+        app_module._record_catalog_changes('products', [products[1]])
+        app_module.db.session.commit()
+
+        assert other.get_by_barcode('NEW1').name == 'منتج جديد'
+        assert [row.name for row in other.search('جديد')] == ['منتج جديد']
+        assert other.get_product(products[1]) is None
+        assert other.get_by_barcode('B0001') is None
+
+
+def test_trimmed_log_reloads_the_whole_catalog(app, products):
+    other = _other_worker()
+    with app.app_context():
+        other.products()
+        app_module.db.session.execute(app_module.Product.__table__.update().values(stock_quantity=1))
+        app_module.db.session.execute(app_module.CatalogChange.__table__.insert().values(id=1000, section='categories'))
+        app_module.db.session.commit()
+        assert {row.stock for row in other.products()} == {1}
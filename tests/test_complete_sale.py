@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import event
+
+import app as app_module
+from conftest import stock_of
+
+
+def _checkout(client, lines, **extra):
+    items = [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in lines]
+    return client.post('/api/pos/complete_sale', json=dict({'items': items}, **extra)).get_json()
+
+
+def _statements(app, client, lines):
+    """عدد جمل SQL المنفذة أثناء عملية بيع واحدة"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = app_module.db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        assert _checkout(client, lines)['success']
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return len(statements)
+
+
+def test_repeated_lines_are_merged_into_one_item(app, client, products):
+    result = _checkout(client, [(products[0], 2), (products[1], 1), (products[0], 1)])
+
+    assert result['success'] and result['total'] == 3 * 10 + 11
+    with app.app_context():
+        items = {item.product_id: item for item in app_module.db.session.query(app_module.SaleItem)}
+        assert set(items) == {products[0], products[1]}
+        assert (items[products[0]].quantity, items[products[0]].total_price, items[products[0]].unit_cost) == (3, 30, 5)
+        assert (stock_of(products[0]), stock_of(products[1])) == (2, 4)
+
+
+def test_short_line_fails_the_whole_cart(app, client, products):
+    result = _checkout(client, [(products[0], 1), (products[1], 6)])
+
+    assert not result['success'] and result['failed_items'] == [products[1]]
+    with app.app_context():
+        assert app_module.db.session.query(app_module.Sale).count() == 0
+        assert (stock_of(products[0]), stock_of(products[1])) == (5, 5)
+
+
+def test_invalid_quantity_or_unknown_product_is_rejected(app, client, products):
+    assert not _checkout(client, [(products[0], 0)])['success']
+    assert not _checkout(client, [(products[0], 1), (999, 1)])['success']
+    with app.app_context():
+        assert app_module.db.session.query(app_module.Sale).count() == 0
+        assert stock_of(products[0]) == 5
+
+
+def test_statement_count_does_not_grow_with_the_cart(app, client, products):
+    _checkout(client, [(products[0], 1)])  # حجز كتلة أرقام الفواتير الأولى
+    single = _statements(app, client, [(products[0], 1)])
+    whole_cart = _statements(app, client, [(product_id, 1) for product_id in products])
+    assert whole_cart == single
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+import app as app_module
+from event_broker import EventBroker
+
+
+def _events(subscription):
+    """الأحداث المنتظرة في طابور المشترك كأزواج (الموضوع، البيانات)"""
+    events = []
+    while subscription.pending:
+        topic, data = subscription.pending.popleft().strip().split('\n')
+        events.append((topic[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def test_publish_reaches_only_matching_topics():
+    broker = EventBroker()
+    everything, stock = broker.subscribe(), broker.subscribe(['stock'])
+    broker.publish('stock', {'1': 3})
+    broker.publish('stats', {'sales': 1})
+
+    assert _events(everything) == [('stock', {'1': 3}), ('stats', {'sales': 1})]
+    assert _events(stock) == [('stock', {'1': 3})]
+    assert broker.has_subscribers('stats') and not EventBroker().has_subscribers()
+
+
+def test_slow_subscriber_keeps_only_the_latest_events():
+    broker = EventBroker(queue_size=3)
+    subscription = broker.subscribe()
+    for number in range(10):
+        broker.publish('stock', number)
+    assert [data for _, data in _events(subscription)] == [7, 8, 9]
+
+
+def test_stream_sends_heartbeats_and_unsubscribes_on_close():
+    broker = EventBroker()
+    subscription = broker.subscribe()
+    stream = broker.stream(subscription, heartbeat=0.01)
+
+    assert next(stream).startswith('retry:')
+    assert next(stream) == ': keep-alive\n\n'
+    broker.publish('stock', {'1': 0})
+    assert next(stream).startswith('event: stock\n')
+    stream.close()
+    assert len(broker) == 0 and subscription.closed
+
+
+def test_checkout_publishes_the_new_stock_of_sold_products(client, products):
+    subscription = app_module.events.subscribe(['stock'])
+    try:
+        client.post('/api/pos/complete_sale', json={'items': [{'product_id': products[0], 'quantity': 2},
+                                                              {'product_id': products[1], 'quantity': 1}]})
+        assert _events(subscription) == [('stock', {str(products[0]): 3, str(products[1]): 4})]
+    finally:
+        app_module.events.unsubscribe(subscription)
+
+
+def test_stats_are_published_once_per_burst_of_sales(app, client, products, monkeypatch):
+    monkeypatch.setitem(app.config, 'DASHBOARD_STATS_PUBLISH_DELAY', 0.2)
+    subscription = app_module.events.subscribe(['stats'])
+    try:
+        for product_id in products[:3]:
+            client.post('/api/pos/complete_sale', json={'items': [{'product_id': product_id, 'quantity': 1}]})
+        assert subscription.ready.wait(5)
+        time.sleep(0.3)
+        events = _events(subscription)
+        assert len(events) == 1 and events[0][0] == 'stats'
+    finally:
+        app_module.events.unsubscribe(subscription)
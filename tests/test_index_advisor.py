@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import app as app_module
+from index_advisor import capture_queries, explain, full_scans
+
+
+def test_full_scans_reports_only_unindexed_reads_of_known_tables():
+    plan = ['SCAN product', 'SEARCH sale USING INDEX ix_sale_created_at (created_at>?)',
+            'SCAN category', 'SCAN CONSTANT ROW', 'USE TEMP B-TREE FOR ORDER BY']
+    assert full_scans(plan, {'product', 'sale'}) == ['product']
+
+
+def test_capture_keeps_each_select_once_with_its_parameters(app, products):
+    with app.app_context():
+        engine = app_module.db.engine
+        with capture_queries(engine) as statements:
+            for product_id in products[:2]:
+                app_module.db.session.execute(
+                    app_module.db.select(app_module.Product.name).where(app_module.Product.id == product_id)).all()
+            app_module.db.session.execute(app_module.db.text('UPDATE product SET min_stock = 2'))
+            app_module.db.session.rollback()
+        assert len(statements) == 1
+        statement, parameters = next(iter(statements.items()))
+        assert statement.lstrip().startswith('SELECT') and tuple(parameters) == (products[0],)
+
+        with engine.connect() as connection:
+            assert explain(connection, 'SELECT * FROM product', ()) == ['SCAN product']
+            assert full_scans(explain(connection, statement, parameters), {'product'}) == []
+
+
+def test_pages_read_no_large_table_in_full(app, admin_id, products):
+    with app.app_context():
+        findings = app_module.advise_indexes()
+    urls = {url for url, _, _, _ in findings}
+    assert {'/products', '/reports', '/products?stock=low_stock'} <= urls
+    assert [(url, scans) for url, _, _, scans in findings if scans] == []
+
+
+def test_cli_exits_cleanly_when_nothing_is_flagged(app, admin_id, products):
+    result = app.test_cli_runner().invoke(args=['index-advisor'])
+    assert result.exit_code == 0, result.output
+    assert 'عدد الاستعلامات التي تقرأ جداول كاملة: 0' in result.output
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import app as app_module
+from invoice_numbers import InvoiceNumberAllocator
+
+
+def test_numbers_are_unique_across_blocks_and_processes(app):
+    with app.app_context():
+        # عمليتا خادم بكتل صغيرة تتناوبان على العداد نفسه في قاعدة البيانات
+        first = InvoiceNumberAllocator(app_module._reserve_invoice_block, block_size=3)
+        second = InvoiceNumberAllocator(app_module._reserve_invoice_block, block_size=3)
+        numbers = []
+        for _ in range(5):
+            numbers += first.take(2) + second.take(1) + second.take(4)
+    assert len(numbers) == 35
+    assert len(set(numbers)) == len(numbers)
+
+
+def test_take_larger_than_block_reserves_enough(app):
+    with app.app_context():
+        allocator = InvoiceNumberAllocator(app_module._reserve_invoice_block, block_size=2, prefix='T', width=4)
+        numbers = allocator.take(5)
+        after = allocator.next()
+    assert numbers == ['T-0001', 'T-0002', 'T-0003', 'T-0004', 'T-0005']
+    assert after == 'T-0006'
+
+
+def test_concurrent_takes_never_repeat_a_number():
+    counter = {'next': 1}
+    lock = threading.Lock()
+
+    def reserve(size):
+        with lock:
+            start = counter['next']
+            counter['next'] += size
+            return start
+
+    allocators = [InvoiceNumberAllocator(reserve, block_size=7) for _ in range(3)]
+    taken = []
+
+    def worker(allocator):
+        for _ in range(200):
+            taken.append(allocator.next())
+
+    threads = [threading.Thread(target=worker, args=(allocator,)) for allocator in allocators for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(taken) == 2400
+    assert len(set(taken)) == 2400
+
+
+def test_counter_starts_after_existing_sales(app, client, products):
+    with app.app_context():
+        app_module.db.session.add(app_module.Sale(id=41, invoice_number='OLD-41', total_amount=1,
+                                                  payment_method='cash', cashier_id=1))
+        app_module.db.session.commit()
+    response = client.post('/api/pos/complete_sale', json={'items': [{'product_id': products[0], 'quantity': 1}]})
+    assert response.get_json()['invoice_number'] == app_module.invoice_numbers.format(42)
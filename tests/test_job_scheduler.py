@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+
+import pytest
+
+import job_scheduler
+from job_scheduler import JobScheduler
+
+pytestmark = pytest.mark.skipif(job_scheduler.fcntl is None, reason='القفل المعلق يحتاج flock')
+
+
+def _scheduler(tmp_path, func, interval=3600):
+    scheduler = JobScheduler(str(tmp_path / 'state.json'), str(tmp_path / 'scheduler.lock'))
+    scheduler.add('job', interval, func)
+    return scheduler
+
+
+def _write_state(tmp_path, last_run_ts):
+    (tmp_path / 'state.json').write_text(json.dumps({'job': {'last_run_ts': last_run_ts, 'runs': 1}}))
+
+
+def test_only_one_scheduler_leads_and_the_other_takes_over_after_stop(tmp_path):
+    runs = []
+    first_ran, second_ran = threading.Event(), threading.Event()
+    first = _scheduler(tmp_path, lambda: (runs.append('first'), first_ran.set()))
+    second = _scheduler(tmp_path, lambda: (runs.append('second'), second_ran.set()))
+
+    first.start()
+    assert first_ran.wait(5)
+    second.start()
+    time.sleep(0.2)
+    assert first.is_leader and not second.is_leader
+    assert runs == ['first']
+
+    # القائد سجل آخر تشغيل، فالعملية التالية لا تعيد المهمة قبل موعدها
+    first.stop()
+    first._thread.join(5)
+    time.sleep(0.2)
+    assert second.is_leader and not second_ran.is_set()
+    assert second.status()['jobs'][0]['runs'] == 1
+    second.stop()
+    second._thread.join(5)
+
+
+def test_missed_run_is_caught_up_once_after_restart(tmp_path):
+    ran = threading.Event()
+    _write_state(tmp_path, time.time() - 3 * 3600)
+    scheduler = _scheduler(tmp_path, ran.set)
+    scheduler.start()
+    try:
+        assert ran.wait(5)
+        time.sleep(0.1)
+        status = scheduler.status()['jobs'][0]
+        assert status['runs'] == 2 and status['last_status'] == 'ok'
+        next_run = scheduler._jobs['job'].next_run
+        assert 3590 < next_run - time.time() <= 3600
+    finally:
+        scheduler.stop()
+        scheduler._thread.join(5)
+
+
+def test_job_that_ran_recently_waits_for_its_interval_after_restart(tmp_path):
+    last_run = time.time() - 600
+    _write_state(tmp_path, last_run)
+    scheduler = _scheduler(tmp_path, lambda: pytest.fail('لم يحن موعد المهمة'))
+    scheduler.start()
+    try:
+        time.sleep(0.2)
+        assert scheduler.is_leader
+        assert scheduler._jobs['job'].next_run == pytest.approx(last_run + 3600)
+        assert json.loads((tmp_path / 'state.json').read_text())['job']['runs'] == 1
+    finally:
+        scheduler.stop()
+        scheduler._thread.join(5)
+
+
+def test_local_jobs_run_in_every_process_without_leadership(tmp_path):
+    warmed = []
+    schedulers = [JobScheduler(str(tmp_path / 'state.json'), str(tmp_path / 'scheduler.lock')) for _ in range(2)]
+    for scheduler in schedulers:
+        scheduler.add('warm', None, lambda: warmed.append(1), leader_only=False)
+        scheduler.start()
+        scheduler._thread.join(5)
+    assert warmed == [1, 1]
+    assert not any(scheduler.is_leader for scheduler in schedulers)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import html
+import re
+from datetime import datetime, timedelta
+
+import app as app_module
+from keyset_pagination import KeysetPaginator
+
+Customer = app_module.Customer
+
+
+def _add_customers(count):
+    base = datetime(2024, 1, 1)
+    # كل ثلاثة عملاء بنفس وقت الإنشاء: الترتيب يعتمد على id عند التساوي
+    app_module.db.session.add_all(
+        Customer(name=f'عميل {i}', phone=f'0100000{i:04d}', created_at=base + timedelta(minutes=i // 3),
+                 is_active=True)
+        for i in range(count)
+    )
+    app_module.db.session.commit()
+
+
+def _expected_order():
+    return [row.id for row in Customer.query.order_by(Customer.created_at.desc(), Customer.id.desc())]
+
+
+def test_next_tokens_walk_every_row_once_in_order(app):
+    paginator = KeysetPaginator('secret')
+    with app.app_context():
+        _add_customers(47)
+        seen, token, pages = [], None, 0
+        while True:
+            page = paginator.paginate(Customer.query, Customer, token, per_page=10)
+            seen += [row.id for row in page]
+            pages += 1
+            if not page.has_next:
+                break
+            token = page.next_token
+        assert seen == _expected_order()
+        assert pages == 5
+        assert not page.has_next and page.has_prev
+
+
+def test_prev_tokens_return_the_same_pages(app):
+    paginator = KeysetPaginator('secret')
+    with app.app_context():
+        _add_customers(30)
+        forward, page = [], paginator.paginate(Customer.query, Customer, None, per_page=7)
+        forward.append([row.id for row in page])
+        while page.has_next:
+            page = paginator.paginate(Customer.query, Customer, page.next_token, per_page=7)
+            forward.append([row.id for row in page])
+
+        backward = [[row.id for row in page]]
+        while page.has_prev:
+            page = paginator.paginate(Customer.query, Customer, page.prev_token, per_page=7)
+            backward.append([row.id for row in page])
+        assert backward[::-1] == forward
+        assert not page.has_prev
+
+
+def test_tampered_or_foreign_token_starts_from_first_page(app):
+    paginator = KeysetPaginator('secret')
+    with app.app_context():
+        _add_customers(12)
+        first = [row.id for row in paginator.paginate(Customer.query, Customer, None, per_page=5)]
+        token = paginator.paginate(Customer.query, Customer, None, per_page=5).next_token
+        for bad in (token[:-2] + 'xx', KeysetPaginator('other').paginate(Customer.query, Customer, None,
+                                                                         per_page=5).next_token, 'garbage'):
+            assert [row.id for row in paginator.paginate(Customer.query, Customer, bad, per_page=5)] == first
+
+
+def test_listing_route_pages_with_cursor(app, client):
+    with app.app_context():
+        _add_customers(app.config['LISTING_PER_PAGE'] + 3)
+        newest = Customer.query.order_by(Customer.created_at.desc(), Customer.id.desc()).first().name
+        oldest = Customer.query.order_by(Customer.created_at, Customer.id).first().name
+    first = client.get('/customers').get_data(as_text=True)
+    assert newest in first and oldest not in first
+
+    next_url = html.unescape(re.search(r'href="([^"]*cursor=[^"]*)">التالي', first).group(1))
+    second = client.get(next_url).get_data(as_text=True)
+    assert oldest in second and newest not in second
+
+
+def test_rows_without_created_at_do_not_trap_the_next_link(app):
+    paginator = KeysetPaginator('secret')
+    with app.app_context():
+        _add_customers(8)
+        app_module.db.session.execute(Customer.__table__.update()
+                                      .where(Customer.id.in_([2, 5])).values(created_at=None))
+        app_module.db.session.commit()
+        page = paginator.paginate(Customer.query, Customer, None, per_page=3)
+        seen = [row.id for row in page]
+        while page.has_next:
+            page = paginator.paginate(Customer.query, Customer, page.next_token, per_page=3)
+            seen += [row.id for row in page]
+        assert len(seen) == len(set(seen)) == 6
+
+    app_module.init_db()
+    with app.app_context():
+        assert Customer.query.filter(Customer.created_at.is_(None)).count() == 0
+        assert _expected_order()[-2:] == [5, 2]
+
+
+def _add_products(names):
+    app_module.db.session.add_all(
+        app_module.Product(name=name, barcode=f'S{i:04d}', price=1, stock_quantity=1, is_active=True,
+                           created_at=datetime(2024, 1, 1) + timedelta(minutes=i))
+        for i, name in enumerate(names)
+    )
+    app_module.db.session.commit()
+
+
+def _listed(page):
+    return re.findall(r'<h6 class="product-name">([^<]*)</h6>', page)
+
+
+def test_search_listing_keeps_relevance_order_across_pages(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'LISTING_PER_PAGE', 2)
+    with app.app_context():
+        _add_products(['شوكولاتة بالحليب', 'حليب كامل الدسم', 'زبادي', 'حليب', 'حليب خالي الدسم'])
+        ranked = [app_module.db.session.get(app_module.Product, product_id).name
+                  for product_id in app_module.catalog.search_ids('حليب')]
+    assert len(ranked) == 4
+    first = client.get('/products?search=حليب').get_data(as_text=True)
+    next_url = html.unescape(re.search(r'href="([^"]*cursor=[^"]*)">التالي', first).group(1))
+    second = client.get(next_url).get_data(as_text=True)
+    assert _listed(first) + _listed(second) == ranked
+    assert 'تعرض أول' not in first
+
+
+def test_search_cap_is_stated_on_the_page(app, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'PRODUCT_SEARCH_MAX_RESULTS', 3)
+    with app.app_context():
+        _add_products([f'حليب {i}' for i in range(5)])
+    page = client.get('/products?search=حليب').get_data(as_text=True)
+    assert 'تعرض أول 3 نتيجة' in page
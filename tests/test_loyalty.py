@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import app as app_module
+
+
+def _customer(app, name='عميل', phone='01000000001'):
+    with app.app_context():
+        customer = app_module.Customer(name=name, phone=phone, is_active=True, loyalty_points=0, total_purchases=0)
+        app_module.db.session.add(customer)
+        app_module.db.session.commit()
+        return customer.id
+
+
+def _buy(client, product_id, quantity, customer_id):
+    response = client.post('/api/pos/complete_sale', json={
+        'items': [{'product_id': product_id, 'quantity': quantity}], 'customer_id': customer_id
+    }).get_json()
+    assert response['success']
+    return response['total']
+
+
+def _stored(customer_id):
+    customer = app_module.db.session.get(app_module.Customer, customer_id)
+    return customer.loyalty_points, customer.total_purchases
+
+
+def test_checkout_appends_to_ledger_without_touching_the_customer_row(app, client, products):
+    customer_id = _customer(app)
+    total = _buy(client, products[0], 3, customer_id)
+
+    with app.app_context():
+        assert _stored(customer_id) == (0, 0)
+        assert app_module.db.session.query(app_module.LoyaltyLedger).filter_by(customer_id=customer_id).count() == 1
+    balance = client.get(f'/api/customers/{customer_id}/loyalty').get_json()
+    assert balance['total_purchases'] == total
+    assert balance['loyalty_points'] == balance['pending_points'] > 0
+
+
+def test_fold_moves_pending_lines_into_balances_once(app, client, products):
+    first, second = _customer(app), _customer(app, 'آخر', '01000000002')
+    _buy(client, products[0], 2, first)
+    _buy(client, products[1], 1, first)
+    _buy(client, products[2], 4, second)
+    before = {customer_id: client.get(f'/api/customers/{customer_id}/loyalty').get_json()
+              for customer_id in (first, second)}
+
+    with app.app_context():
+        assert app_module.fold_loyalty_ledger() == 3
+        assert app_module.fold_loyalty_ledger() == 0
+        for customer_id in (first, second):
+            assert _stored(customer_id) == (before[customer_id]['loyalty_points'],
+                                            before[customer_id]['total_purchases'])
+
+    for customer_id in (first, second):
+        after = client.get(f'/api/customers/{customer_id}/loyalty').get_json()
+        assert after['pending_points'] == 0
+        assert after['loyalty_points'] == before[customer_id]['loyalty_points']
+
+
+def test_lines_after_the_watermark_stay_pending(app, client, products):
+    customer_id = _customer(app)
+    _buy(client, products[0], 2, customer_id)
+    with app.app_context():
+        app_module.fold_loyalty_ledger()
+        folded = _stored(customer_id)
+
+    total = _buy(client, products[1], 1, customer_id)
+    balance = client.get(f'/api/customers/{customer_id}/loyalty').get_json()
+    assert balance['total_purchases'] == round(folded[1] + total, 2)
+    assert balance['loyalty_points'] == folded[0] + balance['pending_points']
+
+    with app.app_context():
+        assert app_module.fold_loyalty_ledger() == 1
+        assert _stored(customer_id)[0] == balance['loyalty_points']
+
+
+def test_checkout_rejects_unknown_or_inactive_customers(app, client, products):
+    inactive_id = _customer(app)
+    with app.app_context():
+        app_module.db.session.get(app_module.Customer, inactive_id).is_active = False
+        app_module.db.session.commit()
+
+    for customer_id in (999, inactive_id, 'abc'):
+        response = client.post('/api/pos/complete_sale', json={
+            'items': [{'product_id': products[0], 'quantity': 1}], 'customer_id': customer_id
+        })
+        assert response.status_code == 400 and not response.get_json()['success']
+    with app.app_context():
+        assert app_module.db.session.query(app_module.LoyaltyLedger).count() == 0
+        assert app_module.db.session.query(app_module.Sale).count() == 0
+        assert app_module.db.session.get(app_module.Product, products[0]).stock_quantity == 5
+
+
+def test_checkout_accepts_the_customer_id_as_a_string(app, client, products):
+    customer_id = _customer(app)
+    _buy(client, products[0], 1, str(customer_id))
+    with app.app_context():
+        assert app_module.db.session.query(app_module.Sale).one().customer_id == customer_id
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import app as app_module
+from search_index import PhonePrefixIndex, normalize_phone
+
+
+def test_normalize_phone_handles_country_code_and_arabic_digits():
+    assert normalize_phone('+20 101 234 5678') == '01012345678'
+    assert normalize_phone('0020-1012345678') == '01012345678'
+    assert normalize_phone('٠١٠١٢٣٤٥٦٧٨') == '01012345678'
+    assert normalize_phone('') == ''
+    assert normalize_phone(None) == ''
+
+
+def test_prefix_search_is_ordered_and_limited():
+    index = PhonePrefixIndex()
+    index.build([(1, '01012345678'), (2, '01112345678'), (3, '+201012340000'), (4, None), (5, '01019999999')])
+    assert index.search('0101') == [3, 1, 5]
+    assert index.search('٠١٠١', limit=2) == [3, 1]
+    assert index.search('011') == [2]
+    assert index.search('012') == []
+    assert index.search('abc') == []
+    assert len(index) == 5
+
+
+def test_add_moves_and_remove_drops_a_customer():
+    index = PhonePrefixIndex()
+    index.build([(1, '01012345678'), (2, '01112345678')])
+    index.add(1, '01212345678')
+    assert index.search('010') == []
+    assert index.search('012') == [1]
+    index.remove(2)
+    assert index.search('011') == []
+
+
+def test_lookup_route_sees_customers_added_by_this_and_other_workers(app, client):
+    assert client.get('/api/customers/lookup?phone=0101').get_json() == []
+
+    client.post('/add_customer', data={'name': 'سارة', 'phone': '01012345678'})
+    assert [row['name'] for row in client.get('/api/customers/lookup?phone=0101').get_json()] == ['سارة']
+
+    # عميل أضافته عملية أخرى: يظهر من سجل تغييرات الكتالوج دون إلغاء الذاكرة يدوياً
+    with app.app_context():
+        customer = app_module.Customer(name='علي', phone='+20 101 2349999', is_active=True)
+        app_module.db.session.add(customer)
+        app_module.db.session.flush()
+        app_module._record_catalog_changes('customers', [customer.id])
+        app_module.db.session.commit()
+    found = client.get('/api/customers/lookup?phone=01012&limit=5').get_json()
+    assert [row['name'] for row in found] == ['سارة', 'علي']
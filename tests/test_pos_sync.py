@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import uuid
+
+import app as app_module
+from conftest import create_user, stock_of
+
+
+def _sale(product_id, quantity=1, **extra):
+    return dict({'id': str(uuid.uuid4()), 'items': [{'product_id': product_id, 'quantity': quantity}]}, **extra)
+
+
+def _sales_count():
+    return app_module.db.session.query(app_module.Sale).count()
+
+
+def test_resending_a_batch_does_not_duplicate_sales(app, client, products):
+    sales = [_sale(products[0], 2), _sale(products[1])]
+    first = client.post('/api/pos/sync', json={'sales': sales}).get_json()
+    assert first['success'] and first['synced'] == [sale['id'] for sale in sales]
+
+    again = client.post('/api/pos/sync', json={'sales': sales}).get_json()
+    assert again['synced'] == []
+    assert again['duplicates'] == [sale['id'] for sale in sales]
+    assert again['invoices'] == first['invoices']
+    with app.app_context():
+        assert _sales_count() == 2
+        assert (stock_of(products[0]), stock_of(products[1])) == (3, 4)
+
+
+def test_repeated_id_inside_one_batch_is_recorded_once(app, client, products):
+    sale = _sale(products[0])
+    result = client.post('/api/pos/sync', json={'sales': [sale, dict(sale)]}).get_json()
+    assert result['synced'] == [sale['id']]
+    assert result['duplicates'] == [sale['id']]
+    with app.app_context():
+        assert _sales_count() == 1
+
+
+def test_online_sale_with_client_id_is_a_duplicate_on_sync(app, client, products):
+    sale = _sale(products[0])
+    online = client.post('/api/pos/complete_sale', json=sale).get_json()
+    assert online['success']
+
+    retried = client.post('/api/pos/complete_sale', json=sale).get_json()
+    assert retried['duplicate'] and retried['invoice_number'] == online['invoice_number']
+
+    synced = client.post('/api/pos/sync', json={'sales': [sale]}).get_json()
+    assert synced['duplicates'] == [sale['id']]
+    assert synced['invoices'] == {sale['id']: online['invoice_number']}
+    with app.app_context():
+        assert _sales_count() == 1
+        assert stock_of(products[0]) == 4
+
+
+def test_invalid_sales_are_rejected_without_taking_invoice_numbers(app, client, products):
+    with app.app_context():
+        inactive = app_module.Customer(name='موقوف', phone='0100', is_active=False)
+        app_module.db.session.add(inactive)
+        app_module.db.session.get(app_module.Product, products[4]).is_active = False
+        app_module.db.session.commit()
+        inactive_id = inactive.id
+    valid = _sale(products[0])
+    invalid = {
+        'unknown customer': _sale(products[0], customer_id=999),
+        'inactive customer': _sale(products[0], customer_id=inactive_id),
+        'inactive product': _sale(products[4]),
+        'unknown product': _sale(999),
+        'payment method': _sale(products[0], payment_method='cheque'),
+    }
+    result = client.post('/api/pos/sync', json={'sales': list(invalid.values()) + [valid]}).get_json()
+
+    assert result['synced'] == [valid['id']]
+    assert {entry['id'] for entry in result['rejected']} == {sale['id'] for sale in invalid.values()}
+    with app.app_context():
+        assert stock_of(products[4]) == 5
+    next_number = client.post('/api/pos/complete_sale', json=_sale(products[1])).get_json()['invoice_number']
+    assert next_number == app_module.invoice_numbers.format(
+        int(result['invoices'][valid['id']].rsplit('-', 1)[1]) + 1)
+
+
+def test_synced_sales_belong_to_the_user_who_syncs(app, client, products, admin_id):
+    with app.app_context():
+        other_id = create_user('cashier2', role='cashier')
+    sale = _sale(products[0], cashier_id=other_id)
+    assert client.post('/api/pos/sync', json={'sales': [sale]}).get_json()['synced'] == [sale['id']]
+    with app.app_context():
+        assert app_module.db.session.query(app_module.Sale).one().cashier_id == admin_id
+
+
+def test_sync_reports_the_shortfall_of_each_oversold_sale(app, client, products):
+    first, second, third = _sale(products[0], 4), _sale(products[0], 3), _sale(products[1], 2)
+    result = client.post('/api/pos/sync', json={'sales': [first, second, third]}).get_json()
+    assert len(result['synced']) == 3
+    assert result['conflicts'] == [{'id': second['id'], 'product_id': products[0], 'quantity': 3, 'shortfall': 2}]
+    with app.app_context():
+        assert (stock_of(products[0]), stock_of(products[1])) == (0, 3)
+
+
+def test_complete_sale_rejects_unknown_payment_methods_and_inactive_products(app, client, products):
+    response = client.post('/api/pos/complete_sale', json=_sale(products[0], payment_method='cheque')).get_json()
+    assert not response['success']
+    with app.app_context():
+        app_module.db.session.get(app_module.Product, products[1]).is_active = False
+        app_module.db.session.commit()
+    assert not client.post('/api/pos/complete_sale', json=_sale(products[1])).get_json()['success']
+    with app.app_context():
+        assert _sales_count() == 0
+        assert (stock_of(products[0]), stock_of(products[1])) == (5, 5)
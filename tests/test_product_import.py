@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+
+import openpyxl
+
+import app as app_module
+
+
+def _csv(rows, header=('الباركود', 'اسم المنتج', 'سعر البيع', 'الكمية', 'الفئة')):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _upload(client, data, filename='products.csv'):
+    return client.post('/api/products/import', data={'file': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+
+def _product(barcode):
+    return app_module.db.session.query(app_module.Product).filter_by(barcode=barcode).one()
+
+
+def test_import_creates_updates_and_reports_bad_rows(app, client, products):
+    data = _csv([
+        ('N1', 'منتج جديد', '12.5', '٧', 'مشروبات'),
+        ('B0000', 'منتج محدث', '99', '3', 'عام'),
+        ('N2', '', '5', '1', ''),
+        ('N3', 'سعر سالب', '-1', '1', ''),
+    ])
+    result = _upload(client, data).get_json()
+
+    assert result['success']
+    assert (result['created'], result['updated'], result['failed']) == (1, 1, 2)
+    assert [error['row'] for error in result['errors']] == [4, 5]
+    with app.app_context():
+        created = _product('N1')
+        assert (created.price, created.stock_quantity, created.category.name) == (12.5, 7, 'مشروبات')
+        assert (_product('B0000').name, _product('B0000').price) == ('منتج محدث', 99)
+
+
+def test_blank_category_keeps_the_existing_category(app, client, products):
+    with app.app_context():
+        category_id = _product('B0001').category_id
+    result = _upload(client, _csv([('B0001', 'منتج 1', '20', '5', '')])).get_json()
+    assert result['updated'] == 1
+    with app.app_context():
+        assert _product('B0001').category_id == category_id
+
+
+def test_decode_error_mid_file_reports_the_committed_batches(app, client, products, monkeypatch):
+    monkeypatch.setitem(app.config, 'PRODUCT_IMPORT_BATCH_SIZE', 10)
+    good = _csv([(f'N{i:05d}', f'منتج {i}', '1', '1', '') for i in range(2000)])
+    response = _upload(client, good + b'N99999,\xff\xfe,1,1,\n')
+    result = response.get_json()
+
+    assert response.status_code == 400 and not result['success']
+    assert result['aborted'] == 'file'
+    assert result['created'] > 0 and result['created'] % 10 == 0
+    assert str(result['created']) in result['message']
+    with app.app_context():
+        assert app_module.db.session.query(app_module.Product).filter(
+            app_module.Product.barcode.like('N%')).count() == result['created']
+
+
+def test_unsupported_file_is_rejected_before_any_write(app, client, products):
+    response = _upload(client, b'x', 'products.txt')
+    assert response.status_code == 400
+    response = _upload(client, _csv([('N1', 'منتج', '1')], header=('الباركود', 'اسم المنتج')))
+    assert response.status_code == 400
+    with app.app_context():
+        assert app_module.db.session.query(app_module.Product).count() == len(products)
+
+
+def test_csv_export_round_trips_through_import(app, client, products):
+    exported = client.get('/api/products/export').data
+    assert exported.startswith('﻿'.encode('utf-8'))
+    rows = list(csv.reader(io.StringIO(exported.decode('utf-8-sig'))))
+    assert len(rows) == len(products) + 1
+    assert rows[1][:3] == ['B0000', 'منتج 0', '10.0']
+
+    result = _upload(client, exported).get_json()
+    assert (result['created'], result['updated'], result['failed']) == (0, len(products), 0)
+
+
+def test_xlsx_export_round_trips_through_import(app, client, products):
+    exported = client.get('/api/products/export?format=xlsx').data
+    workbook = openpyxl.load_workbook(io.BytesIO(exported), read_only=True)
+    assert sum(1 for _ in workbook.active.iter_rows()) == len(products) + 1
+    workbook.close()
+
+    result = _upload(client, exported, 'products.xlsx').get_json()
+    assert (result['created'], result['updated'], result['failed']) == (0, len(products), 0)
+
+
+def test_database_error_mid_import_reports_the_committed_batches(app, client, products, monkeypatch):
+    monkeypatch.setitem(app.config, 'PRODUCT_IMPORT_BATCH_SIZE', 2)
+    record_changes = app_module._record_catalog_changes
+    calls = []
+
+    def failing_third_batch(section, ids=None):
+        calls.append(section)
+        if len(calls) == 3:
+            raise app_module.OperationalError('UPDATE', {}, Exception('disk I/O error'))
+        record_changes(section, ids)
+
+    monkeypatch.setattr(app_module, '_record_catalog_changes', failing_third_batch)
+    response = _upload(client, _csv([(f'N{i}', f'منتج {i}', '1', '1', '') for i in range(6)]))
+    result = response.get_json()
+
+    assert response.status_code == 500 and result['aborted'] == 'database'
+    assert result['created'] == 4
+    with app.app_context():
+        assert app_module.db.session.query(app_module.Product).count() == len(products) + 4
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+import app as app_module
+
+
+def _checkout(client, lines, payment_method='cash'):
+    response = client.post('/api/pos/complete_sale', json={
+        'items': [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in lines],
+        'payment_method': payment_method
+    }).get_json()
+    assert response['success']
+    return response['total']
+
+
+def _report(client, **params):
+    return client.get('/api/reports/sales', query_string=params).get_json()
+
+
+def test_summary_totals_come_from_recorded_sales(client, products):
+    cash = _checkout(client, [(products[0], 2), (products[1], 1)])
+    card = _checkout(client, [(products[2], 3)], 'card')
+    mixed = _checkout(client, [(products[0], 1)], 'mixed')
+
+    summary = _report(client)['summary']
+    revenue = cash + card + mixed
+    cost = 5 * (2 + 1 + 3 + 1)
+    assert (summary['revenue'], summary['tickets']) == (revenue, 3)
+    assert (summary['cash_revenue'], summary['card_revenue'], summary['other_revenue']) == (cash, card, mixed)
+    assert summary['average_ticket'] == revenue / 3
+    assert (summary['cost'], summary['margin']) == (cost, revenue - cost)
+    assert round(summary['margin_percent'], 6) == round((revenue - cost) / revenue * 100, 6)
+
+
+def test_top_products_rank_by_quantity_and_by_revenue(client, products):
+    _checkout(client, [(products[0], 4), (products[4], 2)])
+    _checkout(client, [(products[4], 1)])
+
+    report = _report(client, limit=2)
+    assert [(row['id'], row['sold_quantity']) for row in report['top_by_quantity']] == \
+        [(products[0], 4), (products[4], 3)]
+    assert [(row['id'], row['revenue']) for row in report['top_by_revenue']] == \
+        [(products[4], 42), (products[0], 40)]
+    assert report['top_by_revenue'][0]['margin'] == 42 - 3 * 5
+
+
+def test_categories_and_daily_series(app, client, products):
+    with app.app_context():
+        drinks = app_module.Category(name='مشروبات', is_active=True)
+        app_module.db.session.add(drinks)
+        app_module.db.session.flush()
+        app_module.db.session.get(app_module.Product, products[1]).category_id = drinks.id
+        app_module.db.session.commit()
+    _checkout(client, [(products[0], 1), (products[1], 2)])
+
+    report = _report(client)
+    assert report['categories'] == [{'category': 'مشروبات', 'quantity': 2, 'revenue': 22},
+                                    {'category': 'عام', 'quantity': 1, 'revenue': 10}]
+    assert report['daily'] == [{'date': datetime.utcnow().date().isoformat(), 'revenue': 32, 'tickets': 1}]
+
+
+def test_period_outside_the_sales_is_empty(client, products):
+    _checkout(client, [(products[0], 1)])
+    last_month = (datetime.utcnow() - timedelta(days=40)).date()
+    report = _report(client, start_date=(last_month - timedelta(days=5)).isoformat(), end_date=last_month.isoformat())
+    assert (report['summary']['revenue'], report['summary']['tickets']) == (0, 0)
+    assert report['top_by_quantity'] == report['daily'] == report['categories'] == []
+
+
+def test_reports_page_renders_the_computed_figures(client, products):
+    _checkout(client, [(products[3], 5)])
+    page = client.get('/reports')
+    assert page.status_code == 200
+    assert 'منتج 3' in page.get_data(as_text=True)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import app as app_module
+from conftest import login_as, stock_of
+
+
+def test_reserve_stock_is_all_or_nothing(app, products):
+    first, second = products[:2]
+    with app.app_context():
+        assert app_module.reserve_stock({first: 2, second: 6}) == [second]
+        assert (stock_of(first), stock_of(second)) == (5, 5)
+
+        assert app_module.reserve_stock({first: 2, second: 5}) == []
+        app_module.db.session.commit()
+        assert (stock_of(first), stock_of(second)) == (3, 0)
+
+
+def test_concurrent_checkouts_never_oversell(app, admin_id, products):
+    product_id = products[0]
+    attempts = 20
+    barrier = threading.Barrier(attempts)
+    results = []
+
+    def checkout():
+        cashier = login_as(app.test_client(), admin_id)
+        barrier.wait()
+        response = cashier.post('/api/pos/complete_sale',
+                                json={'items': [{'product_id': product_id, 'quantity': 1}]})
+        results.append(response.get_json()['success'])
+
+    threads = [threading.Thread(target=checkout) for _ in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    with app.app_context():
+        assert stock_of(product_id) == 0
+        assert app_module.db.session.query(app_module.SaleItem).filter_by(product_id=product_id).count() == 5
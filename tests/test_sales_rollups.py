@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, time, timedelta
+
+import app as app_module
+
+
+def _sale_at(created_at, lines, cashier_id, payment_method='cash'):
+    """تسجيل عملية بيع بوقت محدد (UTC) عبر مسار البيع نفسه"""
+    quantities = dict(lines)
+    products_by_id = {product.id: product for product in app_module.db.session.query(app_module.Product)
+                      .filter(app_module.Product.id.in_(list(quantities)))}
+    invoice_number = app_module.invoice_numbers.next()  # قبل أي كتابة كما في complete_sale
+    assert app_module.reserve_stock(quantities) == []
+    app_module._record_sale(quantities, products_by_id, payment_method, None, cashier_id, created_at, invoice_number)
+    app_module.db.session.commit()
+
+
+def _raw_by_day():
+    """{اليوم: (عدد الفواتير، الإيرادات)} محسوبة مباشرة من جدول المبيعات"""
+    totals = {}
+    for sale in app_module.db.session.query(app_module.Sale):
+        tickets, revenue = totals.get(sale.created_at.date(), (0, 0))
+        totals[sale.created_at.date()] = (tickets + 1, revenue + sale.total_amount)
+    return totals
+
+
+def _rollup_by_day():
+    return {day: (tickets, revenue) for day, tickets, revenue in app_module.db.session.query(
+        app_module.DailySalesSummary.day,
+        app_module.db.func.sum(app_module.DailySalesSummary.tickets),
+        app_module.db.func.sum(app_module.DailySalesSummary.revenue)
+    ).group_by(app_module.DailySalesSummary.day)}
+
+
+def _product_rollups():
+    return sorted((row.day, row.product_id, row.category_id, row.quantity, row.revenue, row.cost)
+                  for row in app_module.db.session.query(app_module.DailyProductSales))
+
+
+def test_rollups_match_raw_sales_across_the_utc_midnight(app, admin_id, products):
+    today = datetime.utcnow().date()
+    midnight = datetime.combine(today, time())
+    with app.app_context():
+        _sale_at(midnight - timedelta(seconds=1), [(products[0], 2)], admin_id)
+        _sale_at(midnight, [(products[0], 1), (products[1], 1)], admin_id, 'card')
+        _sale_at(midnight + timedelta(hours=1), [(products[2], 3)], admin_id)
+
+        assert _rollup_by_day() == _raw_by_day() == {today - timedelta(days=1): (1, 20), today: (2, 21 + 36)}
+
+
+def test_rebuild_reproduces_the_incremental_rollups(app, admin_id, products):
+    today = datetime.utcnow().date()
+    with app.app_context():
+        _sale_at(datetime.combine(today - timedelta(days=3), time(23, 59)), [(products[0], 2)], admin_id)
+        _sale_at(datetime.combine(today, time(0, 0, 1)), [(products[1], 1), (products[0], 1)], admin_id, 'card')
+        incremental = _product_rollups(), _rollup_by_day()
+
+        assert app_module.rebuild_sales_rollups() == 4
+        assert (_product_rollups(), _rollup_by_day()) == incremental
+
+
+def test_rebuild_keeps_the_cost_and_category_at_sale_time(app, admin_id, products):
+    with app.app_context():
+        _sale_at(datetime.utcnow(), [(products[0], 2)], admin_id)
+        before = _product_rollups()
+        product = app_module.db.session.get(app_module.Product, products[0])
+        other = app_module.Category(name='أخرى', is_active=True)
+        app_module.db.session.add(other)
+        app_module.db.session.flush()
+        product.cost_price, product.category_id = 9, other.id
+        app_module.db.session.commit()
+
+        app_module.rebuild_sales_rollups(since=datetime.utcnow().date())
+        assert _product_rollups() == before
+        assert before[0][5] == 2 * 5
+
+
+def test_default_report_period_includes_the_current_utc_day(app, client, admin_id, products):
+    with app.app_context():
+        _sale_at(datetime.combine(datetime.utcnow().date(), time()), [(products[0], 1)], admin_id)
+    assert client.get('/api/reports/sales').get_json()['summary']['tickets'] == 1
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import app as app_module
+from conftest import stock_of
+
+# جدول بنود البيع كما كان قبل إضافة التكلفة والفئة وقت البيع
+BASELINE_SALE_ITEM = '''
+CREATE TABLE sale_item (
+    id INTEGER NOT NULL PRIMARY KEY,
+    sale_id INTEGER REFERENCES sale (id),
+    product_id INTEGER REFERENCES product (id),
+    quantity INTEGER NOT NULL,
+    unit_price FLOAT NOT NULL,
+    total_price FLOAT NOT NULL
+)
+'''
+
+NEW_TABLES = ('daily_sales_summary', 'daily_product_sales', 'loyalty_ledger', 'loyalty_fold_state',
+              'invoice_counter', 'synced_sale', 'catalog_change')
+
+
+def _baseline_database():
+    db = app_module.db
+    with db.engine.begin() as connection:
+        for name in NEW_TABLES + ('sale_item',):
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{name}"')
+        connection.exec_driver_sql(BASELINE_SALE_ITEM)
+
+
+def test_init_db_upgrades_a_baseline_database(app, client, products):
+    with app.app_context():
+        _baseline_database()
+    app_module.init_db()
+
+    with app.app_context():
+        inspector = app_module.db.inspect(app_module.db.engine)
+        columns = {column['name'] for column in inspector.get_columns('sale_item')}
+        assert {'unit_cost', 'category_id'} <= columns
+        assert 'ix_sale_item_product' in {index['name'] for index in inspector.get_indexes('sale_item')}
+        assert inspector.has_table('catalog_change')
+
+    response = client.post('/api/pos/complete_sale',
+                           json={'items': [{'product_id': products[0], 'quantity': 2}]})
+    assert response.get_json()['success']
+    with app.app_context():
+        assert stock_of(products[0]) == 3
+        item = app_module.db.session.query(app_module.SaleItem).one()
+        assert (item.unit_cost, item.quantity) == (5, 2)
+
+
+def test_init_db_is_idempotent(app):
+    app_module.init_db()
+    app_module.init_db()
+    with app.app_context():
+        assert app_module.db.inspect(app_module.db.engine).has_table('sale_item')
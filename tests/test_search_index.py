@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from search_index import ProductSearchIndex, normalize_arabic, tokenize
+
+
+def _index():
+    index = ProductSearchIndex()
+    index.build([
+        (1, 'أرز مصري', '6221000000011'),
+        (2, 'زيت عباد الشمس', '6221000000028'),
+        (3, 'مكرونة بالأرز', ''),
+        (4, 'عصير برتقال', ''),
+        (5, 'أرز بسمتي هندي', ''),
+        (6, 'جبنة رومي', ''),
+    ])
+    return index
+
+
+def test_normalization_unifies_letter_forms_and_diacritics():
+    assert normalize_arabic('أَرُزّ') == normalize_arabic('ارز')
+    assert normalize_arabic('جبنة') == normalize_arabic('جبنه')
+    assert normalize_arabic('مستشفى') == normalize_arabic('مستشفي')
+    assert tokenize('عصير ـبرتقال ١٢٣') == ['عصير', 'برتقال', '123']
+
+
+def test_names_starting_with_the_query_rank_first():
+    # «ارز» بداية اسمي 1 و5 (الأقصر أولاً)، وكلمة داخل اسم 3
+    assert _index().search('ارز') == [1, 5, 3]
+
+
+def test_prefix_infix_and_multi_word_matching():
+    index = _index()
+    assert index.search('برت') == [4]
+    assert index.search('رتقا') == [4]          # جزء من داخل الكلمة
+    assert index.search('ارز هند') == [5]       # كل الكلمات يجب أن تطابق
+    assert index.search('جبنه') == [6]
+    assert index.search('شوكولاتة') == []
+    assert index.search('   ') == []
+
+
+def test_barcode_is_searchable_but_not_ranked_as_name():
+    assert _index().search('6221000000028') == [2]
+
+
+def test_limit_and_accept_filter():
+    index = _index()
+    assert index.search('ارز', limit=1) == [1]
+    assert index.search('ارز', accept=lambda doc_id: doc_id != 1) == [5, 3]
+
+
+def test_add_replaces_and_remove_drops_a_document():
+    index = _index()
+    index.add(1, 'سكر أبيض')
+    assert index.search('ارز') == [5, 3]
+    assert index.search('سكر') == [1]
+    index.remove(5)
+    assert index.search('ارز') == [3]
+    assert len(index) == 5
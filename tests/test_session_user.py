@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import app as app_module
+from conftest import create_user, login, login_as
+
+
+@contextmanager
+def _user_queries(app):
+    """جمل SQL التي تقرأ جدول المستخدمين أثناء الكتلة"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM user' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = app_module.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_requests_reuse_the_cached_session_user(app, client):
+    client.get('/api/dashboard-stats')
+    with _user_queries(app) as statements:
+        for _ in range(3):
+            assert client.get('/api/dashboard-stats').status_code == 200
+    assert statements == []
+
+
+def test_password_login_still_works(app, admin_id):
+    client = login(app.test_client())
+    assert client.get('/dashboard').status_code == 200
+
+
+def test_deactivated_user_is_logged_out_on_next_request(app, client):
+    with app.app_context():
+        cashier_id = create_user('cashier', role='cashier')
+    cashier = login_as(app.test_client(), cashier_id)
+    assert cashier.get('/api/dashboard-stats').status_code == 200   # النسخة الآن في الذاكرة
+
+    response = client.post(f'/api/users/{cashier_id}/toggle_status').get_json()
+    assert response == {'success': True, 'is_active': False}
+    assert cashier.get('/api/dashboard-stats').status_code in (302, 401)
+
+    client.post(f'/api/users/{cashier_id}/toggle_status')
+    assert cashier.get('/api/dashboard-stats').status_code == 200
+
+
+def test_only_admins_toggle_and_not_themselves(app, client, admin_id):
+    with app.app_context():
+        cashier_id = create_user('cashier', role='cashier')
+    cashier = login_as(app.test_client(), cashier_id)
+    assert cashier.post(f'/api/users/{admin_id}/toggle_status').status_code == 403
+    assert client.post(f'/api/users/{admin_id}/toggle_status').status_code == 400
+
+
+def test_profile_update_is_visible_immediately(app, client, admin_id):
+    client.get('/profile')
+    client.post('/update_profile', data={'email': 'new@example.com'})
+    assert 'new@example.com' in client.get('/profile').get_data(as_text=True)
+    with app.app_context():
+        assert app_module.load_user(str(admin_id)).email == 'new@example.com'
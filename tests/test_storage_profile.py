@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import app as app_module
+
+PERFORMANCE = app_module.SQLITE_STORAGE_PROFILES['performance']
+
+
+def _pragma(connection, name):
+    return connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def test_pooled_connections_use_the_performance_profile(app):
+    with app.app_context():
+        with app_module.db.engine.connect() as connection:
+            raw = connection.connection.dbapi_connection
+            assert _pragma(raw, 'journal_mode') == 'wal'
+            assert _pragma(raw, 'synchronous') == 1   # NORMAL
+            assert _pragma(raw, 'temp_store') == 2    # MEMORY
+            for name in ('cache_size', 'mmap_size', 'busy_timeout'):
+                assert _pragma(raw, name) == PERFORMANCE['pragmas'][name]
+        assert app_module.db.engine.pool.size() == PERFORMANCE['engine_options']['pool_size']
+
+
+def test_each_new_connection_gets_the_configured_pragmas(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'SQLITE_PRAGMAS', {'synchronous': 'FULL', 'busy_timeout': 1234})
+    connection = sqlite3.connect(str(tmp_path / 'profile.db'))
+    try:
+        app_module._apply_sqlite_pragmas(connection, None)
+        assert (_pragma(connection, 'synchronous'), _pragma(connection, 'busy_timeout')) == (2, 1234)
+        assert _pragma(connection, 'journal_mode') == 'delete'
+    finally:
+        connection.close()
+
+
+def test_default_profile_leaves_sqlite_defaults(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'SQLITE_PRAGMAS', dict(app_module.SQLITE_STORAGE_PROFILES['default']['pragmas']))
+    connection = sqlite3.connect(str(tmp_path / 'default.db'))
+    try:
+        app_module._apply_sqlite_pragmas(connection, None)
+        assert (_pragma(connection, 'journal_mode'), _pragma(connection, 'synchronous')) == ('delete', 2)
+    finally:
+        connection.close()
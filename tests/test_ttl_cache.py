@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+
+def test_least_recently_used_entries_are_evicted_past_the_bound():
+    cache = TTLCache(60, max_entries=3)
+    for key in range(3):
+        cache.set(key, key)
+    cache.get(0)
+    cache.set(3, 3)
+    assert len(cache) == 3
+    assert cache.get(1) is None
+    assert [cache.get(key) for key in (0, 2, 3)] == [0, 2, 3]
+
+
+def test_expired_entries_are_dropped_on_write():
+    cache = TTLCache(0.05)
+    for key in range(10):
+        cache.set(key, key)
+    time.sleep(0.06)
+    cache.set('fresh', 1)
+    assert len(cache) == 1
+    assert cache.get(0, 'missing') == 'missing'
+
+
+def test_concurrent_misses_compute_once_and_release_key_locks():
+    cache = TTLCache(60)
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'value'
+
+    def reader():
+        barrier.wait()
+        assert cache.get_or_compute('key', compute) == 'value'
+
+    threads = [threading.Thread(target=reader) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert cache._key_locks == {}
+
+
+def test_failed_compute_does_not_leave_a_key_lock():
+    cache = TTLCache(60)
+    try:
+        cache.get_or_compute('key', lambda: 1 / 0)
+    except ZeroDivisionError:
+        pass
+    assert cache._key_locks == {}
+    assert cache.get_or_compute('key', lambda: 2) == 2
+
+
+def test_invalidate_one_key_or_everything():
+    cache = TTLCache(60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.invalidate('a')
+    assert (cache.get('a'), cache.get('b')) == (None, 2)
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_compute_finished_after_invalidate_is_not_stored():
+    cache = TTLCache(60)
+    started, release = threading.Event(), threading.Event()
+
+    def stale_compute():
+        started.set()
+        release.wait(5)
+        return 'stale'
+
+    thread = threading.Thread(target=cache.get_or_compute, args=('stats', stale_compute))
+    thread.start()
+    assert started.wait(5)
+    cache.invalidate('stats')   # كتابة تمت أثناء الحساب
+    release.set()
+    thread.join(5)
+
+    assert cache.get('stats') is None
+    assert cache.get_or_compute('stats', lambda: 'fresh') == 'fresh'
+    assert cache.get('stats') == 'fresh'
+
+
+def test_none_results_are_not_cached():
+    cache = TTLCache(60)
+    calls = []
+    assert cache.get_or_compute('key', lambda: calls.append(1)) is None
+    assert cache.get_or_compute('key', lambda: calls.append(1) or 'value') == 'value'
+    assert len(calls) == 2 and len(cache) == 1
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""ذاكرة مؤقتة بسيطة بمدة صلاحية مشتركة بين جميع الطلبات في العملية.
+
+عند انتهاء صلاحية قيمة يحسبها طلب واحد فقط بينما تنتظر باقي الطلبات النتيجة
+بدلاً من تكرار نفس الاستعلام. عدد المفاتيح محدود (يحذف الأقل استخداماً أولاً)،
+والقيم المنتهية تحذف عند الكتابة، وقفل المفتاح لا يبقى إلا أثناء حساب قيمته.
+نتيجة حساب بدأ قبل invalidate لا تخزن (قد تكون قرأت البيانات قبل التعديل)، وNone لا يخزن.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class TTLCache:
+    def __init__(self, ttl, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._values = OrderedDict()  # key -> (expires_at, value) من الأقل استخداماً للأحدث
+        self._lock = threading.Lock()
+        self._key_locks = {}          # key -> [قفل، عدد المنتظرين] للمفاتيح قيد الحساب فقط
+        self._next_sweep = time.monotonic() + ttl
+        self._generation = 0          # يزيد مع كل invalidate
+
+    def __len__(self):
+        return len(self._values)
+
+    def _lookup(self, key, now):
+        """القيمة الصالحة أو None (تحت self._lock)"""
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._values[key]
+            return None
+        self._values.move_to_end(key)
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+        return entry[1] if entry is not None else default
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        """(تحت self._lock)"""
+        now = time.monotonic()
+        self._values[key] = (now + self.ttl, value)
+        self._values.move_to_end(key)
+        if now >= self._next_sweep:
+            # حذف المنتهية مرة كل مدة صلاحية على الأكثر فتبقى تكلفة الكتابة ثابتة في المتوسط
+            for expired in [k for k, (expires_at, _) in self._values.items() if expires_at <= now]:
+                del self._values[expired]
+            self._next_sweep = now + self.ttl
+        while len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """إرجاع القيمة المخزنة أو حسابها مرة واحدة عند انتهاء صلاحيتها"""
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+            if entry is not None:
+                return entry[1]
+            slot = self._key_locks.get(key)
+            if slot is None:
+                slot = self._key_locks[key] = [threading.Lock(), 0]
+            slot[1] += 1
+        try:
+            with slot[0]:
+                with self._lock:
+                    entry = self._lookup(key, time.monotonic())
+                    generation = self._generation
+                if entry is not None:
+                    return entry[1]
+                value = compute()
+                with self._lock:
+                    if value is not None and generation == self._generation:
+                        self._store(key, value)
+                return value
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._key_locks[key]
+
+    def invalidate(self, key=None):
+        """حذف مفتاح معين أو جميع القيم"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""نقطة دخول خادم الإنتاج (مثل gunicorn wsgi:application).
+
+تجهيز قاعدة البيانات (الجداول والأعمدة والفهارس الجديدة) يتم عند تحميل الملف في كل عامل،
+والمهام الخلفية تبدأ هنا في كل عملية عامل، وتنفذ المهام المشتركة في عملية واحدة منها فقط.
+لا تستخدم gunicorn --preload: الخيوط لا تنتقل إلى العمليات بعد fork.
+"""
+
+from app import app, init_db, start_scheduler
+
+init_db()
+start_scheduler()
+application = app